@@ -0,0 +1,131 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for Gemini and Neo4j used by the benchmarks.
+"""
+
+from typing import Dict, List, Optional
+import asyncio
+import time
+import zlib
+import numpy as np
+
+import google.generativeai as genai
+
+from storage.graph_cache import NeighborhoodCache
+from utils.text import terms
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """
+    Hashed bag-of-words vector: texts sharing words are similar, and the
+    same text always maps to the same vector
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for term in terms(text):
+        h = zlib.crc32(term.encode("utf-8"))
+        vector[h % dim] += 1.0 if h & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[zlib.crc32(text.encode("utf-8")) % dim] = 1.0
+        return vector
+    return vector / norm
+
+
+class _Part:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Response:
+    """Mimics a (optionally streamed) generate_content response"""
+
+    def __init__(self, text: str, stream: bool, latency: float):
+        self.text = text
+        self._stream = stream
+        self._latency = latency
+
+    def __iter__(self):
+        words = self.text.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self._latency / len(words))
+            yield _Part(word + (" " if i < len(words) - 1 else ""))
+
+
+class FakeGenerativeModel:
+    """Answers with a deterministic summary of the prompt after ``latency`` seconds"""
+
+    latency = 0.0
+
+    def __init__(self, model_name: str = "fake", **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        prompt = contents[-1]["parts"][0] if isinstance(contents, list) else str(contents)
+        text = f"Answer based on {len(prompt)} characters of context: " + " ".join(terms(prompt)[-40:])
+        if stream:
+            return _Response(text, True, self.latency)
+        time.sleep(self.latency)
+        return _Response(text, False, self.latency)
+
+
+class FakeGenAI:
+    """
+    Replaces ``genai.embed_content`` and ``genai.GenerativeModel`` with
+    deterministic fakes; blocking latencies emulate API round trips
+    """
+
+    def __init__(self, dim: int = 768, embed_latency: float = 0.0, generate_latency: float = 0.0):
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.embed_calls = 0
+        self.embedded_texts = 0
+        self._saved: Dict[str, object] = {}
+
+    def embed_content(self, model: str, content, task_type: Optional[str] = None, **kwargs) -> Dict:
+        texts = [content] if isinstance(content, str) else list(content)
+        self.embed_calls += 1
+        self.embedded_texts += len(texts)
+        time.sleep(self.embed_latency)
+        vectors = [fake_embedding(text, self.dim).tolist() for text in texts]
+        return {"embedding": vectors[0] if isinstance(content, str) else vectors}
+
+    def install(self) -> "FakeGenAI":
+        self._saved = {"embed_content": genai.embed_content, "GenerativeModel": genai.GenerativeModel}
+        FakeGenerativeModel.latency = self.generate_latency
+        genai.embed_content = self.embed_content
+        genai.GenerativeModel = FakeGenerativeModel
+        return self
+
+    def uninstall(self) -> None:
+        for name, value in self._saved.items():
+            setattr(genai, name, value)
+
+
+class InMemoryGraphStore:
+    """GraphStore interface backed only by a NeighborhoodCache"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.neighborhood_cache = NeighborhoodCache()
+        self.neighborhood_cache.ready = True
+
+    async def close(self) -> None:
+        pass
+
+    async def ensure_schema(self) -> None:
+        pass
+
+    async def load_neighborhood_cache(self) -> None:
+        pass
+
+    async def create_knowledge_graph(self, entities: List[Dict], relations: List[Dict]) -> None:
+        await asyncio.sleep(self.latency)
+        self.neighborhood_cache.add_entities(entities)
+        self.neighborhood_cache.add_relations(relations)
+
+    async def search_graph(self, query_entities: List[str], max_depth: int = 2, limit: int = 10) -> List[Dict]:
+        if not query_entities:
+            return []
+        await asyncio.sleep(self.latency)
+        return self.neighborhood_cache.search(query_entities, max_depth, limit)
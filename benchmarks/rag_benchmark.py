@@ -0,0 +1,238 @@
+# benchmarks/rag_benchmark.py
+"""
+Offline ingest and /chat load benchmark through the real FastAPI app.
+
+    python -m benchmarks.rag_benchmark --docs 50 --concurrency 1 8 32 --output result.json
+
+Gemini is replaced by deterministic fakes with configurable latency, Neo4j
+by an in-memory graph store, and the vector store lives in a temporary
+directory. All state (caches, sessions, indexes) is created under that
+directory, so runs are independent and comparable across commits.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+import main
+from benchmarks.fakes import FakeGenAI, InMemoryGraphStore
+from storage.mmap_vector_index import MmapVectorIndex
+from storage.vector_backends import ChromaBackend
+from utils.config import config
+
+_TOPICS = [
+    "vector", "graph", "embedding", "latency", "cache", "index", "session", "query",
+    "document", "chunk", "token", "model", "answer", "context", "retrieval", "entity"
+]
+_WORDS = [
+    "system", "request", "throughput", "memory", "batch", "worker", "server", "storage",
+    "result", "score", "network", "disk", "thread", "process", "record", "update",
+    "error", "timeout", "limit", "buffer", "pipeline", "stage", "queue", "node"
+]
+
+
+def make_corpus(directory: Path, docs: int, paragraphs: int, seed: int) -> List[str]:
+    """Writes deterministic text documents and returns their paths"""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(docs):
+        lines = []
+        for p in range(paragraphs):
+            topic = rng.choice(_TOPICS)
+            sentences = [
+                f"The {topic} {rng.choice(_WORDS)} handles {rng.choice(_WORDS)} "
+                f"{' '.join(rng.choices(_WORDS, k=8))} for ERR-{rng.randint(100, 999)}."
+                for _ in range(rng.randint(3, 6))
+            ]
+            lines.append(" ".join(sentences))
+        path = directory / f"doc_{i:05d}.txt"
+        path.write_text("\n\n".join(lines), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def make_queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        f"How does the {rng.choice(_TOPICS)} {rng.choice(_WORDS)} affect {rng.choice(_WORDS)}?"
+        for _ in range(count)
+    ]
+
+
+def percentiles(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "max_ms": round(float(values.max()), 2)
+    }
+
+
+async def bench_ingest(client: httpx.AsyncClient, paths: List[str]) -> Dict:
+    start = time.perf_counter()
+    response = await client.post("/upload/batch", json={"paths": paths})
+    response.raise_for_status()
+    batch_id = response.json()["batch_id"]
+    while True:
+        status = (await client.get(f"/upload/batch/{batch_id}")).json()
+        if status["status"] != "running":
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    files = status["files"]
+    chunks = sum(f["chunks"] for f in files)
+    return {
+        "status": status["status"],
+        "docs": len(files),
+        "failed": status["failed"],
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "docs_per_s": round(len(files) / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 2)
+    }
+
+
+async def bench_chat(
+    client: httpx.AsyncClient,
+    queries: List[str],
+    concurrency: int,
+    requests: int,
+    offset: int = 0
+) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker(worker_id: int) -> None:
+        nonlocal errors
+        session_id = f"bench-{concurrency}-{worker_id}"
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={
+                    "session_id": session_id,
+                    "query": queries[(offset + i) % len(queries)]
+                })
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2),
+        **percentiles(latencies)
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    fake = FakeGenAI(
+        dim=args.dim,
+        embed_latency=args.embed_latency_ms / 1000,
+        generate_latency=args.generate_latency_ms / 1000
+    ).install()
+
+    # Relative paths in config (caches, indexes, sessions) resolve under workdir
+    workdir = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    os.chdir(workdir)
+    config.NER_ENABLED = args.ner
+
+    backend = (
+        ChromaBackend(str(workdir / "chroma"), config.COLLECTION_NAME)
+        if args.vector_backend == "chroma"
+        else MmapVectorIndex(str(workdir / "vector_index"))
+    )
+    graph_store = InMemoryGraphStore(latency=args.graph_latency_ms / 1000)
+    main.components.update(await main.init_components(graph_store=graph_store, vector_backend=backend))
+
+    report = {
+        "revision": git_revision(),
+        "params": vars(args),
+        "workdir": str(workdir)
+    }
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            paths = make_corpus(workdir / "corpus", args.docs, args.paragraphs, args.seed)
+            report["ingest"] = await bench_ingest(client, paths)
+
+            # Each level continues through the query list, so answer cache hits
+            # depend only on --distinct-queries, not on earlier levels
+            queries = make_queries(args.distinct_queries, args.seed)
+            report["chat"] = [
+                await bench_chat(client, queries, concurrency, args.requests, offset=level * args.requests)
+                for level, concurrency in enumerate(args.concurrency)
+            ]
+            report["stats"] = (await client.get("/stats")).json()
+        report["fake_genai"] = {"embed_calls": fake.embed_calls, "embedded_texts": fake.embedded_texts}
+    finally:
+        await main.shutdown_event()
+        fake.uninstall()
+    return report
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--paragraphs", type=int, default=20, help="paragraphs per document")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="chat requests per concurrency level")
+    parser.add_argument("--distinct-queries", type=int, default=10_000,
+                        help="fewer distinct queries than requests exercises the caches")
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--generate-latency-ms", type=float, default=500.0)
+    parser.add_argument("--graph-latency-ms", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--vector-backend", choices=["mmap", "chroma"], default="mmap")
+    parser.add_argument("--ner", action="store_true", help="run real NER (needs deeppavlov models)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file as well")
+    args = parser.parse_args()
+    if args.output:
+        # The benchmark changes into its temporary directory
+        args.output = str(Path(args.output).resolve())
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,101 @@
+# benchmarks/vector_quantization.py
+"""
+Memory versus recall of the int8 vector index compared to exact float32 search.
+
+    python -m benchmarks.vector_quantization --rows 200000 --dim 768
+
+Vectors are synthetic and clustered, so that near neighbours are meaningful.
+Recall@k is measured against exact float32 search over the same vectors.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+import numpy as np
+
+from storage.mmap_vector_index import MmapVectorIndex, QuantizedMmapVectorIndex
+
+
+def make_vectors(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+
+
+def build(index, vectors: np.ndarray, batch: int = 20000) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        ids = [str(j) for j in range(i, min(i + batch, len(vectors)))]
+        index.upsert(ids, vectors[i:i + batch], [""] * len(ids), [{}] * len(ids))
+    return time.perf_counter() - start
+
+
+def run_queries(index, queries: np.ndarray, top_k: int):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.query(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append([hit["id"] for hit in hits])
+    return results, np.array(latencies) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.rows, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.rows, size=args.queries)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+    report = {"rows": args.rows, "dim": args.dim, "top_k": args.top_k, "modes": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = MmapVectorIndex(f"{tmp}/float32")
+        build_seconds = build(exact, vectors)
+        truth, latencies = run_queries(exact, queries, args.top_k)
+        report["modes"].append({
+            "mode": "float32",
+            "scanned_bytes": args.rows * args.dim * 4,
+            "recall": 1.0,
+            "build_seconds": round(build_seconds, 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2)
+        })
+        exact.close()
+
+        quantized = QuantizedMmapVectorIndex(f"{tmp}/int8")
+        build_seconds = build(quantized, vectors)
+        for factor in args.rescore_factors:
+            quantized.rescore_factor = factor
+            found, latencies = run_queries(quantized, queries, args.top_k)
+            recall = np.mean([
+                len(set(hits) & set(expected)) / len(expected)
+                for hits, expected in zip(found, truth)
+            ])
+            report["modes"].append({
+                "mode": "int8",
+                "rescore_factor": factor,
+                # int8 codes plus one float32 scale per row
+                "scanned_bytes": args.rows * (args.dim + 4),
+                "recall": round(float(recall), 4),
+                "build_seconds": round(build_seconds, 2),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 2)
+            })
+        quantized.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,47 @@
 # main.py
 
 import asyncio
+import json
 import logging
+import sys
+import time
+from contextlib import aclosing
 from pathlib import Path
 from typing import List, Dict, Optional
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from processors.document_processor import DocumentProcessor
 from processors.embedding_processor import EmbeddingProcessor
+from processors.ingestion_pipeline import IngestionPipeline
+from processors.entity_extractor import EntityExtractor
 from storage.vector_store import VectorStore
+from storage.lexical_index import LexicalIndex
 from storage.graph_store import GraphStore
 from retrieval.hybrid_retriever import HybridRetriever
 from qa.gemini_handler import GeminiHandler
 from qa.chat_manager import ChatManager
+from qa.answer_cache import AnswerCache
+from utils.config import config
+from utils.metrics import STAGE_DURATION, TraceIdFilter, registry, trace_id_from, trace_id_var
 
-# Настройка логирования
+# Настройка логирования (force: модули уже вызвали basicConfig при импорте)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s',
+    force=True
 )
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
+REQUEST_DURATION = registry.histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency"
+)
+
 app = FastAPI(title="RAG Chatbot API")
 
 # Модели данных
@@ -34,24 +53,74 @@ class Message(BaseModel):
 class DocumentUpload(BaseModel):
     file_path: str
 
+class BatchUpload(BaseModel):
+    paths: List[str]
+
 # Инициализация компонентов
-async def init_components():
+async def init_components(graph_store: Optional[GraphStore] = None, vector_backend=None):
+    """
+    graph_store и vector_backend позволяют подменить внешние сервисы
+    (используется бенчмарками)
+    """
     try:
         doc_processor = DocumentProcessor()
         embedding_processor = EmbeddingProcessor()
-        vector_store = VectorStore()
-        graph_store = GraphStore()
+        lexical_index = None
+        if config.LEXICAL_INDEX_ENABLED:
+            lexical_index = LexicalIndex(
+                config.LEXICAL_INDEX_PATH,
+                k1=config.BM25_K1,
+                b=config.BM25_B,
+                snapshot_min_records=config.LEXICAL_SNAPSHOT_MIN_RECORDS
+            )
+        vector_store = VectorStore(lexical_index=lexical_index, backend=vector_backend)
+        await vector_store.rebuild_lexical_index()
+        graph_store = graph_store or GraphStore()
+        try:
+            await graph_store.ensure_schema()
+            await graph_store.load_neighborhood_cache()
+        except Exception as e:
+            # Драйвер подключается лениво: API работает и без Neo4j, схема
+            # создается перед первой записью, кэш графа загрузится при поиске
+            logger.error(f"Neo4j is unavailable at startup, continuing without the graph: {e}")
+        
+        entity_extractor = None
+        if config.NER_ENABLED:
+            entity_extractor = EntityExtractor()
+            # Модель загружается при старте, а не на первом запросе
+            await entity_extractor.preload()
         
         retriever = HybridRetriever(
             vector_store=vector_store,
             graph_store=graph_store,
-            embedding_processor=embedding_processor
+            embedding_processor=embedding_processor,
+            lexical_index=lexical_index,
+            entity_extractor=entity_extractor
         )
         
+        ingestion_pipeline = IngestionPipeline(
+            doc_processor=doc_processor,
+            embedding_processor=embedding_processor,
+            vector_store=vector_store,
+            entity_extractor=entity_extractor,
+            graph_store=graph_store
+        )
+        
+        answer_cache = None
+        if config.ANSWER_CACHE_ENABLED:
+            answer_cache = AnswerCache(
+                threshold=config.ANSWER_CACHE_THRESHOLD,
+                maxsize=config.ANSWER_CACHE_SIZE,
+                ttl=config.ANSWER_CACHE_TTL
+            )
+            # Ответы сбрасываются при изменении чанков, на которых они построены
+            vector_store.add_listener(answer_cache.invalidate)
+        
         gemini_handler = GeminiHandler()
         chat_manager = ChatManager(
             retriever=retriever,
-            gemini_handler=gemini_handler
+            gemini_handler=gemini_handler,
+            answer_cache=answer_cache
         )
         
         return {
@@ -59,7 +128,9 @@ async def init_components():
             "embedding_processor": embedding_processor,
             "vector_store": vector_store,
             "graph_store": graph_store,
+            "entity_extractor": entity_extractor,
             "retriever": retriever,
+            "ingestion_pipeline": ingestion_pipeline,
             "chat_manager": chat_manager
         }
     except Exception as e:
@@ -69,34 +140,116 @@ async def init_components():
 # Глобальные компоненты
 components = {}
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Присваивает запросу trace ID (или берет из X-Request-ID) и замеряет время"""
+    trace_id = trace_id_from(request.headers.get("X-Request-ID"))
+    token = trace_id_var.set(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = trace_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            path=route.path if route is not None else "unmatched",
+            status=status
+        )
+        trace_id_var.reset(token)
+
+def collect_cache_metrics():
+    """Счетчики кэшей для /metrics (снимаются в момент запроса)"""
+    if not components:
+        return []
+    embedding_processor = components["embedding_processor"]
+    entity_extractor = components.get("entity_extractor")
+    caches = {
+        "embedding": embedding_processor.cache,
+        "query_embedding": embedding_processor.query_cache,
+        "answer": components["chat_manager"].answer_cache,
+        "sessions": components["chat_manager"].active_sessions,
+        "query_entities": entity_extractor.query_cache if entity_extractor else None
+    }
+    stats = {name: cache.stats() for name, cache in caches.items() if cache is not None}
+    coalescer = embedding_processor.query_coalescer.stats()
+    return [
+        ("rag_cache_hits_total", "counter", "Cache hits",
+         [({"cache": name}, s["hits"]) for name, s in stats.items()]),
+        ("rag_cache_misses_total", "counter", "Cache misses",
+         [({"cache": name}, s["misses"]) for name, s in stats.items()]),
+        ("rag_query_coalescer_requests_total", "counter", "Query embedding requests",
+         [({}, coalescer["requests"])]),
+        ("rag_query_coalescer_batches_total", "counter", "Batched query embedding calls",
+         [({}, coalescer["batches"])]),
+    ]
+
+registry.register_collector(collect_cache_metrics)
+
 @app.on_event("startup")
 async def startup_event():
     """Инициализация при запуске"""
     global components
     components = await init_components()
 
-@app.post("/upload")
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Освобождение ресурсов при остановке"""
+    if "graph_store" in components:
+        await components["graph_store"].close()
+    if "doc_processor" in components:
+        components["doc_processor"].close()
+    if "vector_store" in components:
+        components["vector_store"].close()
+    if components.get("entity_extractor") is not None:
+        components["entity_extractor"].close()
+
+@app.post("/upload", status_code=202)
 async def upload_document(doc: DocumentUpload):
-    """Загрузка и обработка документа"""
+    """Ставит документ в очередь на фоновую обработку"""
+    # Проверяем существование файла
+    file_path = Path(doc.file_path)
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+
     try:
-        # Проверяем существование файла
-        file_path = Path(doc.file_path)
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found")
-
-        # Обрабатываем документ
-        processed = await components["doc_processor"].process_document(str(file_path))
-        processed = await components["embedding_processor"].create_embeddings(processed)
-        
-        # Сохраняем в хранилища
-        await components["vector_store"].add_documents(processed)
-        
-        return {"status": "success", "message": "Document processed successfully"}
+        job = components["ingestion_pipeline"].submit(str(file_path))
+        return {"status": "accepted", "job_id": job.job_id}
         
     except Exception as e:
         logger.error(f"Error processing document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/upload/{job_id}")
+async def upload_status(job_id: str):
+    """Статус и прогресс обработки документа"""
+    job = components["ingestion_pipeline"].get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/upload/batch", status_code=202)
+async def upload_batch(batch: BatchUpload):
+    """Ставит в очередь набор файлов и/или директорий"""
+    missing = [path for path in batch.paths if not Path(path).exists()]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Paths not found: {missing}")
+
+    batch_job = components["ingestion_pipeline"].submit_batch(batch.paths)
+    return {"status": "accepted", "batch_id": batch_job.batch_id, "files": len(batch_job.jobs)}
+
+@app.get("/upload/batch/{batch_id}")
+async def upload_batch_status(batch_id: str):
+    """Статус пакетной загрузки с результатом по каждому файлу"""
+    batch_job = components["ingestion_pipeline"].get_batch(batch_id)
+    if batch_job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_job.to_dict()
+
 @app.post("/chat")
 async def chat(message: Message):
     """Обработка сообщений чата"""
@@ -108,4 +261,95 @@ async def chat(message: Message):
         )
         
         return {
-            "status
\ No newline at end of file
+            "status": "success",
+            "response": response
+        }
+
+    except Exception as e:
+        logger.error(f"Error in chat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(message: Message):
+    """Потоковая обработка сообщений чата (Server-Sent Events)"""
+    # Тело ответа отдается после выхода из middleware: время запроса там
+    # покрывает только заголовки, поэтому поток замеряется здесь
+    trace_id = trace_id_var.get()
+    start = time.perf_counter()
+
+    async def events():
+        token = trace_id_var.set(trace_id)
+        first = True
+        try:
+            async with aclosing(components["chat_manager"].process_message_stream(
+                session_id=message.session_id,
+                query=message.query,
+                entities=message.entities
+            )) as stream:
+                async for part in stream:
+                    if first:
+                        STAGE_DURATION.observe(time.perf_counter() - start, stage="chat_stream_first_token")
+                        first = False
+                    yield f"event: token\ndata: {json.dumps({'text': part}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            detail = json.dumps({"detail": "Произошла ошибка при обработке сообщения. Попробуйте позже."}, ensure_ascii=False)
+            yield f"event: error\ndata: {detail}\n\n"
+        finally:
+            STAGE_DURATION.observe(time.perf_counter() - start, stage="chat_stream")
+            trace_id_var.reset(token)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats")
+async def stats():
+    """Счетчики кэшей и внутренних компонентов"""
+    embedding_processor = components["embedding_processor"]
+    embedding_cache = embedding_processor.cache
+    answer_cache = components["chat_manager"].answer_cache
+    lexical_index = components["vector_store"].lexical_index
+    graph_store = components["graph_store"]
+    graph_cache = graph_store.neighborhood_cache
+    return {
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "query_cache": embedding_processor.query_cache.stats(),
+        "query_coalescer": embedding_processor.query_coalescer.stats(),
+        "sessions": components["chat_manager"].stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "lexical_index": lexical_index.stats() if lexical_index else None,
+        "graph_cache": {
+            **graph_cache.stats(),
+            "reloads": getattr(graph_store, "cache_reloads", 0)
+        } if graph_cache else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+async def ingest_cli(paths: List[str]) -> None:
+    """Пакетная загрузка из командной строки: python main.py ingest <paths...>"""
+    global components
+    components = await init_components()
+    try:
+        pipeline = components["ingestion_pipeline"]
+        batch_job = pipeline.submit_batch(paths)
+        await pipeline.wait(batch_job.jobs)
+        print(json.dumps(batch_job.to_dict(), indent=2, ensure_ascii=False))
+    finally:
+        await shutdown_event()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        asyncio.run(ingest_cli(sys.argv[2:]))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
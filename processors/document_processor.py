@@ -1,22 +1,82 @@
 # processors/document_processor.py
 
 import os
-from typing import Dict, List, Tuple
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from unstructured.partition.auto import partition
 from utils.config import config
+from utils.metrics import count_bytes, count_items, span
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _partition_file(file_path: str) -> List[Tuple[str, str]]:
+    """
+    Partition a file in a worker process.
+
+    Returns (element_type, text) pairs, which are much cheaper to send back
+    to the parent process than unstructured element objects.
+    """
+    return [(type(element).__name__, str(element)) for element in partition(filename=file_path)]
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, executor: Optional[Executor] = None):
         self.supported_formats = config.SUPPORTED_FORMATS
+        # partition (PDF parsing, OCR) is CPU-bound, so it runs in a process pool
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=config.PARTITION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def is_supported(self, file_path: str) -> bool:
+        return os.path.splitext(file_path)[1].lower() in self.supported_formats
+
+    def collect_files(self, paths: List[str]) -> List[str]:
+        """
+        Expand directories (recursively) into the supported files they contain
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files.extend(
+                        os.path.join(root, name) for name in sorted(names)
+                        if self.is_supported(name)
+                    )
+            else:
+                files.append(path)
+        return files
+
+    async def fingerprint(self, file_path: str) -> str:
+        """
+        Content hash of a file, used to detect unchanged re-uploads.
+        """
+        def digest() -> str:
+            sha = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+            return sha.hexdigest()
+
+        return await asyncio.to_thread(digest)
 
     async def process_document(self, file_path: str) -> List[Dict[str, any]]:
         """
         Process a document and extract its content with structure preservation.
         """
+        return [element async for element in self.iter_elements(file_path)]
+
+    async def iter_elements(self, file_path: str) -> AsyncIterator[Dict[str, any]]:
+        """
+        Yield processed elements of a document one at a time.
+        """
         try:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File not found: {file_path}")
@@ -25,17 +85,18 @@ class DocumentProcessor:
             if file_ext not in self.supported_formats:
                 raise ValueError(f"Unsupported file format: {file_ext}")
             
-            # Extract content using unstructured-io
-            elements = partition(filename=file_path)
+            # Extract content using unstructured-io in the process pool
+            loop = asyncio.get_running_loop()
+            with span("partition"):
+                elements = await loop.run_in_executor(self.executor, _partition_file, file_path)
+            count_bytes("partition", os.path.getsize(file_path))
+            count_items("partition", len(elements))
             
-            processed_elements = []
             position = 0
             
-            for element in elements:
-                element_type = type(element).__name__
-                content = str(element)
+            for element_type, content in elements:
                 
-                processed_element = {
+                yield {
                     "content": content,
                     "type": element_type,
                     "position": position,
@@ -45,10 +106,7 @@ class DocumentProcessor:
                     }
                 }
                 
-                processed_elements.append(processed_element)
                 position += len(content)
-            
-            return processed_elements
 
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
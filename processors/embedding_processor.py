@@ -1,77 +1,270 @@
 # processors/embedding_processor.py
 
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
+import asyncio
 import google.generativeai as genai
 from utils.config import config
 import numpy as np
 import logging
 
+from storage.embedding_cache import EmbeddingCache
+from utils.cache import TTLCache
+from utils.coalescer import BatchCoalescer
+from utils.metrics import count_items, span, timed
+from utils.text import count_tokens, sentence_spans
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class EmbeddingProcessor:
-    def __init__(self):
+    def __init__(self, cache: Optional[EmbeddingCache] = None):
         self.model = config.EMBEDDING_MODEL
-        self.max_chunk_size = config.MAX_CHUNK_SIZE
-        self.chunk_overlap = config.CHUNK_OVERLAP
+        self.max_chunk_tokens = config.MAX_CHUNK_TOKENS
+        self.chunk_overlap = config.CHUNK_OVERLAP_TOKENS
+        self.batch_size = config.EMBEDDING_BATCH_SIZE
+        self._semaphore = asyncio.Semaphore(config.EMBEDDING_CONCURRENCY)
+
+        if cache is None and config.EMBEDDING_CACHE_ENABLED:
+            cache = EmbeddingCache(
+                config.EMBEDDING_CACHE_DIR,
+                max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        self.cache = cache
+        self.query_cache = TTLCache(
+            maxsize=config.QUERY_CACHE_SIZE,
+            ttl=config.QUERY_CACHE_TTL
+        )
+        # Concurrent cache misses are embedded together in one call
+        self.query_coalescer = BatchCoalescer(
+            self._embed_queries,
+            window=config.QUERY_COALESCE_WINDOW_MS / 1000,
+            max_batch=self.batch_size
+        )
         
         # Initialize Gemini
         genai.configure(api_key='YOUR_GEMINI_API_KEY')
         
     def chunk_text(self, text: str) -> List[str]:
         """
-        Split text into semantic chunks with overlap
+        Split text into chunks of at most max_chunk_tokens with overlap.
+
+        Sentence boundaries are found in one pass up front; chunks are then
+        filled greedily with whole sentences.
         """
-        if len(text) <= self.max_chunk_size:
-            return [text]
-            
+        spans = sentence_spans(text, self.max_chunk_tokens)
+        if not spans:
+            return [text] if text.strip() else []
+
         chunks = []
         start = 0
-        
-        while start < len(text):
-            end = start + self.max_chunk_size
-            
-            # Find the nearest sentence end
-            if end < len(text):
-                while end > start and text[end] not in '.!?':
-                    end -= 1
-                if end == start:
-                    end = start + self.max_chunk_size
-                    
-            chunks.append(text[start:end])
-            start = end - self.chunk_overlap
-            
+
+        while start < len(spans):
+            end = start
+            tokens = 0
+            while end < len(spans) and (end == start or tokens + spans[end][2] <= self.max_chunk_tokens):
+                tokens += spans[end][2]
+                end += 1
+
+            chunks.append(text[spans[start][0]:spans[end - 1][1]].strip())
+            if end == len(spans):
+                break
+
+            # Repeat trailing sentences worth up to chunk_overlap tokens
+            next_start = end
+            overlap = 0
+            while next_start - 1 > start and overlap + spans[next_start - 1][2] <= self.chunk_overlap:
+                next_start -= 1
+                overlap += spans[next_start][2]
+            start = next_start
+
         return chunks
-        
+
+    async def iter_chunks(self, elements: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        """
+        Turn a stream of elements into chunk records.
+
+        Adjacent small elements (titles, list items, short paragraphs) are
+        packed into one chunk while they fit in max_chunk_tokens; larger
+        elements are split with chunk_text.
+        """
+        group: List[Dict] = []
+        group_tokens = 0
+
+        async for element in elements:
+            # Only the chunking work is timed, not waiting on the element
+            # stream or on the consumer
+            ready: List[Dict] = []
+            with span("chunk"):
+                tokens = count_tokens(element['content'])
+                if tokens and group and (
+                    group_tokens + tokens > self.max_chunk_tokens
+                    or element['metadata']['source_file'] != group[0]['metadata']['source_file']
+                ):
+                    ready.append(self._chunk_record("\n".join(e['content'] for e in group), group, 0))
+                    group = []
+                    group_tokens = 0
+
+                if tokens > self.max_chunk_tokens:
+                    ready.extend(
+                        self._chunk_record(chunk, [element], chunk_index)
+                        for chunk_index, chunk in enumerate(self.chunk_text(element['content']))
+                    )
+                elif tokens:
+                    group.append(element)
+                    group_tokens += tokens
+
+            for record in ready:
+                yield record
+
+        if group:
+            yield self._chunk_record("\n".join(e['content'] for e in group), group, 0)
+
+    @staticmethod
+    def _chunk_record(content: str, elements: List[Dict], chunk_index: int) -> Dict:
+        """
+        Chunk record with provenance of the elements it was built from
+        """
+        first = elements[0]
+        return {
+            "content": content,
+            "metadata": {
+                "source_file": first['metadata']['source_file'],
+                "position": first['position'],
+                "chunk_index": chunk_index,
+                "element_type": first['metadata']['element_type'],
+                "element_types": ",".join(dict.fromkeys(e['metadata']['element_type'] for e in elements)),
+                "element_positions": ",".join(str(e['position']) for e in elements),
+                "element_count": len(elements)
+            }
+        }
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @timed("embed_query")
+    async def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a search query, serving repeated queries from memory.
+
+        Misses are coalesced: queries arriving within a few milliseconds
+        share one API call, and identical in-flight queries share one result.
+        """
+        key = self.normalize_query(query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = await self.query_coalescer.submit(key, query.strip())
+            self.query_cache.set(key, embedding)
+        return embedding
+
+    def cached_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """
+        Embedding of a query embedded recently, without calling the API.
+        Does not count as a query cache lookup: embed_query already did one.
+        """
+        return self.query_cache.peek(self.normalize_query(query))
+
+    async def _embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        # Query vectors live only in query_cache: writing one-off queries to
+        # the persistent cache would cost a disk write per request and push
+        # document vectors out of it
+        return await self._embed_uncached(queries, task_type="retrieval_query")
+
+    @timed("embed_texts")
+    async def embed_texts(
+        self,
+        texts: List[str],
+        task_type: str = "retrieval_document"
+    ) -> List[np.ndarray]:
+        """
+        Embed a list of texts in API-sized batches with bounded concurrency.
+
+        Texts already present in the embedding cache are not sent to the API.
+        Batches are dispatched on worker threads so the event loop stays free;
+        the returned vectors are in the same order as ``texts``.
+        """
+        if not texts:
+            return []
+
+        if self.cache is None:
+            return await self._embed_uncached(texts, task_type)
+
+        keys = [self.cache.make_key(self.model, task_type, text) for text in texts]
+        with span("embedding_cache_get"):
+            cached = await asyncio.to_thread(self.cache.get_many, keys)
+
+        # Embed each distinct missing text once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = await self._embed_uncached(list(missing.values()), task_type)
+            fresh = dict(zip(missing.keys(), vectors))
+            with span("embedding_cache_put"):
+                await asyncio.to_thread(self.cache.put_many, fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    async def _embed_uncached(self, texts: List[str], task_type: str) -> List[np.ndarray]:
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+        async def run(batch: List[str]) -> List[np.ndarray]:
+            async with self._semaphore:
+                return await asyncio.to_thread(self._embed_batch, batch, task_type)
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def _embed_batch(self, texts: List[str], task_type: str) -> List[np.ndarray]:
+        """
+        Blocking call to the embedding API for a single batch
+        """
+        with span("embed_api_call"):
+            response = genai.embed_content(
+                model=self.model,
+                content=texts,
+                task_type=task_type
+            )
+        count_items("embed_api_call", len(texts))
+        return [np.asarray(values, dtype=np.float32) for values in response['embedding']]
+
     async def create_embeddings(self, elements: List[Dict]) -> List[Dict]:
         """
         Create embeddings for document elements
         """
         try:
+            # Chunk every element first so that chunks from many elements
+            # share API batches instead of one request per chunk.
+            element_chunks = [self.chunk_text(element['content']) for element in elements]
+            texts = [chunk for chunks in element_chunks for chunk in chunks]
+
+            embeddings = await self.embed_texts(texts, task_type="retrieval_document")
+
             processed_elements = []
-            
-            for element in elements:
-                content = element['content']
-                chunks = self.chunk_text(content)
-                
+            offset = 0
+
+            for element, chunks in zip(elements, element_chunks):
                 chunk_embeddings = []
-                for chunk in chunks:
-                    embedding = genai.embed_content(
-                        model=self.model,
-                        content=chunk,
-                        task_type="retrieval_document"
-                    )
+                for chunk_index, chunk in enumerate(chunks):
                     chunk_embeddings.append({
                         "content": chunk,
-                        "embedding": embedding,
-                        "position": element['position']
+                        "embedding": embeddings[offset],
+                        "position": element.get('position', 0),
+                        "chunk_index": chunk_index
                     })
-                
+                    offset += 1
+
                 element['chunks'] = chunk_embeddings
                 processed_elements.append(element)
-                
+
             return processed_elements
-            
+
         except Exception as e:
             logger.error(f"Error creating embeddings: {str(e)}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,197 @@
+# processors/entity_extractor.py
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import itertools
+import threading
+import logging
+
+from utils.cache import TTLCache
+from utils.config import config
+from utils.text import entity_key, sentence_spans
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Relationship type for entities mentioned in the same chunk
+CO_OCCURS = "co_occurs"
+
+
+def entity_id(entity_type: str, value: str) -> str:
+    """
+    Stable entity ID: the same mention in any document, in any letter case,
+    maps to one node
+    """
+    digest = hashlib.sha256(f"{entity_type}\0{entity_key(value)}".encode("utf-8")).hexdigest()
+    return digest[:32]
+
+
+def _spans_from_tags(tokens: List[str], tags: List[str]) -> List[Tuple[str, str]]:
+    """
+    Collapses BIO tags into (value, type) spans
+    """
+    spans = []
+    current: List[str] = []
+    current_type: Optional[str] = None
+    for token, tag in zip(tokens, tags):
+        prefix, _, tag_type = tag.partition("-")
+        if prefix == "I" and current and tag_type == current_type:
+            current.append(token)
+            continue
+        if current:
+            spans.append((" ".join(current), current_type))
+        current, current_type = ([token], tag_type) if prefix in ("B", "I") else ([], None)
+    if current:
+        spans.append((" ".join(current), current_type))
+    return spans
+
+
+class EntityExtractor:
+    """
+    Named entity recognition with a deeppavlov model.
+
+    The model is built once, lazily or via ``preload`` at startup, and is
+    called on large batches on a small thread pool. Chat queries are tagged
+    on a separate thread so they never wait behind ingest batches. If the
+    model cannot be built (e.g. offline), no entities are extracted.
+    Relations are entity co-occurrences within a chunk.
+    """
+
+    def __init__(self, model_config: str = None, executor: Optional[ThreadPoolExecutor] = None):
+        self.model_config = model_config or config.NER_MODEL_CONFIG
+        self.batch_size = config.NER_BATCH_SIZE
+        self.max_tokens = config.NER_MAX_TOKENS
+        self.max_entities = config.NER_MAX_ENTITIES_PER_CHUNK
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=config.NER_WORKERS,
+            thread_name_prefix="ner"
+        )
+        self._query_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ner-query")
+        self._model = None
+        self._model_error: Optional[Exception] = None
+        self._model_lock = threading.Lock()
+        self.query_cache = TTLCache(maxsize=config.NER_QUERY_CACHE_SIZE)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._query_executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def available(self) -> bool:
+        return self._model_error is None
+
+    def _get_model(self):
+        """
+        The model, or None if it could not be built. Locally available model
+        files are used without contacting the model host; they are
+        downloaded only if missing.
+        """
+        with self._model_lock:
+            if self._model is None and self._model_error is None:
+                try:
+                    from deeppavlov import build_model
+
+                    logger.info(f"Loading NER model {self.model_config}")
+                    try:
+                        self._model = build_model(self.model_config, download=False)
+                    except Exception:
+                        if not config.NER_DOWNLOAD:
+                            raise
+                        self._model = build_model(self.model_config, download=True)
+                except Exception as e:
+                    self._model_error = e
+                    logger.warning(
+                        f"NER model {self.model_config} is unavailable, "
+                        f"graph entities will not be extracted: {str(e)}"
+                    )
+            return self._model
+
+    async def preload(self) -> None:
+        """Builds the model ahead of the first request"""
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._get_model)
+
+    def _tag_batch(self, texts: List[str]) -> List[List[Tuple[str, str]]]:
+        model = self._get_model()
+        if model is None:
+            return [[] for _ in texts]
+        tokens_batch, tags_batch = model(texts)
+        return [_spans_from_tags(tokens, tags) for tokens, tags in zip(tokens_batch, tags_batch)]
+
+    async def extract(self, texts: List[str]) -> List[List[Tuple[str, str]]]:
+        """
+        (value, type) entities of each text, in order of first mention.
+
+        Texts are split into sentence pieces that fit the model, and the
+        pieces of all texts are tagged together in batches of NER_BATCH_SIZE.
+        """
+        return await self._extract(texts, self._executor)
+
+    async def _extract(self, texts: List[str], executor: ThreadPoolExecutor) -> List[List[Tuple[str, str]]]:
+        if not self.available:
+            return [[] for _ in texts]
+        pieces: List[str] = []
+        owners: List[int] = []
+        for i, text in enumerate(texts):
+            for start, end, _ in sentence_spans(text, self.max_tokens):
+                piece = text[start:end].strip()
+                if piece:
+                    pieces.append(piece)
+                    owners.append(i)
+
+        loop = asyncio.get_running_loop()
+        batches = await asyncio.gather(*[
+            loop.run_in_executor(executor, self._tag_batch, pieces[i:i + self.batch_size])
+            for i in range(0, len(pieces), self.batch_size)
+        ])
+
+        results: List[Dict[Tuple[str, str], None]] = [{} for _ in texts]
+        for owner, spans in zip(owners, itertools.chain.from_iterable(batches)):
+            for span in spans:
+                results[owner].setdefault(span, None)
+        return [list(found)[:self.max_entities] for found in results]
+
+    async def extract_query(self, query: str) -> List[str]:
+        """
+        Entity values mentioned in a chat query, cached per query text
+        """
+        key = " ".join(query.split())
+        values = self.query_cache.get(key)
+        if values is None:
+            spans = (await self._extract([key], self._query_executor))[0]
+            values = list(dict.fromkeys(value for value, _ in spans))
+            self.query_cache.set(key, values)
+        return values
+
+    @staticmethod
+    def build_graph(
+        chunks: List[Dict],
+        spans_per_chunk: List[List[Tuple[str, str]]]
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Entity and co-occurrence relation rows for GraphStore.create_knowledge_graph
+        """
+        entities: Dict[str, Dict] = {}
+        relations: Dict[Tuple[str, str], Dict] = {}
+        for chunk, spans in zip(chunks, spans_per_chunk):
+            ids = []
+            for value, entity_type in spans:
+                eid = entity_id(entity_type, value)
+                ids.append(eid)
+                entities.setdefault(eid, {
+                    "id": eid,
+                    "type": entity_type,
+                    "value": value,
+                    "source": chunk["metadata"].get("source_file"),
+                    "position": chunk["metadata"].get("position")
+                })
+            for source_id, target_id in itertools.combinations(sorted(set(ids)), 2):
+                relations.setdefault((source_id, target_id), {
+                    "source_id": source_id,
+                    "target_id": target_id,
+                    "relation_type": CO_OCCURS,
+                    "confidence": 1.0,
+                    "context": chunk.get("id")
+                })
+        return list(entities.values()), list(relations.values())
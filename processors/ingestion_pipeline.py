@@ -0,0 +1,307 @@
+# processors/ingestion_pipeline.py
+
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+import asyncio
+import uuid
+import logging
+
+from processors.document_processor import DocumentProcessor
+from processors.embedding_processor import EmbeddingProcessor
+from processors.entity_extractor import EntityExtractor
+from storage.graph_store import GraphStore
+from storage.vector_store import VectorStore
+from utils.cache import TTLCache
+from utils.config import config
+from utils.metrics import count_items, span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+@dataclass
+class IngestionJob:
+    """Status and progress of a background ingestion"""
+    job_id: str
+    file_path: str
+    status: str = "pending"  # pending, running, completed, failed
+    elements: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    stored: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    entities: int = 0
+    relations: int = 0
+    file_hash: Optional[str] = None
+    up_to_date: bool = False  # the same file version was already ingested
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat()
+        data["finished_at"] = self.finished_at.isoformat() if self.finished_at else None
+        return data
+
+
+@dataclass
+class BatchJob:
+    """A group of ingestion jobs submitted together"""
+    batch_id: str
+    jobs: List[IngestionJob]
+    created_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def status(self) -> str:
+        if any(job.status in ("pending", "running") for job in self.jobs):
+            return "running"
+        if any(job.status == "failed" for job in self.jobs):
+            return "completed_with_errors"
+        return "completed"
+
+    def to_dict(self) -> Dict:
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "total": len(self.jobs),
+            "completed": sum(1 for job in self.jobs if job.status == "completed"),
+            "failed": sum(1 for job in self.jobs if job.status == "failed"),
+            "created_at": self.created_at.isoformat(),
+            "files": [job.to_dict() for job in self.jobs]
+        }
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: partition -> chunk -> embed -> store -> extract entities.
+
+    Stages run concurrently and are connected by bounded queues, so only a
+    few batches of chunks are held in memory at any time.
+
+    Re-ingestion is incremental: chunk IDs are content hashes, so only chunks
+    not already stored for the file are embedded, and chunks that no longer
+    occur in the file are deleted afterwards.
+
+    With an entity extractor and a graph store, entities and co-occurrence
+    relations of newly stored chunks are bulk-loaded into the graph.
+    """
+
+    def __init__(
+        self,
+        doc_processor: DocumentProcessor,
+        embedding_processor: EmbeddingProcessor,
+        vector_store: VectorStore,
+        entity_extractor: Optional[EntityExtractor] = None,
+        graph_store: Optional[GraphStore] = None
+    ):
+        self.doc_processor = doc_processor
+        self.embedding_processor = embedding_processor
+        self.vector_store = vector_store
+        self.entity_extractor = entity_extractor
+        self.graph_store = graph_store
+        self.batch_size = config.INGEST_BATCH_SIZE
+        self.queue_size = config.INGEST_QUEUE_SIZE
+        self.jobs = TTLCache(maxsize=config.INGEST_JOB_HISTORY)
+        self.batches = TTLCache(maxsize=config.INGEST_JOB_HISTORY)
+        # Limits how many files are partitioned and embedded at the same time
+        self._file_semaphore = asyncio.Semaphore(config.INGEST_MAX_CONCURRENT_FILES)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, file_path: str) -> IngestionJob:
+        """
+        Start ingesting a file in the background and return its job
+        """
+        job = IngestionJob(job_id=uuid.uuid4().hex, file_path=file_path)
+        self.jobs.set(job.job_id, job)
+
+        task = asyncio.create_task(self._run_limited(job))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+
+    def submit_batch(self, paths: List[str]) -> BatchJob:
+        """
+        Ingest many files, or whole directories, fanned out across workers
+        """
+        files = self.doc_processor.collect_files(paths)
+        batch = BatchJob(
+            batch_id=uuid.uuid4().hex,
+            jobs=[self.submit(file_path) for file_path in files]
+        )
+        self.batches.set(batch.batch_id, batch)
+        return batch
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def get_batch(self, batch_id: str) -> Optional[BatchJob]:
+        return self.batches.get(batch_id)
+
+    async def wait(self, jobs: List[IngestionJob]) -> None:
+        """
+        Wait until the given jobs have finished
+        """
+        tasks = [self._tasks[job.job_id] for job in jobs if job.job_id in self._tasks]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_limited(self, job: IngestionJob) -> IngestionJob:
+        async with self._file_semaphore:
+            return await self.run(job)
+
+    async def run(self, job: IngestionJob) -> IngestionJob:
+        """
+        Run all stages for a job and record the outcome on it
+        """
+        job.status = "running"
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size * self.batch_size)
+        store_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        graph_queue: Optional[asyncio.Queue] = None
+        if self.entity_extractor is not None and self.graph_store is not None:
+            graph_queue = asyncio.Queue(maxsize=self.queue_size)
+        stages = []
+
+        try:
+            job.file_hash = await self.doc_processor.fingerprint(job.file_path)
+            existing_ids, file_hashes = await self.vector_store.get_source_state(job.file_path)
+
+            if existing_ids and file_hashes == {job.file_hash}:
+                job.up_to_date = True
+                job.unchanged = len(existing_ids)
+                job.status = "completed"
+                logger.info(f"Skipping {job.file_path}: already ingested")
+                return job
+
+            seen_ids = set()
+            stages = [
+                asyncio.create_task(self._chunk_stage(job, chunk_queue, existing_ids, seen_ids)),
+                asyncio.create_task(self._embed_stage(job, chunk_queue, store_queue)),
+                asyncio.create_task(self._store_stage(job, store_queue, graph_queue)),
+            ]
+            if graph_queue is not None:
+                stages.append(asyncio.create_task(self._graph_stage(job, graph_queue)))
+            done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+
+            # Chunks of the previous version that are not in the new one
+            stale_ids = list(existing_ids - seen_ids)
+            await self.vector_store.delete_chunks(stale_ids)
+            job.deleted = len(stale_ids)
+
+            job.status = "completed"
+            logger.info(
+                f"Ingested {job.file_path}: {job.elements} elements, "
+                f"{job.stored} chunks written, {job.unchanged} unchanged, {job.deleted} deleted, "
+                f"{job.entities} entities, {job.relations} relations"
+            )
+
+        except Exception as e:
+            logger.error(f"Error ingesting {job.file_path}: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+
+        finally:
+            for task in stages:
+                task.cancel()
+            job.finished_at = datetime.now()
+
+        return job
+
+    async def _chunk_stage(
+        self,
+        job: IngestionJob,
+        out: asyncio.Queue,
+        existing_ids: Set[str],
+        seen_ids: Set[str]
+    ) -> None:
+        async def counted_elements():
+            async for element in self.doc_processor.iter_elements(job.file_path):
+                job.elements += 1
+                yield element
+
+        occurrences: Dict[str, int] = {}
+        async for chunk in self.embedding_processor.iter_chunks(counted_elements()):
+            content = chunk["content"]
+            occurrences[content] = occurrences.get(content, -1) + 1
+            chunk["id"] = self.vector_store.chunk_id(
+                job.file_path, content, occurrences[content]
+            )
+            chunk["metadata"]["file_hash"] = job.file_hash
+            # Already stored chunks only need their metadata refreshed
+            chunk["unchanged"] = chunk["id"] in existing_ids
+            seen_ids.add(chunk["id"])
+            job.chunks += 1
+            await out.put(chunk)
+        count_items("chunk", job.chunks)
+        await out.put(_DONE)
+
+    async def _embed_stage(
+        self,
+        job: IngestionJob,
+        inp: asyncio.Queue,
+        out: asyncio.Queue
+    ) -> None:
+        batch: List[Dict] = []
+        while True:
+            chunk = await inp.get()
+            if chunk is not _DONE:
+                batch.append(chunk)
+            if batch and (chunk is _DONE or len(batch) >= self.batch_size):
+                to_embed = [c for c in batch if not c["unchanged"]]
+                embeddings = await self.embedding_processor.embed_texts(
+                    [c["content"] for c in to_embed],
+                    task_type="retrieval_document"
+                )
+                for c, embedding in zip(to_embed, embeddings):
+                    c["embedding"] = embedding
+                job.embedded += len(to_embed)
+                await out.put(batch)
+                batch = []
+            if chunk is _DONE:
+                await out.put(_DONE)
+                return
+
+    async def _store_stage(
+        self,
+        job: IngestionJob,
+        inp: asyncio.Queue,
+        out: Optional[asyncio.Queue] = None
+    ) -> None:
+        while True:
+            batch = await inp.get()
+            if batch is _DONE:
+                if out is not None:
+                    await out.put(_DONE)
+                return
+            new_chunks = [c for c in batch if not c["unchanged"]]
+            unchanged_chunks = [c for c in batch if c["unchanged"]]
+            with span("store"):
+                await self.vector_store.add_chunks(new_chunks)
+                await self.vector_store.update_metadata(unchanged_chunks)
+            job.stored += len(new_chunks)
+            job.unchanged += len(unchanged_chunks)
+            # Unchanged chunks were already extracted on a previous ingest
+            if out is not None and new_chunks:
+                await out.put(new_chunks)
+
+    async def _graph_stage(self, job: IngestionJob, inp: asyncio.Queue) -> None:
+        while True:
+            batch = await inp.get()
+            if batch is _DONE:
+                return
+            with span("entity_extract"):
+                spans = await self.entity_extractor.extract([c["content"] for c in batch])
+            entities, relations = self.entity_extractor.build_graph(batch, spans)
+            if entities:
+                await self.graph_store.create_knowledge_graph(entities, relations)
+            job.entities += len(entities)
+            job.relations += len(relations)
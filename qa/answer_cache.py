@@ -0,0 +1,149 @@
+# qa/answer_cache.py
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import hashlib
+import itertools
+import json
+import time
+import numpy as np
+
+@dataclass
+class CachedAnswer:
+    """Закэшированный ответ"""
+    query_vector: np.ndarray
+    context_key: FrozenSet[str]
+    history_key: str
+    answer: str
+    created: float
+
+def context_key(context: List[Dict]) -> FrozenSet[str]:
+    """
+    Ключ найденного контекста: ID чанков, а для графовых результатов
+    (у них нет ID) - их содержимое
+    """
+    return frozenset(
+        item["id"] if item.get("id") else f"{item.get('source')}:{item.get('content')}"
+        for item in context
+    )
+
+def history_key(messages: Iterable) -> str:
+    """
+    Ключ истории, переданной модели вместе с вопросом (пустой без истории):
+    ответ на уточняющий вопрос зависит от предыдущих реплик сессии
+    """
+    turns = [(message.role, message.content) for message in messages]
+    if not turns:
+        return ""
+    payload = json.dumps(turns, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    """
+    Семантический кэш ответов.
+
+    Ответ переиспользуется, если найден тот же набор чанков, модели
+    передана та же история сессии, а эмбеддинг вопроса близок
+    (косинус >= threshold) к эмбеддингу закэшированного вопроса. Записи
+    удаляются при изменении любого из их чанков.
+    """
+
+    def __init__(self, threshold: float, maxsize: int, ttl: Optional[float] = None):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._ids = itertools.count()
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        # Индексы: (набор чанков, история) -> записи, чанк -> записи
+        self._by_context: Dict[Tuple[FrozenSet[str], str], Set[int]] = {}
+        self._by_chunk: Dict[str, Set[int]] = {}
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_vector: np.ndarray, context: List[Dict], history: str = "") -> Optional[str]:
+        """Возвращает ответ на похожий вопрос с тем же контекстом и историей"""
+        key = (context_key(context), history)
+        entry_ids = [
+            entry_id for entry_id in list(self._by_context.get(key, ()))
+            if not self._expired(entry_id)
+        ]
+        if entry_ids:
+            vectors = np.stack([self._entries[i].query_vector for i in entry_ids])
+            similarities = vectors @ self._normalize(query_vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                entry_id = entry_ids[best]
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return self._entries[entry_id].answer
+
+        self.misses += 1
+        return None
+
+    def store(self, query_vector: np.ndarray, context: List[Dict], answer: str, history: str = "") -> None:
+        key = context_key(context)
+        entry_id = next(self._ids)
+        self._entries[entry_id] = CachedAnswer(
+            query_vector=self._normalize(query_vector),
+            context_key=key,
+            history_key=history,
+            answer=answer,
+            created=time.monotonic()
+        )
+        self._by_context.setdefault((key, history), set()).add(entry_id)
+        for chunk_id in key:
+            self._by_chunk.setdefault(chunk_id, set()).add(entry_id)
+
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, chunk_ids: Iterable[str]) -> None:
+        """Удаляет ответы, построенные на измененных чанках"""
+        entry_ids = set()
+        for chunk_id in chunk_ids:
+            entry_ids.update(self._by_chunk.get(chunk_id, ()))
+        for entry_id in entry_ids:
+            self._remove(entry_id)
+        self.invalidations += len(entry_ids)
+
+    def _expired(self, entry_id: int) -> bool:
+        if self.ttl is not None and time.monotonic() - self._entries[entry_id].created > self.ttl:
+            self._remove(entry_id)
+            return True
+        return False
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        bucket_key = (entry.context_key, entry.history_key)
+        bucket = self._by_context.get(bucket_key)
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._by_context[bucket_key]
+        for chunk_id in entry.context_key:
+            refs = self._by_chunk.get(chunk_id)
+            if refs is not None:
+                refs.discard(entry_id)
+                if not refs:
+                    del self._by_chunk[chunk_id]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "maxsize": self.maxsize
+        }
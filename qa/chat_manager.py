@@ -1,25 +1,23 @@
 # qa/chat_manager.py
 
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import AsyncIterator, List, Dict, Optional
 import asyncio
+from contextlib import aclosing
 from datetime import datetime
-import json
 import logging
-from pathlib import Path
+import numpy as np
 
 from .gemini_handler import GeminiHandler, ChatMessage
+from .session_store import ChatSession, SessionStore, context_refs
+from .answer_cache import AnswerCache, history_key
+from utils.cache import TTLCache
+from utils.config import config
 from retrieval.hybrid_retriever import HybridRetriever
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class ChatSession:
-    """Сессия чата"""
-    session_id: str
-    start_time: datetime
-    messages: List[ChatMessage]
-    metadata: Dict
+# Ответ, сохраняемый вместо не прошедшего validate_response
+INVALID_RESPONSE = "Извините, не удалось сгенерировать качественный ответ. Попробуйте переформулировать вопрос."
 
 class ChatManager:
     """Управление чат-сессиями и взаимодействием"""
@@ -28,13 +26,34 @@ class ChatManager:
         self,
         retriever: HybridRetriever,
         gemini_handler: GeminiHandler,
-        session_dir: str = "chat_sessions"
+        session_dir: str = "chat_sessions",
+        answer_cache: Optional[AnswerCache] = None
     ):
         self.retriever = retriever
         self.gemini_handler = gemini_handler
-        self.session_dir = Path(session_dir)
-        self.session_dir.mkdir(exist_ok=True)
-        self.active_sessions: Dict[str, ChatSession] = {}
+        self.answer_cache = answer_cache
+        self.session_store = SessionStore(session_dir)
+        # Сессии в памяти ограничены по числу, объему и времени простоя;
+        # выгруженная сессия прозрачно подгружается из журнала
+        self.active_sessions = TTLCache(
+            maxsize=config.SESSION_CACHE_MAX_SESSIONS,
+            ttl=config.SESSION_IDLE_TTL,
+            max_weight=config.SESSION_CACHE_MAX_BYTES,
+            weigher=self._session_size,
+            touch_on_get=True
+        )
+        self.session_reloads = 0
+        # Загрузки сессий в процессе: параллельные запросы к выгруженной
+        # сессии ждут одну загрузку и получают один объект
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _session_size(session: ChatSession) -> int:
+        """Приблизительный объем сессии в памяти, байт"""
+        return 512 + sum(
+            256 + len(message.content) * 2 + len(str(message.context or "")) * 2
+            for message in session.messages
+        )
 
     async def create_session(self, session_id: str, metadata: Dict = None) -> ChatSession:
         """Создает новую сессию чата"""
@@ -44,10 +63,41 @@ class ChatManager:
             messages=[],
             metadata=metadata or {}
         )
-        self.active_sessions[session_id] = session
-        await self._save_session(session)
+        self.active_sessions.set(session_id, session)
+        await self.session_store.create(session)
         return session
 
+    async def get_session(self, session_id: str) -> ChatSession:
+        """Возвращает активную сессию, загружая ее с диска или создавая новую"""
+        session = self.active_sessions.get(session_id)
+        if session:
+            return session
+        task = self._loading.get(session_id)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load_session(session_id))
+            self._loading[session_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(session_id, None))
+        # Отмена одного запроса не должна отменять общую загрузку
+        return await asyncio.shield(task)
+
+    async def _load_session(self, session_id: str) -> ChatSession:
+        session = await self.session_store.load(session_id)
+        if session:
+            self.session_reloads += 1
+            self.active_sessions.set(session_id, session)
+            return session
+        return await self.create_session(session_id)
+
+    def _answer_cache_vector(self, query: str) -> Optional[np.ndarray]:
+        """
+        Эмбеддинг вопроса для кэша ответов. Используется только эмбеддинг,
+        уже вычисленный при поиске: для запросов по идентификаторам, где
+        векторный поиск пропущен, кэш ответов не применяется
+        """
+        if self.answer_cache is None:
+            return None
+        return self.retriever.cached_query_embedding(query)
+
     async def process_message(
         self,
         session_id: str,
@@ -66,57 +116,123 @@ class ChatManager:
             str: Ответ системы
         """
         try:
-            session = self.active_sessions.get(session_id)
-            if not session:
-                session = await self.create_session(session_id)
+            session = await self.get_session(session_id)
 
             # Получаем релевантный контекст
             context = await self.retriever.retrieve(query, entities or [])
 
-            # Генерируем ответ
-            response = await self.gemini_handler.generate_response(
-                query=query,
-                context=context,
-                chat_history=session.messages
-            )
+            # Похожий вопрос с тем же контекстом и историей уже отвечен - LLM не нужен
+            query_vector = self._answer_cache_vector(query)
+            history = history_key(self.gemini_handler.history_window(session.messages))
+            response = None
+            if query_vector is not None:
+                response = self.answer_cache.lookup(query_vector, context, history)
 
-            # Валидируем ответ
-            if not self.gemini_handler.validate_response(response):
-                response = "Извините, не удалось сгенерировать качественный ответ. Попробуйте переформулировать вопрос."
+            if response is None:
+                # Генерируем ответ
+                response = await self.gemini_handler.generate_response(
+                    query=query,
+                    context=context,
+                    chat_history=session.messages
+                )
+
+                # Валидируем ответ
+                if not self.gemini_handler.validate_response(response):
+                    response = INVALID_RESPONSE
+                elif query_vector is not None:
+                    self.answer_cache.store(query_vector, context, response, history)
 
             # Сохраняем сообщения
-            session.messages.extend([
+            await self._save_turn(session, [
                 ChatMessage(role="user", content=query, context={"entities": entities}),
                 ChatMessage(role="assistant", content=response, context={"retrieved": context})
             ])
-
-            await self._save_session(session)
             return response
 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return "Произошла ошибка при обработке сообщения. Попробуйте позже."
 
-    async def _save_session(self, session: ChatSession) -> None:
-        """Сохраняет сессию в файл"""
-        try:
-            session_path = self.session_dir / f"{session.session_id}.json"
-            session_data = {
-                "session_id": session.session_id,
-                "start_time": session.start_time.isoformat(),
-                "messages": [
-                    {
-                        "role": msg.role,
-                        "content": msg.content,
-                        "context": msg.context
-                    }
-                    for msg in session.messages
-                ],
-                "metadata": session.metadata
-            }
+    async def process_message_stream(
+        self,
+        session_id: str,
+        query: str,
+        entities: List[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Обрабатывает сообщение пользователя, отдавая ответ по частям
+        
+        Сессия дополняется и сохраняется только после завершения потока.
+        
+        Args:
+            session_id: ID сессии
+            query: Вопрос пользователя
+            entities: Список сущностей для поиска
             
-            async with aiofiles.open(session_path, 'w') as f:
-                await f.write(json.dumps(session_data, indent=2, ensure_ascii=False))
-                
+        Yields:
+            str: Очередной фрагмент ответа
+        """
+        session = await self.get_session(session_id)
+
+        context = await self.retriever.retrieve(query, entities or [])
+
+        query_vector = self._answer_cache_vector(query)
+        history = history_key(self.gemini_handler.history_window(session.messages))
+        cached = None
+        if query_vector is not None:
+            cached = self.answer_cache.lookup(query_vector, context, history)
+
+        if cached is not None:
+            response = cached
+            yield cached
+        else:
+            parts = []
+            # Закрытие потока (отключение клиента) сразу останавливает генерацию
+            async with aclosing(self.gemini_handler.generate_response_stream(
+                query=query,
+                context=context,
+                chat_history=session.messages
+            )) as stream:
+                async for part in stream:
+                    parts.append(part)
+                    yield part
+            response = "".join(parts)
+
+            # Как и без потока, непрошедший проверку ответ не кэшируется и не
+            # попадает в историю; клиент, не получивший текста, получает замену
+            if not self.gemini_handler.validate_response(response):
+                if not response.strip():
+                    yield INVALID_RESPONSE
+                response = INVALID_RESPONSE
+            elif query_vector is not None:
+                self.answer_cache.store(query_vector, context, response, history)
+
+        await self._save_turn(session, [
+            ChatMessage(role="user", content=query, context={"entities": entities}),
+            ChatMessage(role="assistant", content=response, context={"retrieved": context})
+        ])
+
+    async def _save_turn(self, session: ChatSession, messages: List[ChatMessage]) -> None:
+        """Добавляет сообщения хода в сессию и дописывает их в журнал"""
+        # В памяти, как и на диске, найденный контекст хранится ссылками
+        session.messages.extend(
+            ChatMessage(role=m.role, content=m.content, context=context_refs(m.context))
+            for m in messages
+        )
+        # Пересчитываем объем сессии и продлеваем ее жизнь
+        self.active_sessions.set(session.session_id, session)
+        try:
+            await self.session_store.append_messages(session.session_id, messages)
         except Exception as e:
-            logger.error(f"Error saving session: {e}")
\ No newline at end of file
+            logger.error(f"Error saving session: {e}")
+
+    def stats(self) -> Dict:
+        """Метрики резидентных сессий"""
+        self.active_sessions.expire()
+        cache_stats = self.active_sessions.stats()
+        return {
+            "resident_sessions": cache_stats["size"],
+            "resident_bytes": cache_stats["weight"],
+            "evictions": cache_stats["evictions"],
+            "reloads": self.session_reloads
+        }
@@ -0,0 +1,122 @@
+# qa/context_packer.py
+
+from typing import Dict, List, Optional, Set
+import logging
+
+from utils.text import count_tokens, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Служебные токены на каждый фрагмент в промпте (Source/Relevance/---)
+_ITEM_OVERHEAD_TOKENS = 12
+# Минимальная длина совпадения, по которой склеиваются перекрывающиеся чанки
+_MIN_OVERLAP_CHARS = 20
+
+def _merge_overlap(first: str, second: str) -> Optional[str]:
+    """
+    Склеивает два текста, если второй начинается с конца первого
+    (перекрытие CHUNK_OVERLAP_TOKENS) или целиком в нем содержится
+    """
+    if second in first:
+        return first
+    head = second[:_MIN_OVERLAP_CHARS]
+    if len(head) < _MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(head)
+    while start != -1:
+        tail = first[start:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        start = first.find(head, start + 1)
+    return None
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+class ContextPacker:
+    """
+    Готовит найденный контекст к генерации: убирает дубликаты и почти
+    дубликаты, склеивает перекрывающиеся чанки одного источника и жадно
+    (по убыванию score) заполняет бюджет токенов.
+    """
+
+    def __init__(self, token_budget: int, dedup_threshold: float):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+
+    def pack(self, context: List[Dict]) -> List[Dict]:
+        items = self._merge_adjacent(self._drop_exact_duplicates(context))
+        items.sort(key=lambda item: item.get("score", 0), reverse=True)
+
+        packed = []
+        kept_shingles: List[Set[tuple]] = []
+        used = 0
+        for item in items:
+            shingles = _shingles(item["content"])
+            if any(self._jaccard(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                continue
+
+            tokens = count_tokens(item["content"]) + _ITEM_OVERHEAD_TOKENS
+            if used + tokens > self.token_budget:
+                continue
+
+            packed.append(item)
+            kept_shingles.append(shingles)
+            used += tokens
+
+        logger.debug(f"Packed context: {len(packed)} of {len(context)} items, ~{used} tokens")
+        return packed
+
+    @staticmethod
+    def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    @staticmethod
+    def _drop_exact_duplicates(context: List[Dict]) -> List[Dict]:
+        best: Dict[str, Dict] = {}
+        for item in context:
+            key = item.get("id") or item["content"]
+            if key not in best or item.get("score", 0) > best[key].get("score", 0):
+                best[key] = item
+        return list(best.values())
+
+    @staticmethod
+    def _merge_adjacent(items: List[Dict]) -> List[Dict]:
+        """
+        Склеивает перекрывающиеся чанки одного файла в порядке их следования в документе
+        """
+        by_source: Dict[str, List[Dict]] = {}
+        result = []
+        for item in items:
+            source = (item.get("metadata") or {}).get("source_file")
+            if source is None:
+                result.append(item)
+            else:
+                by_source.setdefault(source, []).append(item)
+
+        for chunks in by_source.values():
+            chunks.sort(key=lambda c: (c["metadata"].get("position", 0), c["metadata"].get("chunk_index", 0)))
+            current = dict(chunks[0])
+            last = current["metadata"]
+            for chunk in chunks[1:]:
+                merged = _merge_overlap(current["content"], chunk["content"])
+                meta = chunk["metadata"]
+                if merged is None and meta.get("position") == last.get("position") \
+                        and meta.get("chunk_index") == last.get("chunk_index", 0) + 1:
+                    # Соседние части одного элемента без перекрытия
+                    merged = current["content"] + "\n" + chunk["content"]
+                if merged is None:
+                    result.append(current)
+                    current = dict(chunk)
+                else:
+                    current["content"] = merged
+                    current["score"] = max(current.get("score", 0), chunk.get("score", 0))
+                last = meta
+            result.append(current)
+
+        return result
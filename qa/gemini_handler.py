@@ -1,16 +1,31 @@
 # qa/gemini_handler.py
 
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from dataclasses import dataclass
 import google.generativeai as genai
 from utils.config import config
+from utils.metrics import STAGE_DURATION, STAGE_ERRORS, span
 import asyncio
+import threading
+import time
 import logging
-from functools import lru_cache
+
+from .context_packer import ContextPacker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Маркер конца потока ответа
+_STREAM_END = object()
+# Фрагменты ответа, буферизуемые для медленного клиента
+_STREAM_QUEUE_SIZE = 64
+
+SYSTEM_PROMPT = (
+    "Ты - помощник по документации. Используй предоставленный контекст "
+    "для ответа на вопросы. Если информации недостаточно, честно "
+    "признай это. Отвечай структурированно и по существу."
+)
+
 @dataclass
 class ChatMessage:
     """Data class для сообщений чата"""
@@ -28,12 +43,17 @@ class GeminiHandler:
                 model_name="gemini-pro",
                 generation_config=config.GEMINI_CONFIG
             )
-            self.chat = self.model.start_chat(history=[])
+            # Каждый вызов без общего состояния чата: история берется из сессии.
+            # Семафор ограничивает число одновременных запросов к Gemini
+            self._semaphore = asyncio.Semaphore(config.GEMINI_MAX_CONCURRENCY)
+            self.context_packer = ContextPacker(
+                token_budget=config.CONTEXT_TOKEN_BUDGET,
+                dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD
+            )
         except Exception as e:
             logger.error(f"Failed to initialize Gemini: {e}")
             raise
 
-    @lru_cache(maxsize=1000)
     def _format_context(self, context: List[Dict]) -> str:
         """
         Форматирует контекст для модели
@@ -72,39 +92,136 @@ class GeminiHandler:
             str: Сгенерированный ответ
         """
         try:
-            # Формируем промпт
-            formatted_context = self._format_context(context)
-            system_prompt = (
-                "Ты - помощник по документации. Используй предоставленный контекст "
-                "для ответа на вопросы. Если информации недостаточно, честно "
-                "признай это. Отвечай структурированно и по существу."
-            )
-            
-            # Добавляем историю чата и контекст
-            messages = []
-            messages.append({"role": "system", "content": system_prompt})
-            for msg in chat_history[-5:]:  # Берем последние 5 сообщений
-                messages.append({"role": msg.role, "content": msg.content})
-            
-            # Формируем финальный промпт
-            full_prompt = (
-                f"Context:\n{formatted_context}\n\n"
-                f"Question: {query}\n\n"
-                "Please provide a clear and structured answer based on the context above."
-            )
-            
-            # Генерируем ответ
-            response = await asyncio.to_thread(
-                self.chat.send_message,
-                full_prompt
-            )
-            
-            return response.text
+            with span("generate_response"):
+                contents = self._build_contents(query, context, chat_history)
+                
+                # Генерируем ответ
+                async with self._semaphore:
+                    response = await asyncio.to_thread(
+                        self.model.generate_content,
+                        contents
+                    )
+                
+                return response.text
 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return "Извините, произошла ошибка при генерации ответа. Попробуйте позже."
 
+    async def generate_response_stream(
+        self,
+        query: str,
+        context: List[Dict],
+        chat_history: List[ChatMessage]
+    ) -> AsyncIterator[str]:
+        """
+        Генерирует ответ потоково, отдавая фрагменты текста по мере их появления
+        
+        Args:
+            query: Вопрос пользователя
+            context: Релевантный контекст
+            chat_history: История чата
+            
+        Yields:
+            str: Очередной фрагмент ответа
+        """
+        contents = self._build_contents(query, context, chat_history)
+        loop = asyncio.get_running_loop()
+        # Очередь ограничена: поток Gemini не читается быстрее, чем клиент принимает ответ
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_STREAM_QUEUE_SIZE)
+        stop = threading.Event()
+
+        def put(item) -> None:
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce() -> None:
+            # Итерация по потоку Gemini блокирующая, поэтому идет в отдельном потоке
+            stream = None
+            try:
+                stream = iter(self.model.generate_content(contents, stream=True))
+                for chunk in stream:
+                    if stop.is_set():
+                        return
+                    put(chunk.text)
+                put(_STREAM_END)
+            except Exception as e:
+                if not stop.is_set():
+                    try:
+                        put(e)
+                    except Exception:
+                        pass
+            finally:
+                # Прерванный поток закрывается, чтобы освободить соединение
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+
+        # Время до первого фрагмента и всего потока, включая ожидание слота
+        start = time.perf_counter()
+        first = True
+
+        # Слот освобождается, когда поток Gemini остановлен или дочитан
+        await self._semaphore.acquire()
+        producer = loop.run_in_executor(None, produce)
+        producer.add_done_callback(lambda _: self._semaphore.release())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Error streaming response: {item}")
+                    STAGE_ERRORS.inc(stage="generate_response_stream")
+                    raise item
+                if first:
+                    STAGE_DURATION.observe(time.perf_counter() - start, stage="generate_first_token")
+                    first = False
+                yield item
+        finally:
+            STAGE_DURATION.observe(time.perf_counter() - start, stage="generate_response_stream")
+            # Клиент отключился или поток завершен: производитель
+            # останавливается после текущего фрагмента. Очередь опустошается,
+            # чтобы он не остался ждать места в ней
+            stop.set()
+            while not queue.empty():
+                queue.get_nowait()
+
+    @staticmethod
+    def history_window(chat_history: List[ChatMessage]) -> List[ChatMessage]:
+        """Сообщения истории, отправляемые модели вместе с вопросом"""
+        return chat_history[-config.CHAT_HISTORY_MESSAGES:] if config.CHAT_HISTORY_MESSAGES else []
+
+    def _build_contents(
+        self,
+        query: str,
+        context: List[Dict],
+        chat_history: List[ChatMessage]
+    ) -> List[Dict]:
+        """
+        Собирает запрос к модели: ограниченная история сессии и финальный
+        промпт с контекстом и вопросом
+        """
+        # Убираем дубликаты и укладываем контекст в бюджет токенов
+        formatted_context = self._format_context(self.context_packer.pack(context))
+        
+        # Добавляем историю чата
+        contents = []
+        for msg in self.history_window(chat_history):
+            role = "model" if msg.role == "assistant" else "user"
+            # История должна начинаться с реплики пользователя
+            if not contents and role == "model":
+                continue
+            contents.append({"role": role, "parts": [msg.content]})
+        
+        # Формируем финальный промпт
+        contents.append({"role": "user", "parts": [
+            f"{SYSTEM_PROMPT}\n\n"
+            f"Context:\n{formatted_context}\n\n"
+            f"Question: {query}\n\n"
+            "Please provide a clear and structured answer based on the context above."
+        ]})
+        return contents
+
     def validate_response(self, response: str) -> bool:
         """
         Проверяет качество ответа
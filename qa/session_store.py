@@ -0,0 +1,179 @@
+# qa/session_store.py
+
+from typing import AsyncIterator, List, Dict, Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import json
+import logging
+
+import aiofiles
+
+from .gemini_handler import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ChatSession:
+    """Сессия чата"""
+    session_id: str
+    start_time: datetime
+    messages: List[ChatMessage]
+    metadata: Dict
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+def context_refs(context: Optional[Dict]) -> Optional[Dict]:
+    """
+    Заменяет полный текст найденного контекста ссылками на чанки
+    """
+    if not context or "retrieved" not in context:
+        return context
+    refs = []
+    for item in context["retrieved"]:
+        if item.get("id"):
+            refs.append({"id": item["id"], "score": item.get("score")})
+        else:
+            # У графовых результатов нет ID чанка, они короткие
+            refs.append({
+                "source": item.get("source"),
+                "content": item.get("content"),
+                "score": item.get("score")
+            })
+    return {**context, "retrieved": refs}
+
+class SessionStore:
+    """
+    Журнал сессий: по одному файлу JSONL на сессию, запись только дописыванием.
+
+    Каждый ход добавляет в журнал лишь свои новые записи. Записи журнала
+    не устаревают (заголовок пишется один раз, далее только сообщения),
+    поэтому журнал не требует компактирования.
+    """
+
+    def __init__(self, session_dir: str):
+        self.session_dir = Path(session_dir)
+        self.session_dir.mkdir(exist_ok=True)
+        # Блокировки существуют, пока ими кто-то пользуется:
+        # session_id -> [блокировка, число владельцев и ожидающих]
+        self._locks: Dict[str, list] = {}
+
+    def _path(self, session_id: str) -> Path:
+        return self.session_dir / f"{session_id}.jsonl"
+
+    def _legacy_path(self, session_id: str) -> Path:
+        return self.session_dir / f"{session_id}.json"
+
+    @asynccontextmanager
+    async def _lock(self, session_id: str) -> AsyncIterator[None]:
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[session_id]
+
+    @staticmethod
+    def _header(session: ChatSession) -> Dict:
+        return {
+            "type": "session",
+            "session_id": session.session_id,
+            "start_time": session.start_time.isoformat(),
+            "metadata": session.metadata
+        }
+
+    @staticmethod
+    def _message(message: ChatMessage) -> Dict:
+        return {
+            "type": "message",
+            "role": message.role,
+            "content": message.content,
+            "context": context_refs(message.context)
+        }
+
+    async def _append(self, session_id: str, records: List[Dict]) -> None:
+        async with self._lock(session_id):
+            async with aiofiles.open(self._path(session_id), "a", encoding="utf-8") as f:
+                await f.write("".join(_dumps(record) + "\n" for record in records))
+
+    async def create(self, session: ChatSession) -> None:
+        """Записывает заголовок новой сессии"""
+        await self._append(session.session_id, [self._header(session)])
+
+    async def append_messages(self, session_id: str, messages: List[ChatMessage]) -> None:
+        """Дописывает сообщения одного хода"""
+        await self._append(session_id, [self._message(message) for message in messages])
+
+    async def load(self, session_id: str) -> Optional[ChatSession]:
+        """Восстанавливает сессию из журнала (или из старого формата .json)"""
+        if not self._path(session_id).exists() and self._legacy_path(session_id).exists():
+            await self._migrate_legacy(session_id)
+
+        async with self._lock(session_id):
+            path = self._path(session_id)
+            if not path.exists():
+                return None
+            records = await asyncio.to_thread(self._read_records, path)
+
+        session = None
+        for record in records:
+            kind = record.get("type")
+            if kind == "session":
+                # Повторный заголовок не сбрасывает накопленные сообщения
+                session = ChatSession(
+                    session_id=record["session_id"],
+                    start_time=datetime.fromisoformat(record["start_time"]),
+                    messages=session.messages if session else [],
+                    metadata=record.get("metadata") or {}
+                )
+            elif kind == "metadata" and session is not None:
+                # Записи метаданных из журналов прежних версий
+                session.metadata = record["metadata"]
+            elif kind == "message" and session is not None:
+                session.messages.append(ChatMessage(
+                    role=record["role"],
+                    content=record["content"],
+                    context=record.get("context")
+                ))
+        return session
+
+    @staticmethod
+    def _read_records(path: Path) -> List[Dict]:
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Оборванная последняя строка после сбоя
+                    logger.warning(f"Skipping corrupt record in {path}")
+        return records
+
+    async def _migrate_legacy(self, session_id: str) -> None:
+        """Переводит сессию из старого формата (полный JSON) в журнал"""
+        legacy_path = self._legacy_path(session_id)
+        async with aiofiles.open(legacy_path, encoding="utf-8") as f:
+            data = json.loads(await f.read())
+        session = ChatSession(
+            session_id=data["session_id"],
+            start_time=datetime.fromisoformat(data["start_time"]),
+            messages=[
+                ChatMessage(role=m["role"], content=m["content"], context=m.get("context"))
+                for m in data.get("messages", [])
+            ],
+            metadata=data.get("metadata") or {}
+        )
+        await self.create(session)
+        await self.append_messages(session_id, session.messages)
+        legacy_path.unlink()
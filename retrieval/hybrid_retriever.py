@@ -0,0 +1,283 @@
+# retrieval/hybrid_retriever.py
+
+from typing import List, Dict, Optional, Tuple
+import asyncio
+import re
+from utils.config import config
+from utils.metrics import count_items, span, timed
+from utils.text import terms
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Идентификаторы: коды ошибок, артикулы, ключи конфигурации, имена из кода
+# (ERR-404, v1.2, MAX_CHUNK_TOKENS, HybridRetriever). Числа и обычные слова
+# через дефис идентификаторами не считаются
+_IDENTIFIER_RE = re.compile(
+    r"\b(?:"
+    r"[A-Za-z]+[-_.]?\d[\w.-]*"  # ERR-404, v1.2, sha256
+    r"|\w+_\w+"  # MAX_CHUNK_TOKENS, snake_case
+    r"|[A-Za-z][a-z]+[A-Z]\w*"  # HybridRetriever, getUser
+    r")"
+)
+
+class HybridRetriever:
+    def __init__(self, vector_store, graph_store, embedding_processor, lexical_index=None, entity_extractor=None):
+        self.vector_store = vector_store
+        self.graph_store = graph_store
+        self.embedding_processor = embedding_processor
+        self.lexical_index = lexical_index
+        self.entity_extractor = entity_extractor
+
+    @timed("retrieve")
+    async def retrieve(self, query: str, entities: List[str]) -> List[Dict]:
+        """
+        Выполняет гибридный поиск, комбинируя векторный и графовый поиск
+        """
+        try:
+            # Для запросов из идентификаторов эмбеддинг не нужен,
+            # если BM25 нашел совпадения
+            if self._is_keyword_query(query):
+                text_search = self._keyword_search(query)
+            else:
+                text_search = self._text_search(query)
+
+            # Параллельный запуск поисков
+            (lexical_results, query_embedding, vector_results), graph_results = await asyncio.gather(
+                text_search,
+                self._graph_search(entities, query)
+            )
+
+            # Объединение и ранжирование результатов
+            combined_results = await self._merge_results(
+                vector_results,
+                graph_results,
+                query,
+                lexical_results
+            )
+            if query_embedding is not None:
+                await self._attach_embeddings(combined_results)
+
+            with span("rerank"):
+                reranked = self._rerank(query, query_embedding, combined_results)
+            count_items("retrieve", len(reranked))
+            return reranked
+
+        except Exception as e:
+            logger.error(f"Error in hybrid retrieval: {str(e)}")
+            raise
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        """
+        Эмбеддинг запроса (из кэша, если запрос уже встречался)
+        """
+        return await self.embedding_processor.embed_query(query)
+
+    def cached_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """
+        Эмбеддинг запроса, если он уже был вычислен (например, при поиске);
+        API не вызывается
+        """
+        return self.embedding_processor.cached_query_embedding(query)
+
+    async def _vector_search(self, query: str) -> Tuple[np.ndarray, List[Dict]]:
+        """
+        Выполняет векторный поиск, возвращает эмбеддинг запроса и результаты
+        """
+        query_embedding = await self.embed_query(query)
+        results = await self.vector_store.search(
+            query_embedding,
+            top_k=config.TOP_K_VECTORS
+        )
+        return query_embedding, results
+
+    async def _lexical_search(self, query: str) -> List[Dict]:
+        """
+        Выполняет поиск по BM25-индексу в отдельном потоке
+        """
+        if self.lexical_index is None:
+            return []
+        with span("lexical_search"):
+            return await asyncio.to_thread(self.lexical_index.search, query, config.LEXICAL_TOP_K)
+
+    async def _text_search(self, query: str) -> Tuple[List[Dict], np.ndarray, List[Dict]]:
+        """
+        Лексический и векторный поиск параллельно
+        """
+        lexical_results, (query_embedding, vector_results) = await asyncio.gather(
+            self._lexical_search(query),
+            self._vector_search(query)
+        )
+        return lexical_results, query_embedding, vector_results
+
+    async def _keyword_search(self, query: str) -> Tuple[List[Dict], Optional[np.ndarray], List[Dict]]:
+        """
+        Сначала BM25; векторный поиск только если совпадений нет
+        """
+        lexical_results = await self._lexical_search(query)
+        if lexical_results:
+            return lexical_results, None, []
+        query_embedding, vector_results = await self._vector_search(query)
+        return lexical_results, query_embedding, vector_results
+
+    @staticmethod
+    def _is_keyword_query(query: str) -> bool:
+        """
+        Короткий запрос, содержащий идентификатор
+        """
+        return (
+            len(terms(query)) <= config.LEXICAL_ONLY_MAX_TERMS
+            and _IDENTIFIER_RE.search(query) is not None
+        )
+
+    async def _graph_search(self, entities: List[str], query: str = "") -> List[Dict]:
+        """
+        Выполняет поиск по графу. Если сущности не переданы,
+        они извлекаются из запроса (параллельно с векторным поиском)
+        """
+        if not entities and self.entity_extractor is not None:
+            entities = await self.entity_extractor.extract_query(query)
+        try:
+            return await self.graph_store.search_graph(entities)
+        except Exception as e:
+            # Недоступный граф не должен ломать векторный и лексический поиск
+            logger.warning(f"Graph search failed, continuing without graph results: {str(e)}")
+            return []
+
+    @timed("merge_results")
+    async def _merge_results(
+        self,
+        vector_results: List[Dict],
+        graph_results: List[Dict],
+        query: str,
+        lexical_results: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        Объединяет и ранжирует результаты поиска
+        """
+        merged = []
+        
+        # Добавляем векторные результаты
+        for vr in vector_results:
+            merged.append({
+                "id": vr.get("id"),
+                "content": vr["content"],
+                "metadata": vr["metadata"],
+                "score": 1 - vr["distance"],  # Конвертируем дистанцию в score
+                "embedding": vr.get("embedding"),
+                "source": "vector"
+            })
+
+        # Добавляем лексические результаты, которых нет среди векторных.
+        # BM25 нормируется на лучший результат запроса
+        if lexical_results:
+            seen = {item["id"] for item in merged}
+            top_bm25 = lexical_results[0]["bm25"]
+            for lr in lexical_results:
+                if lr["id"] in seen:
+                    continue
+                merged.append({
+                    "id": lr["id"],
+                    "content": lr["content"],
+                    "metadata": lr["metadata"],
+                    "score": lr["bm25"] / top_bm25 if top_bm25 > 0 else 0.0,
+                    "source": "lexical"
+                })
+
+        # Добавляем графовые результаты
+        for gr in graph_results:
+            merged.append({
+                "content": str(gr["entities"]),
+                "metadata": {"relations": gr["relations"]},
+                "score": config.GRAPH_PRIOR_SCORE,  # Базовый скор для графовых результатов
+                "source": "graph"
+            })
+
+        # Сортируем по score
+        merged.sort(key=lambda x: x["score"], reverse=True)
+        
+        return merged
+
+    async def _attach_embeddings(self, candidates: List[Dict]) -> None:
+        """
+        Добавляет векторы лексическим кандидатам, чтобы переранжировать их
+        по косинусу, как и векторные
+        """
+        missing = [c for c in candidates if c["source"] == "lexical" and c.get("embedding") is None]
+        if not missing:
+            return
+        embeddings = await self.vector_store.get_embeddings([c["id"] for c in missing])
+        for candidate in missing:
+            candidate["embedding"] = embeddings.get(candidate["id"])
+
+    @staticmethod
+    def _semantic_scores(
+        query_embedding: Optional[np.ndarray],
+        candidates: List[Dict]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Косинус запроса со всеми векторами чанков одним матричным умножением.
+        Возвращает score и маску кандидатов, для которых он посчитан; у
+        остальных (граф, BM25 без эмбеддинга запроса) остается исходный score.
+        """
+        scores = np.array([c["score"] for c in candidates], dtype=np.float32)
+        with_vectors = [i for i, c in enumerate(candidates) if c.get("embedding") is not None]
+        has_cosine = np.zeros(len(candidates), dtype=bool)
+        if query_embedding is None or not with_vectors:
+            return scores, has_cosine
+
+        matrix = np.asarray([candidates[i]["embedding"] for i in with_vectors], dtype=np.float32)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+        cosines = (matrix @ query_vector) / np.maximum(norms, 1e-12)
+        scores[with_vectors] = cosines
+        has_cosine[with_vectors] = True
+        return scores, has_cosine
+
+    @staticmethod
+    def _lexical_scores(query: str, candidates: List[Dict]) -> np.ndarray:
+        """
+        Доля терминов запроса, встречающихся в тексте кандидата
+        """
+        query_terms = sorted(set(terms(query)))
+        if not query_terms:
+            return np.zeros(len(candidates), dtype=np.float32)
+        hits = np.array(
+            [[term in content_terms for term in query_terms]
+             for content_terms in (set(terms(c["content"])) for c in candidates)],
+            dtype=np.float32
+        ).reshape(len(candidates), len(query_terms))
+        return hits.mean(axis=1)
+
+    def _rerank(self, query: str, query_embedding: Optional[np.ndarray], candidates: List[Dict]) -> List[Dict]:
+        """
+        Переранжирует кандидатов. Порог RERANKING_THRESHOLD применяется к
+        косинусу с запросом, порядок задает взвешенная сумма косинуса и
+        лексического совпадения. Возвращается не более RERANK_TOP_N.
+        """
+        if not candidates:
+            return []
+
+        semantic, has_cosine = self._semantic_scores(query_embedding, candidates)
+        scores = (
+            config.RERANK_SEMANTIC_WEIGHT * semantic
+            + config.RERANK_LEXICAL_WEIGHT * self._lexical_scores(query, candidates)
+        )
+        # Порог откалиброван по косинусу, поэтому применяется только к
+        # кандидатам с косинусом. Остальные ему не подлежат: графовые
+        # результаты найдены по точному совпадению сущностей, а BM25 без
+        # эмбеддинга запроса (запрос-идентификатор) нормирован на лучший
+        # результат и с косинусом несравним
+        keep = np.flatnonzero(~has_cosine | (semantic >= config.RERANKING_THRESHOLD))
+        order = keep[np.argsort(-scores[keep], kind="stable")][:config.RERANK_TOP_N]
+
+        reranked = []
+        for i in order:
+            item = {k: v for k, v in candidates[i].items() if k != "embedding"}
+            item["score"] = float(scores[i])
+            reranked.append(item)
+
+        logger.debug(f"Reranked {len(candidates)} candidates, kept {len(reranked)}")
+        return reranked
@@ -0,0 +1,200 @@
+# storage/embedding_cache.py
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+import logging
+
+from storage.mmap_matrix import MmapMatrix
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of embedding vectors.
+
+    Keys are hashes of (model, task_type, text). The SQLite index maps each
+    key to a slot in a memory-mapped float32 matrix; when the cache is full
+    the least recently used slots are evicted and reused.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.cache_dir / "index.sqlite"),
+            check_same_thread=False
+        )
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+            CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._vectors: Optional[MmapMatrix] = None
+        if self.dim is not None:
+            self._vectors = MmapMatrix(self.cache_dir / "vectors.f32", self.dim)
+
+        row = self._conn.execute("SELECT MAX(slot) FROM entries").fetchone()
+        free_max = self._conn.execute("SELECT MAX(slot) FROM free_slots").fetchone()
+        self._next_slot = max(
+            row[0] if row[0] is not None else -1,
+            free_max[0] if free_max[0] is not None else -1
+        ) + 1
+        self._size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, task_type, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up vectors for the given keys; missing keys are omitted
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            if self._vectors is not None and keys:
+                unique_keys = list(dict.fromkeys(keys))
+                slots: Dict[str, int] = {}
+                for i in range(0, len(unique_keys), _SQL_BATCH):
+                    batch = unique_keys[i:i + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    slots.update(self._conn.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall())
+
+                if slots:
+                    hit_keys = list(slots)
+                    vectors = self._vectors.read([slots[k] for k in hit_keys])
+                    found = dict(zip(hit_keys, vectors))
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE entries SET last_access = ? WHERE key = ?",
+                        [(now, k) for k in hit_keys]
+                    )
+                    self._conn.commit()
+
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """
+        Store vectors, evicting least recently used entries when full
+        """
+        if not items:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self.dim = len(next(iter(items.values())))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)",
+                    (str(self.dim),)
+                )
+                self._vectors = MmapMatrix(self.cache_dir / "vectors.f32", self.dim)
+
+            new_items = {
+                key: vector for key, vector in items.items()
+                if len(vector) == self.dim
+            }
+            if len(new_items) != len(items):
+                logger.warning(
+                    f"Skipping {len(items) - len(new_items)} vectors with dimension "
+                    f"other than {self.dim}"
+                )
+
+            existing = set()
+            keys = list(new_items)
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(k for (k,) in self._conn.execute(
+                    f"SELECT key FROM entries WHERE key IN ({placeholders})",
+                    batch
+                ))
+            keys = [k for k in keys if k not in existing][:self.max_entries]
+            if not keys:
+                return
+
+            overflow = self._size + len(keys) - self.max_entries
+            if overflow > 0:
+                self._evict(overflow)
+
+            slots = self._allocate_slots(len(keys))
+            self._vectors.write(slots, np.stack([new_items[k] for k in keys]).astype(np.float32))
+            self._vectors.flush()
+
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO entries (key, slot, last_access) VALUES (?, ?, ?)",
+                [(k, slot, now) for k, slot in zip(keys, slots)]
+            )
+            self._conn.commit()
+            self._size += len(keys)
+
+    def _evict(self, count: int) -> None:
+        rows = self._conn.execute(
+            "SELECT key, slot FROM entries ORDER BY last_access LIMIT ?",
+            (count,)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in rows])
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO free_slots (slot) VALUES (?)",
+            [(slot,) for _, slot in rows]
+        )
+        self._size -= len(rows)
+
+    def _allocate_slots(self, count: int) -> List[int]:
+        slots = [s for (s,) in self._conn.execute(
+            "SELECT slot FROM free_slots LIMIT ?", (count,)
+        )]
+        self._conn.executemany("DELETE FROM free_slots WHERE slot = ?", [(s,) for s in slots])
+        while len(slots) < count:
+            slots.append(self._next_slot)
+            self._next_slot += 1
+        return slots
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+            "max_entries": self.max_entries
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._conn.close()
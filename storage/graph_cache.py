@@ -0,0 +1,171 @@
+# storage/graph_cache.py
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+import logging
+
+from utils.text import entity_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class NeighborhoodCache:
+    """
+    In-process copy of the entity graph for k-hop expansion.
+
+    Adjacency is stored CSR-style (``indptr``/``indices``/``edge_ids``),
+    with every relationship listed under both endpoints because graph
+    searches ignore direction. Writes made after loading are kept in a small
+    delta adjacency and folded into the CSR arrays once the delta exceeds
+    ``rebuild_ratio`` of the stored edges.
+
+    Not thread-safe: intended to be used from the event loop.
+    """
+
+    def __init__(self, rebuild_ratio: float = 0.1):
+        self.rebuild_ratio = rebuild_ratio
+        self.ready = False
+
+        self._node_index: Dict[str, int] = {}
+        self._values: List[Optional[str]] = []
+        # entity_key(value) -> nodes; searches ignore letter case like entity IDs
+        self._by_key: Dict[str, Set[int]] = {}
+
+        # Edge id -> (source node, target node, label); keys mirror the MERGE pattern
+        self._edges: List[Tuple[int, int, int]] = []
+        self._edge_keys: Set[Tuple[int, int, str, Optional[str]]] = set()
+        self._labels: List[str] = []
+        self._label_index: Dict[str, int] = {}
+
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._edge_ids = np.zeros(0, dtype=np.int32)
+        self._compacted_edges = 0
+        # node -> [(neighbor, edge id)] for edges added since the last rebuild
+        self._delta: Dict[int, List[Tuple[int, int]]] = {}
+
+    def _node(self, entity_id: str) -> int:
+        index = self._node_index.get(entity_id)
+        if index is None:
+            index = len(self._values)
+            self._node_index[entity_id] = index
+            self._values.append(None)
+        return index
+
+    def _set_value(self, node: int, value: Optional[str]) -> None:
+        old = self._values[node]
+        if old == value:
+            return
+        if old is not None:
+            old_key = entity_key(old)
+            self._by_key[old_key].discard(node)
+            if not self._by_key[old_key]:
+                del self._by_key[old_key]
+        self._values[node] = value
+        if value is not None:
+            self._by_key.setdefault(entity_key(value), set()).add(node)
+
+    def _label(self, label: str) -> int:
+        index = self._label_index.get(label)
+        if index is None:
+            index = len(self._labels)
+            self._label_index[label] = index
+            self._labels.append(label)
+        return index
+
+    def add_entities(self, entities: Iterable[Dict]) -> None:
+        """Adds or updates nodes from rows with ``id`` and ``value``"""
+        for entity in entities:
+            if entity.get("id") is None:
+                continue
+            self._set_value(self._node(entity["id"]), entity.get("value"))
+
+    def add_relations(self, relations: Iterable[Dict], label: str = "RELATES") -> None:
+        """
+        Adds relationships from rows with ``source_id``, ``target_id`` and
+        ``relation_type``; rows whose endpoints are unknown are skipped,
+        like the MATCH in the write query
+        """
+        for relation in relations:
+            source = self._node_index.get(relation.get("source_id"))
+            target = self._node_index.get(relation.get("target_id"))
+            if source is None or target is None:
+                continue
+            rel_label = relation.get("label", label)
+            key = (source, target, rel_label, relation.get("relation_type"))
+            if key in self._edge_keys:
+                continue
+            self._edge_keys.add(key)
+            edge_id = len(self._edges)
+            self._edges.append((source, target, self._label(rel_label)))
+            self._delta.setdefault(source, []).append((target, edge_id))
+            self._delta.setdefault(target, []).append((source, edge_id))
+
+        if len(self._edges) - self._compacted_edges > max(1, self.rebuild_ratio * self._compacted_edges):
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        """Folds all edges into fresh CSR arrays"""
+        n_nodes = len(self._values)
+        if self._edges:
+            edges = np.asarray(self._edges, dtype=np.int64)
+            edge_ids = np.arange(len(edges), dtype=np.int64)
+            # Each edge is listed under both endpoints
+            owners = np.concatenate([edges[:, 0], edges[:, 1]])
+            neighbors = np.concatenate([edges[:, 1], edges[:, 0]])
+            ids = np.concatenate([edge_ids, edge_ids])
+            order = np.argsort(owners, kind="stable")
+            counts = np.bincount(owners, minlength=n_nodes)
+        else:
+            order = neighbors = ids = np.zeros(0, dtype=np.int64)
+            counts = np.zeros(n_nodes, dtype=np.int64)
+
+        self._indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._indices = neighbors[order].astype(np.int32)
+        self._edge_ids = ids[order].astype(np.int32)
+        self._compacted_edges = len(self._edges)
+        self._delta = {}
+
+    def _neighbors(self, node: int) -> List[Tuple[int, int]]:
+        result = []
+        if node + 1 < len(self._indptr):
+            start, end = self._indptr[node], self._indptr[node + 1]
+            result.extend(zip(self._indices[start:end].tolist(), self._edge_ids[start:end].tolist()))
+        result.extend(self._delta.get(node, ()))
+        return result
+
+    def search(self, query_entities: List[str], max_depth: int, limit: int) -> List[Dict]:
+        """
+        Paths of 1..max_depth relationships starting at entities with the
+        given values in any letter case, shortest first; a relationship is not reused within a
+        path, as in Cypher
+        """
+        keys = dict.fromkeys(entity_key(value) for value in query_entities)
+        starts = [node for key in keys for node in sorted(self._by_key.get(key, ()))]
+        queue = deque(((node,), ()) for node in starts)
+        paths = []
+        while queue and len(paths) < limit:
+            nodes, edges = queue.popleft()
+            for neighbor, edge_id in self._neighbors(nodes[-1]):
+                if edge_id in edges:
+                    continue
+                path_nodes, path_edges = nodes + (neighbor,), edges + (edge_id,)
+                paths.append({
+                    "entities": [self._values[node] for node in path_nodes],
+                    "relations": [self._labels[self._edges[e][2]] for e in path_edges]
+                })
+                if len(paths) >= limit:
+                    break
+                if len(path_edges) < max_depth:
+                    queue.append((path_nodes, path_edges))
+        return paths
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "ready": self.ready,
+            "nodes": len(self._values),
+            "edges": len(self._edges),
+            "delta_edges": len(self._edges) - self._compacted_edges
+        }
@@ -1,72 +1,286 @@
 # storage/graph_store.py
 
-from neo4j import GraphDatabase
-from typing import List, Dict, Optional
+from neo4j import AsyncGraphDatabase, Query
+from typing import List, Dict, Optional, Tuple
+from storage.graph_cache import NeighborhoodCache
 from utils.config import config
+from utils.metrics import timed
+from utils.text import entity_key
+import asyncio
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ограничения и индексы, без которых MERGE/MATCH по сущностям сканируют все узлы
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT entity_id IF NOT EXISTS FOR (e:Entity) REQUIRE e.id IS UNIQUE",
+    "CREATE INDEX entity_key IF NOT EXISTS FOR (e:Entity) ON (e.key)",
+]
+
+# Ключ поиска (entity_key) для узлов, записанных до появления свойства key
+BACKFILL_ENTITY_KEYS = """
+    MATCH (e:Entity)
+    WHERE e.key IS NULL AND e.value IS NOT NULL
+    SET e.key = toLower(e.value)
+"""
+
+ENTITY_FIELDS = ("id", "type", "value", "source", "position")
+RELATION_FIELDS = ("source_id", "target_id", "relation_type", "confidence", "context")
+
+MERGE_ENTITIES = """
+    UNWIND $rows AS row
+    MERGE (e:Entity {id: row.id})
+    SET e.type = row.type,
+        e.value = row.value,
+        e.key = row.key,
+        e.source = row.source,
+        e.position = row.position
+"""
+
+MERGE_RELATIONS = """
+    UNWIND $rows AS row
+    MATCH (source:Entity {id: row.source_id})
+    MATCH (target:Entity {id: row.target_id})
+    MERGE (source)-[r:RELATES {type: row.relation_type}]->(target)
+    SET r.confidence = row.confidence,
+        r.context = row.context
+"""
+
+LOAD_ENTITIES = "MATCH (e:Entity) RETURN e.id AS id, e.value AS value"
+
+LOAD_RELATIONS = """
+    MATCH (source:Entity)-[r]->(target:Entity)
+    RETURN source.id AS source_id, target.id AS target_id,
+           type(r) AS label, r.type AS relation_type
+"""
+
+# Те же узлы и связи, что читают LOAD_ENTITIES и LOAD_RELATIONS
+COUNT_ENTITIES = "MATCH (e:Entity) RETURN count(e) AS count"
+COUNT_RELATIONS = "MATCH (:Entity)-[r]->(:Entity) RETURN count(r) AS count"
+
 class GraphStore:
-    def __init__(self):
-        self.driver = GraphDatabase.driver(
+    def __init__(self, driver=None, neighborhood_cache: Optional[NeighborhoodCache] = None):
+        self.driver = driver or AsyncGraphDatabase.driver(
             config.NEO4J_URI,
-            auth=(config.NEO4J_USER, config.NEO4J_PASSWORD)
+            auth=(config.NEO4J_USER, config.NEO4J_PASSWORD),
+            max_connection_pool_size=config.NEO4J_POOL_SIZE,
+            connection_acquisition_timeout=config.NEO4J_ACQUISITION_TIMEOUT
         )
+        self.batch_size = config.GRAPH_BATCH_SIZE
+        # Схема создается при старте, а если Neo4j недоступен - перед первой записью
+        self.schema_ready = False
+
+        # Копия графа в памяти для поиска соседей без обращения к Neo4j
+        if neighborhood_cache is None and config.GRAPH_CACHE_ENABLED:
+            neighborhood_cache = NeighborhoodCache(rebuild_ratio=config.GRAPH_CACHE_REBUILD_RATIO)
+        self.neighborhood_cache = neighborhood_cache
+        # Записи, завершившиеся во время загрузки кэша (применяются после нее)
+        self._pending_writes: Optional[List[tuple]] = None
+        self._load_lock = asyncio.Lock()
+
+        # Граф могут менять другие процессы (python main.py ingest, другие
+        # воркеры), поэтому не чаще раза в cache_check_interval секунд
+        # число узлов и связей в Neo4j сверяется с кэшем
+        self.cache_check_interval = config.GRAPH_CACHE_CHECK_INTERVAL
+        self.cache_reloads = 0
+        self._cache_checked = time.monotonic()
+        # Разница счетчиков Neo4j и кэша на момент загрузки
+        self._count_offset: Optional[Tuple[int, int]] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        await self.driver.close()
+
+    async def ensure_schema(self) -> None:
+        """
+        Создает ограничения и индексы для узлов Entity и заполняет ключи
+        поиска у узлов без них
+        """
+        try:
+            async with self.driver.session() as session:
+                for statement in SCHEMA_STATEMENTS + [BACKFILL_ENTITY_KEYS]:
+                    result = await session.run(statement)
+                    await result.consume()
+            self.schema_ready = True
+        except Exception as e:
+            logger.error(f"Error creating graph schema: {str(e)}")
+            raise
+
+    async def load_neighborhood_cache(self) -> None:
+        """
+        Загружает граф из Neo4j в новый кэш соседей и подменяет им текущий;
+        до окончания загрузки поиск обслуживает прежний кэш
+        """
+        if self.neighborhood_cache is None:
+            return
+        async with self._load_lock:
+            cache = NeighborhoodCache(rebuild_ratio=self.neighborhood_cache.rebuild_ratio)
+            self._pending_writes = []
+            try:
+                async with self.driver.session() as session:
+                    # Счетчики до чтения графа: запись между ними приведет
+                    # к лишней перезагрузке, но не к пропущенной
+                    counts = await self._graph_counts(session)
+                    result = await session.run(LOAD_ENTITIES)
+                    cache.add_entities([record.data() async for record in result])
+                    result = await session.run(LOAD_RELATIONS)
+                    cache.add_relations([record.data() async for record in result])
+
+                # Повторное применение записей безопасно: кэш, как и MERGE, идемпотентен
+                for entity_rows, relation_rows in self._pending_writes:
+                    cache.add_entities(entity_rows)
+                    cache.add_relations(relation_rows)
+                cache.rebuild()
+                cache.ready = True
+
+                stats = cache.stats()
+                self._count_offset = (counts[0] - stats["nodes"], counts[1] - stats["edges"])
+                self._cache_checked = time.monotonic()
+                self.neighborhood_cache = cache
+                self.cache_reloads += 1
+                logger.info(f"Loaded neighborhood cache: {stats}")
+
+            except Exception as e:
+                logger.error(f"Error loading neighborhood cache: {str(e)}")
+                raise
 
-    def close(self):
-        self.driver.close()
+            finally:
+                self._pending_writes = None
 
+    @staticmethod
+    async def _graph_counts(session) -> Tuple[int, int]:
+        counts = []
+        for query in (COUNT_ENTITIES, COUNT_RELATIONS):
+            result = await session.run(query)
+            record = await result.single()
+            counts.append(record["count"])
+        return counts[0], counts[1]
+
+    def _schedule_cache_check(self) -> None:
+        """
+        Запускает в фоне сверку кэша с Neo4j, если с прошлой прошло
+        больше cache_check_interval секунд
+        """
+        if self._refresh_task is not None:
+            return
+        if time.monotonic() - self._cache_checked < self.cache_check_interval:
+            return
+        self._cache_checked = time.monotonic()
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_cache())
+
+    async def _refresh_cache(self) -> None:
+        """
+        Перезагружает кэш, если граф в Neo4j изменился в обход этого процесса
+        (или если кэш еще не загружен)
+        """
+        try:
+            cache = self.neighborhood_cache
+            if cache.ready and self._count_offset is not None:
+                async with self.driver.session() as session:
+                    nodes, edges = await self._graph_counts(session)
+                stats = cache.stats()
+                if (nodes - stats["nodes"], edges - stats["edges"]) == self._count_offset:
+                    return
+                logger.info("Graph changed outside this process, reloading neighborhood cache")
+            await self.load_neighborhood_cache()
+
+        except Exception as e:
+            logger.warning(f"Neighborhood cache check failed: {str(e)}")
+
+        finally:
+            self._refresh_task = None
+
+    async def _write_batches(self, session, query: str, rows: List[Dict]) -> None:
+        """
+        Пишет строки пачками по batch_size, каждая пачка - отдельная транзакция
+        """
+        async def write(tx, batch):
+            result = await tx.run(query, rows=batch)
+            await result.consume()
+
+        for i in range(0, len(rows), self.batch_size):
+            await session.execute_write(write, rows[i:i + self.batch_size])
+
+    @timed("graph_write")
     async def create_knowledge_graph(self, entities: List[Dict], relations: List[Dict]) -> None:
         """
         Создает граф знаний из извлеченных сущностей и отношений
         """
         try:
-            with self.driver.session() as session:
-                # Создаем сущности
-                for entity in entities:
-                    session.run("""
-                        MERGE (e:Entity {id: $id})
-                        SET e.type = $type,
-                            e.value = $value,
-                            e.source = $source,
-                            e.position = $position
-                    """, entity)
-
-                # Создаем отношения
-                for relation in relations:
-                    session.run("""
-                        MATCH (source:Entity {id: $source_id})
-                        MATCH (target:Entity {id: $target_id})
-                        MERGE (source)-[r:RELATES {type: $relation_type}]->(target)
-                        SET r.confidence = $confidence,
-                            r.context = $context
-                    """, relation)
-
-            logger.info("Successfully created knowledge graph")
+            if not self.schema_ready:
+                await self.ensure_schema()
+
+            entity_rows = [{field: entity.get(field) for field in ENTITY_FIELDS} for entity in entities]
+            for row in entity_rows:
+                row["key"] = entity_key(row["value"]) if row["value"] is not None else None
+            relation_rows = [{field: relation.get(field) for field in RELATION_FIELDS} for relation in relations]
+
+            async with self.driver.session() as session:
+                # Сначала сущности, чтобы отношения нашли оба конца
+                await self._write_batches(session, MERGE_ENTITIES, entity_rows)
+                await self._write_batches(session, MERGE_RELATIONS, relation_rows)
+
+            # Кэш соседей дополняется записанным, без перечитывания графа;
+            # идущая загрузка нового кэша применит запись после чтения графа
+            if self.neighborhood_cache is not None and self.neighborhood_cache.ready:
+                self.neighborhood_cache.add_entities(entity_rows)
+                self.neighborhood_cache.add_relations(relation_rows)
+            if self._pending_writes is not None:
+                self._pending_writes.append((entity_rows, relation_rows))
+
+            logger.info(
+                f"Successfully created knowledge graph: "
+                f"{len(entity_rows)} entities, {len(relation_rows)} relations"
+            )
 
         except Exception as e:
             logger.error(f"Error creating knowledge graph: {str(e)}")
             raise
 
-    async def search_graph(self, query_entities: List[str], max_depth: int = 2) -> List[Dict]:
+    @timed("search_graph")
+    async def search_graph(
+        self,
+        query_entities: List[str],
+        max_depth: int = config.GRAPH_MAX_DEPTH,
+        limit: int = config.GRAPH_SEARCH_LIMIT
+    ) -> List[Dict]:
         """
         Поиск в графе по сущностям
         """
+        if not query_entities:
+            return []
+
+        # Границы переменной длины пути нельзя передать параметром Cypher,
+        # поэтому глубина подставляется в текст после проверки
+        depth = int(max_depth)
+        if depth < 1:
+            raise ValueError(f"max_depth must be positive, got {max_depth}")
+
+        if self.neighborhood_cache is not None:
+            self._schedule_cache_check()
+            if self.neighborhood_cache.ready:
+                return self.neighborhood_cache.search(query_entities, depth, limit)
+
+        query = Query(f"""
+            MATCH path = (start:Entity)-[*1..{depth}]-(connected:Entity)
+            WHERE start.key IN $query_entities
+            RETURN [node in nodes(path) | node.value] as entity_values,
+                   [rel in relationships(path) | type(rel)] as relation_types
+            LIMIT $limit
+        """, timeout=config.GRAPH_QUERY_TIMEOUT)
+
         try:
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH path = (start:Entity)-[*1..{max_depth}]-(connected:Entity)
-                    WHERE start.value IN $query_entities
-                    RETURN path, 
-                           [node in nodes(path) | node.value] as entity_values,
-                           [rel in relationships(path) | type(rel)] as relation_types
-                    LIMIT 10
-                """, {"query_entities": query_entities, "max_depth": max_depth})
+            async with self.driver.session() as session:
+                # Сущности ищутся без учета регистра, как совпадают их ID
+                keys = list(dict.fromkeys(entity_key(value) for value in query_entities))
+                result = await session.run(query, query_entities=keys, limit=limit)
 
                 paths = []
-                for record in result:
+                async for record in result:
                     paths.append({
                         "entities": record["entity_values"],
                         "relations": record["relation_types"]
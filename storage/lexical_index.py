@@ -0,0 +1,240 @@
+# storage/lexical_index.py
+
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import asyncio
+import json
+import math
+import os
+import threading
+import logging
+
+from utils.text import terms
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over chunk texts.
+
+    Kept in memory and persisted as a snapshot plus an append-only JSONL
+    log of add/delete/metadata records written since the snapshot. The
+    snapshot stores each live chunk with its term frequencies, so loading
+    it does not re-tokenize the corpus. Once the log holds more records
+    than the snapshot has chunks (and at least ``snapshot_min_records``),
+    it is folded into a new snapshot; snapshots are therefore rewritten a
+    logarithmic number of times as the corpus grows. Mutations must come
+    from the event loop; tokenization and disk writes run in worker
+    threads. ``search`` may be called from a worker thread.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, snapshot_min_records: int = 1000):
+        self.path = Path(path)
+        self.snapshot_path = self.path.with_suffix(".snapshot.jsonl")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.snapshot_min_records = snapshot_min_records
+
+        # id -> (content, metadata, length)
+        self._docs: Dict[str, Tuple[str, Dict, int]] = {}
+        # term -> {id: term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        # Records in the log and chunks in the snapshot
+        self._records = 0
+        self._snapshot_chunks = 0
+        self._lock = asyncio.Lock()
+        # Guards the in-memory index against searches running in threads
+        self._index_lock = threading.Lock()
+
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _read_records(path: Path) -> Iterator[Dict]:
+        if not path.exists():
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Truncated last line after a crash
+                    logger.warning(f"Skipping corrupt record in {path}")
+
+    def _load(self) -> None:
+        for record in self._read_records(self.snapshot_path):
+            self._snapshot_chunks += 1
+            self._apply_add(record["id"], record["content"], record.get("metadata") or {}, record["terms"])
+
+        # Replaying is idempotent, so records already folded into the
+        # snapshot (after a crash before the log was emptied) are harmless
+        for record in self._read_records(self.path):
+            self._records += 1
+            op = record.get("op")
+            if op == "add":
+                self._apply_add(record["id"], record["content"], record.get("metadata") or {},
+                                Counter(terms(record["content"])))
+            elif op == "delete":
+                self._apply_delete(record["id"])
+            elif op == "metadata":
+                self._apply_metadata(record["id"], record.get("metadata") or {})
+
+        if self._needs_snapshot():
+            self._write_snapshot(list(self._docs.items()))
+        logger.info(f"Loaded lexical index with {len(self._docs)} chunks")
+
+    def _apply_add(self, doc_id: str, content: str, metadata: Dict, counts: Counter) -> None:
+        self._apply_delete(doc_id)
+        length = sum(counts.values())
+        self._docs[doc_id] = (content, metadata, length)
+        self._total_length += length
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def _apply_delete(self, doc_id: str) -> bool:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        content, _, length = doc
+        self._total_length -= length
+        for term in set(terms(content)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        return True
+
+    def _apply_metadata(self, doc_id: str, metadata: Dict) -> None:
+        doc = self._docs.get(doc_id)
+        if doc is not None:
+            self._docs[doc_id] = (doc[0], metadata, doc[2])
+
+    def _needs_snapshot(self) -> bool:
+        return self._records >= self.snapshot_min_records and self._records > self._snapshot_chunks
+
+    def _write_snapshot(self, docs: List[Tuple[str, Tuple[str, Dict, int]]]) -> None:
+        """Writes the given chunks as the new snapshot and empties the log"""
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for doc_id, (content, metadata, _) in docs:
+                f.write(_dumps({
+                    "id": doc_id,
+                    "content": content,
+                    "metadata": metadata,
+                    "terms": Counter(terms(content))
+                }) + "\n")
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.path, "w").close()
+        self._records = 0
+        self._snapshot_chunks = len(docs)
+
+    async def _append(self, records: List[Dict]) -> None:
+        def write() -> None:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(_dumps(record) + "\n" for record in records))
+
+        async with self._lock:
+            await asyncio.to_thread(write)
+            self._records += len(records)
+
+        if self._needs_snapshot():
+            await self.compact()
+
+    async def add(self, chunks: List[Dict]) -> None:
+        """
+        Indexes chunks ({id, content, metadata}); existing ids are replaced
+        """
+        if not chunks:
+            return
+        counts = await asyncio.to_thread(lambda: [Counter(terms(chunk["content"])) for chunk in chunks])
+        with self._index_lock:
+            for chunk, chunk_counts in zip(chunks, counts):
+                self._apply_add(chunk["id"], chunk["content"], chunk.get("metadata") or {}, chunk_counts)
+
+        await self._append([
+            {"op": "add", "id": chunk["id"], "content": chunk["content"], "metadata": chunk.get("metadata") or {}}
+            for chunk in chunks
+        ])
+
+    async def update_metadata(self, chunks: List[Dict]) -> None:
+        chunks = [chunk for chunk in chunks if chunk["id"] in self._docs]
+        with self._index_lock:
+            for chunk in chunks:
+                self._apply_metadata(chunk["id"], chunk["metadata"])
+        if chunks:
+            await self._append([
+                {"op": "metadata", "id": chunk["id"], "metadata": chunk["metadata"]}
+                for chunk in chunks
+            ])
+
+    async def delete(self, ids: List[str]) -> None:
+        with self._index_lock:
+            removed = [doc_id for doc_id in ids if self._apply_delete(doc_id)]
+        if removed:
+            await self._append([{"op": "delete", "id": doc_id} for doc_id in removed])
+
+    async def compact(self) -> None:
+        """Folds the log into a new snapshot of the live chunks"""
+        async with self._lock:
+            # Records appended after this copy go to the emptied log
+            with self._index_lock:
+                docs = list(self._docs.items())
+            await asyncio.to_thread(self._write_snapshot, docs)
+
+    def search(self, query: str, top_k: int = 10) -> List[Dict]:
+        """
+        BM25 search; returns id, content, metadata and the raw BM25 score
+        """
+        with self._index_lock:
+            return self._search(query, top_k)
+
+    def _search(self, query: str, top_k: int) -> List[Dict]:
+        n_docs = len(self._docs)
+        if not n_docs:
+            return []
+        avg_length = self._total_length / n_docs
+
+        scores: Dict[str, float] = {}
+        for term in set(terms(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                length = self._docs[doc_id][2]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {
+                "id": doc_id,
+                "content": self._docs[doc_id][0],
+                "metadata": self._docs[doc_id][1],
+                "bm25": score
+            }
+            for doc_id, score in best
+        ]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "chunks": len(self._docs),
+            "terms": len(self._postings),
+            "log_records": self._records,
+            "snapshot_chunks": self._snapshot_chunks
+        }
@@ -0,0 +1,76 @@
+# storage/mmap_matrix.py
+
+from pathlib import Path
+from typing import Union
+import numpy as np
+
+
+class MmapMatrix:
+    """
+    Growable row-major matrix backed by a memory-mapped file.
+
+    Rows are addressed by slot number; the file is extended geometrically
+    when a slot beyond the current capacity is written.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        dim: int,
+        dtype=np.float32,
+        initial_rows: int = 1024
+    ):
+        self.path = Path(path)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if not self.path.exists() or self.path.stat().st_size < self.row_bytes:
+            self._resize_file(initial_rows)
+        self._map()
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    def _resize_file(self, rows: int) -> None:
+        with open(self.path, "ab") as f:
+            f.truncate(rows * self.row_bytes)
+
+    def _map(self) -> None:
+        rows = self.path.stat().st_size // self.row_bytes
+        self._data = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(rows, self.dim))
+
+    def ensure_capacity(self, rows: int) -> None:
+        """
+        Grow the backing file so that at least ``rows`` slots are addressable
+        """
+        if rows <= self.capacity:
+            return
+        new_rows = max(rows, self.capacity * 2)
+        self._data.flush()
+        del self._data
+        self._resize_file(new_rows)
+        self._map()
+
+    def read(self, slots) -> np.ndarray:
+        """
+        Copy rows for the given slots out of the mapping
+        """
+        return np.array(self._data[np.asarray(slots, dtype=np.int64)])
+
+    def write(self, slots, rows: np.ndarray) -> None:
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots):
+            self.ensure_capacity(int(slots.max()) + 1)
+            self._data[slots] = rows
+
+    def view(self, rows: int) -> np.ndarray:
+        """
+        Zero-copy view over the first ``rows`` slots
+        """
+        return self._data[:rows]
+
+    def flush(self) -> None:
+        self._data.flush()
@@ -0,0 +1,391 @@
+# storage/mmap_vector_index.py
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import sqlite3
+import threading
+import numpy as np
+import logging
+
+from storage.mmap_matrix import MmapMatrix
+from storage.vector_backends import VectorBackend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class MmapVectorIndex(VectorBackend):
+    """
+    Embedded vector index without a separate server.
+
+    Unit-normalized float32 vectors live in a memory-mapped matrix, one row
+    per slot; ids, documents and metadata live in a SQLite side table keyed
+    by slot. Search is an exact brute-force dot product over the mapping.
+    Opening an existing index only reads the list of occupied slots.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.index_dir / "chunks.sqlite"),
+            check_same_thread=False
+        )
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                source_file TEXT,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source_file ON chunks(source_file);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        # Bumped on every vector write, so derived data can detect rows
+        # written without it (e.g. by a plain index on the same directory)
+        self._generation = int(row[0]) if row else 0
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._vectors: Optional[MmapMatrix] = None
+        if self.dim is not None:
+            self._open_vectors()
+
+        # Occupied slots; freed slots below the high-water mark are reused
+        slots = np.fromiter(
+            (slot for (slot,) in self._conn.execute("SELECT slot FROM chunks")),
+            dtype=np.int64
+        )
+        self._rows = int(slots.max()) + 1 if len(slots) else 0
+        self._valid = np.zeros(self._rows, dtype=bool)
+        self._valid[slots] = True
+        self._free: List[int] = np.flatnonzero(~self._valid).tolist()
+        self._size = len(slots)
+        logger.info(f"Opened vector index with {self._size} chunks")
+
+    def _open_vectors(self) -> None:
+        self._vectors = MmapMatrix(self.index_dir / "vectors.f32", self.dim)
+
+    def _set_dim(self, dim: int) -> None:
+        self.dim = dim
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)",
+            (str(dim),)
+        )
+        self._open_vectors()
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _slots_for(self, ids: List[str]) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        for i in range(0, len(ids), _SQL_BATCH):
+            batch = ids[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            slots.update(self._conn.execute(
+                f"SELECT id, slot FROM chunks WHERE id IN ({placeholders})",
+                batch
+            ).fetchall())
+        return slots
+
+    def _allocate_slots(self, count: int) -> List[int]:
+        slots = self._free[:count]
+        del self._free[:count]
+        while len(slots) < count:
+            slots.append(self._rows)
+            self._rows += 1
+        if self._rows > len(self._valid):
+            valid = np.zeros(max(self._rows, 2 * len(self._valid)), dtype=bool)
+            valid[:len(self._valid)] = self._valid
+            self._valid = valid
+        return slots
+
+    def _write_vectors(self, slots: List[int], embeddings: np.ndarray) -> None:
+        self._vectors.write(slots, embeddings)
+        self._vectors.flush()
+        # Committed together with the chunk rows by the caller
+        self._generation += 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+            (str(self._generation),)
+        )
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        if not ids:
+            return
+        embeddings = self._normalize(embeddings)
+        with self._lock:
+            if self._vectors is None:
+                self._set_dim(embeddings.shape[1])
+            if embeddings.shape[1] != self.dim:
+                raise ValueError(f"Expected embeddings of dimension {self.dim}, got {embeddings.shape[1]}")
+
+            # Last occurrence wins for ids repeated within one call
+            positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            ids = list(positions)
+            existing = self._slots_for(ids)
+            new_ids = [chunk_id for chunk_id in ids if chunk_id not in existing]
+            slots = dict(existing)
+            slots.update(zip(new_ids, self._allocate_slots(len(new_ids))))
+
+            order = [positions[chunk_id] for chunk_id in ids]
+            self._write_vectors([slots[chunk_id] for chunk_id in ids], embeddings[order])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, slot, source_file, document, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        chunk_id,
+                        slots[chunk_id],
+                        (metadatas[i] or {}).get("source_file"),
+                        documents[i],
+                        json.dumps(metadatas[i] or {}, ensure_ascii=False)
+                    )
+                    for chunk_id, i in zip(ids, order)
+                ]
+            )
+            self._conn.commit()
+            self._valid[[slots[chunk_id] for chunk_id in new_ids]] = True
+            self._size += len(new_ids)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET source_file = ?, metadata = ? WHERE id = ?",
+                [
+                    ((metadata or {}).get("source_file"), json.dumps(metadata or {}, ensure_ascii=False), chunk_id)
+                    for chunk_id, metadata in zip(ids, metadatas)
+                ]
+            )
+            self._conn.commit()
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            slots = self._slots_for(list(ids))
+            if not slots:
+                return
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(k,) for k in slots])
+            self._conn.commit()
+            freed = list(slots.values())
+            self._valid[freed] = False
+            self._free.extend(freed)
+            self._size -= len(freed)
+
+    def count(self) -> int:
+        return self._size
+
+    def get_by_source(self, source_file):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, metadata FROM chunks WHERE source_file = ?",
+                (source_file,)
+            ).fetchall()
+        return [chunk_id for chunk_id, _ in rows], [json.loads(metadata) for _, metadata in rows]
+
+    def scan(self, limit, offset):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, document, metadata FROM chunks ORDER BY slot LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return (
+            [chunk_id for chunk_id, _, _ in rows],
+            [document for _, document, _ in rows],
+            [json.loads(metadata) for _, _, metadata in rows]
+        )
+
+    def get_embeddings(self, ids):
+        with self._lock:
+            slots = self._slots_for(list(ids))
+            vectors = self._vectors.read(list(slots.values())) if slots else []
+        return dict(zip(slots, vectors))
+
+    def _views(self, rows: int) -> Dict[str, np.ndarray]:
+        """Matrices scanned by _candidate_slots, taken under the lock"""
+        return {"vectors": self._vectors.view(rows)}
+
+    def _candidate_slots(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        valid: np.ndarray,
+        views: Dict[str, np.ndarray]
+    ) -> np.ndarray:
+        """Slots of the top_k rows by dot product with the query"""
+        k = min(top_k, int(valid.sum()))
+        if not k:
+            return np.zeros(0, dtype=np.int64)
+        scores = views["vectors"] @ query
+        scores[~valid] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def query(self, embedding, top_k):
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or not self._size or top_k <= 0:
+                return []
+            if len(query) != self.dim:
+                raise ValueError(f"Expected a query of dimension {self.dim}, got {len(query)}")
+            rows = self._rows
+            valid = self._valid[:rows].copy()
+            views = self._views(rows)
+
+        # The scan runs without the lock, so searches proceed in parallel
+        # with each other and with writes. A row rewritten meanwhile may be
+        # scored by either version; the returned rows are read consistently
+        # below, and rows deleted meanwhile are left out.
+        slots = self._candidate_slots(query, top_k, valid, views).tolist()
+        if not slots:
+            return []
+
+        with self._lock:
+            placeholders = ",".join("?" * len(slots))
+            rows = {
+                slot: (chunk_id, document, metadata)
+                for chunk_id, slot, document, metadata in self._conn.execute(
+                    f"SELECT id, slot, document, metadata FROM chunks WHERE slot IN ({placeholders})",
+                    slots
+                )
+            }
+            slots = [slot for slot in slots if slot in rows]
+            vectors = self._vectors.read(slots)
+
+        results = []
+        for slot, vector in zip(slots, vectors):
+            chunk_id, document, metadata = rows[slot]
+            results.append({
+                "id": chunk_id,
+                "content": document,
+                "metadata": json.loads(metadata),
+                "distance": float(1.0 - vector @ query),
+                "embedding": vector
+            })
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._conn.close()
+
+
+class QuantizedMmapVectorIndex(MmapVectorIndex):
+    """
+    MmapVectorIndex whose candidate search scans int8 codes.
+
+    Each vector is stored as int8 codes scaled by its largest component,
+    a quarter of the float32 size, and only the codes are scanned. The
+    ``rescore_factor * top_k`` best candidates are then re-scored exactly
+    against the float32 rows, which stay on disk and are read only for
+    those candidates.
+    """
+
+    # Rows converted to float32 at a time during the scan; small enough
+    # for the converted block to stay in CPU cache
+    _SCAN_BLOCK = 512
+    _BUILD_BLOCK = 65536
+
+    def __init__(self, index_dir: str, rescore_factor: int = 4):
+        self.rescore_factor = rescore_factor
+        self._codes: Optional[MmapMatrix] = None
+        self._scales: Optional[MmapMatrix] = None
+        super().__init__(index_dir)
+
+    def _open_vectors(self) -> None:
+        super()._open_vectors()
+        built = self._conn.execute("SELECT value FROM meta WHERE key = 'int8_codes'").fetchone()
+        self._codes = MmapMatrix(self.index_dir / "vectors.i8", self.dim, dtype=np.int8)
+        self._scales = MmapMatrix(self.index_dir / "scales.f32", 1)
+        # The codes record the generation they were written at; vectors
+        # written since by a plain MmapVectorIndex make them stale
+        if built is None or built[0] != str(self._generation):
+            self._build_codes()
+
+    def _mark_codes(self) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('int8_codes', ?)",
+            (str(self._generation),)
+        )
+
+    def _build_codes(self) -> None:
+        """Quantizes vectors written while quantization was disabled"""
+        rows = self._conn.execute("SELECT MAX(slot) FROM chunks").fetchone()[0]
+        rows = rows + 1 if rows is not None else 0
+        for start in range(0, rows, self._BUILD_BLOCK):
+            slots = np.arange(start, min(start + self._BUILD_BLOCK, rows))
+            self._write_codes(slots, self._vectors.read(slots))
+        self._codes.flush()
+        self._scales.flush()
+        self._mark_codes()
+        self._conn.commit()
+        if rows:
+            logger.info(f"Quantized {rows} vector slots to int8")
+
+    @staticmethod
+    def quantize(vectors: np.ndarray):
+        """int8 codes and per-row scales such that vectors ~= codes * scales"""
+        scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def _write_codes(self, slots, vectors: np.ndarray) -> None:
+        codes, scales = self.quantize(vectors)
+        self._codes.write(slots, codes)
+        self._scales.write(slots, scales)
+
+    def _write_vectors(self, slots: List[int], embeddings: np.ndarray) -> None:
+        super()._write_vectors(slots, embeddings)
+        self._write_codes(slots, embeddings)
+        self._codes.flush()
+        self._scales.flush()
+        self._mark_codes()
+
+    def _views(self, rows: int) -> Dict[str, np.ndarray]:
+        views = super()._views(rows)
+        views["codes"] = self._codes.view(rows)
+        views["scales"] = self._scales.view(rows)[:, 0]
+        return views
+
+    def _candidate_slots(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        valid: np.ndarray,
+        views: Dict[str, np.ndarray]
+    ) -> np.ndarray:
+        k = min(top_k * self.rescore_factor, int(valid.sum()))
+        if not k:
+            return np.zeros(0, dtype=np.int64)
+        codes = views["codes"]
+        rows = len(codes)
+        scores = np.empty(rows, dtype=np.float32)
+        block = np.empty((self._SCAN_BLOCK, self.dim), dtype=np.float32)
+        for start in range(0, rows, self._SCAN_BLOCK):
+            end = min(start + self._SCAN_BLOCK, rows)
+            converted = block[:end - start]
+            np.copyto(converted, codes[start:end], casting="unsafe")
+            np.dot(converted, query, out=scores[start:end])
+        scores *= views["scales"]
+        scores[~valid] = -np.inf
+
+        candidates = np.argpartition(-scores, k - 1)[:k]
+
+        # Exact re-scoring against the float32 rows
+        exact = views["vectors"][candidates] @ query
+        best = np.argsort(-exact)[:min(top_k, k)]
+        return candidates[best]
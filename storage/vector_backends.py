@@ -0,0 +1,120 @@
+# storage/vector_backends.py
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+class VectorBackend(ABC):
+    """
+    Storage engine behind VectorStore.
+
+    Methods are synchronous and are called from worker threads, so
+    implementations must be thread-safe. Distances are cosine distances
+    (1 - cosine similarity).
+    """
+
+    max_batch_size: Optional[int] = None
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def get_by_source(self, source_file: str) -> Tuple[List[str], List[Dict]]:
+        """Ids and metadata of every chunk of one source file"""
+
+    @abstractmethod
+    def scan(self, limit: int, offset: int) -> Tuple[List[str], List[str], List[Dict]]:
+        """Page through stored (ids, documents, metadatas)"""
+
+    @abstractmethod
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors of the given chunks; unknown ids are left out"""
+
+    @abstractmethod
+    def query(self, embedding: np.ndarray, top_k: int) -> List[Dict]:
+        """Nearest chunks as dicts with id, content, metadata, distance, embedding"""
+
+    def close(self) -> None:
+        pass
+
+
+class ChromaBackend(VectorBackend):
+    """
+    Chroma collection persisted to ``persist_dir``
+    """
+
+    def __init__(self, persist_dir: str, collection_name: str):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=persist_dir)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+        if hasattr(self.client, "get_max_batch_size"):
+            # Chroma limits the number of records per call
+            self.max_batch_size = self.client.get_max_batch_size()
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get_by_source(self, source_file):
+        results = self.collection.get(where={"source_file": source_file}, include=["metadatas"])
+        return results['ids'], results['metadatas'] or []
+
+    def scan(self, limit, offset):
+        results = self.collection.get(include=["documents", "metadatas"], limit=limit, offset=offset)
+        return results['ids'], results['documents'], results['metadatas']
+
+    def get_embeddings(self, ids):
+        results = self.collection.get(ids=ids, include=["embeddings"])
+        return {
+            chunk_id: np.asarray(embedding, dtype=np.float32)
+            for chunk_id, embedding in zip(results['ids'], results['embeddings'])
+        }
+
+    def query(self, embedding, top_k):
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32)],
+            n_results=top_k,
+            include=["documents", "metadatas", "distances", "embeddings"]
+        )
+        return [
+            {
+                "id": chunk_id,
+                "content": doc,
+                "metadata": metadata,
+                "distance": distance,
+                "embedding": embedding
+            }
+            for chunk_id, doc, metadata, distance, embedding in zip(
+                results['ids'][0],
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0],
+                results['embeddings'][0]
+            )
+        ]
@@ -1,75 +1,222 @@
 # storage/vector_store.py
 
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Optional
+import asyncio
+import hashlib
+from typing import Callable, List, Dict, Optional, Set, Tuple
 import numpy as np
+from storage.vector_backends import VectorBackend, ChromaBackend
 from utils.config import config
+from utils.metrics import count_items, timed
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def create_backend(name: str) -> VectorBackend:
+    """
+    Создает движок хранения по имени из config.VECTOR_BACKEND
+    """
+    if name == "chroma":
+        return ChromaBackend(config.CHROMA_PERSIST_DIR, config.COLLECTION_NAME)
+    if name == "mmap":
+        from storage.mmap_vector_index import MmapVectorIndex, QuantizedMmapVectorIndex
+        if config.VECTOR_QUANTIZATION == "int8":
+            return QuantizedMmapVectorIndex(config.VECTOR_INDEX_DIR, config.VECTOR_RESCORE_FACTOR)
+        if config.VECTOR_QUANTIZATION is not None:
+            raise ValueError(f"Unknown vector quantization: {config.VECTOR_QUANTIZATION}")
+        return MmapVectorIndex(config.VECTOR_INDEX_DIR)
+    raise ValueError(f"Unknown vector backend: {name}")
+
 class VectorStore:
-    def __init__(self):
-        self.client = chromadb.Client(Settings(
-            persist_directory=config.CHROMA_PERSIST_DIR,
-            anonymized_telemetry=False
-        ))
-        
-        # Создаем или получаем коллекцию
-        self.collection = self.client.get_or_create_collection(
-            name=config.COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"}
-        )
+    def __init__(self, lexical_index=None, backend: Optional[VectorBackend] = None):
+        self.backend = backend or create_backend(config.VECTOR_BACKEND)
+
+        self.batch_size = config.VECTOR_UPSERT_BATCH_SIZE
+        if self.backend.max_batch_size:
+            # Движок может ограничивать число записей в одном вызове
+            self.batch_size = min(self.batch_size, self.backend.max_batch_size)
+
+        # BM25-индекс обновляется вместе с коллекцией
+        self.lexical_index = lexical_index
+
+        # Подписчики на изменение чанков (например, для сброса кэшей)
+        self._listeners: List[Callable[[List[str]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[str]], None]) -> None:
+        """
+        Регистрирует обработчик, вызываемый с ID записанных или удаленных чанков
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, ids: List[str]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(ids)
+            except Exception as e:
+                logger.error(f"Error in vector store listener: {str(e)}")
+
+    @staticmethod
+    def chunk_id(source_file: str, content: str, occurrence: int = 0) -> str:
+        """
+        Детерминированный ID чанка по его содержимому: не меняется при
+        повторной загрузке и при сдвиге чанка внутри файла.
+        occurrence различает одинаковые чанки в одном файле.
+        """
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        return f"{source_file}_{digest}_{occurrence}"
 
     async def add_documents(self, processed_elements: List[Dict]) -> None:
         """
         Добавляет документы в векторное хранилище
         """
+        chunks = []
+        occurrences: Dict[tuple, int] = {}
+        for element in processed_elements:
+            for chunk in element['chunks']:
+                key = (element['metadata']['source_file'], chunk['content'])
+                occurrences[key] = occurrences.get(key, -1) + 1
+                chunks.append({
+                    "id": self.chunk_id(*key, occurrences[key]),
+                    "content": chunk['content'],
+                    "embedding": chunk['embedding'],
+                    "metadata": {
+                        "source_file": element['metadata']['source_file'],
+                        "position": chunk['position'],
+                        "chunk_index": chunk.get('chunk_index', 0),
+                        "element_type": element['metadata']['element_type']
+                    }
+                })
+
+        await self.add_chunks(chunks)
+        logger.info(f"Successfully added {len(processed_elements)} documents to vector store")
+
+    @timed("vector_add_chunks")
+    async def add_chunks(self, chunks: List[Dict]) -> None:
+        """
+        Записывает чанки пачками: один upsert на пачку вместо вызова на каждый чанк.
+        Повторная загрузка тех же ID перезаписывает записи.
+        """
         try:
-            for element in processed_elements:
-                for chunk in element['chunks']:
-                    self.collection.add(
-                        embeddings=chunk['embedding'].tolist(),
-                        documents=chunk['content'],
-                        metadatas={
-                            "source_file": element['metadata']['source_file'],
-                            "position": chunk['position'],
-                            "element_type": element['metadata']['element_type']
-                        },
-                        ids=[f"{element['metadata']['source_file']}_{chunk['position']}"]
-                    )
-            
-            logger.info(f"Successfully added {len(processed_elements)} documents to vector store")
-            
+            for i in range(0, len(chunks), self.batch_size):
+                batch = chunks[i:i + self.batch_size]
+                await asyncio.to_thread(
+                    self.backend.upsert,
+                    ids=[chunk['id'] for chunk in batch],
+                    embeddings=np.stack([
+                        np.asarray(chunk['embedding'], dtype=np.float32) for chunk in batch
+                    ]),
+                    documents=[chunk['content'] for chunk in batch],
+                    metadatas=[chunk['metadata'] for chunk in batch]
+                )
+                if self.lexical_index is not None:
+                    await self.lexical_index.add(batch)
+                self._notify([chunk['id'] for chunk in batch])
+                count_items("vector_add_chunks", len(batch))
+
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
 
+    async def get_source_state(self, source_file: str) -> Tuple[Set[str], Set[str]]:
+        """
+        Возвращает ID чанков файла и набор отпечатков файла, с которыми они были записаны
+        """
+        try:
+            ids, metadatas = await asyncio.to_thread(self.backend.get_by_source, source_file)
+            file_hashes = {metadata.get("file_hash") for metadata in metadatas}
+            return set(ids), file_hashes
+
+        except Exception as e:
+            logger.error(f"Error reading source state from vector store: {str(e)}")
+            raise
+
+    async def update_metadata(self, chunks: List[Dict]) -> None:
+        """
+        Обновляет метаданные существующих чанков без пересчета эмбеддингов
+        """
+        try:
+            for i in range(0, len(chunks), self.batch_size):
+                batch = chunks[i:i + self.batch_size]
+                await asyncio.to_thread(
+                    self.backend.update_metadata,
+                    ids=[chunk['id'] for chunk in batch],
+                    metadatas=[chunk['metadata'] for chunk in batch]
+                )
+                if self.lexical_index is not None:
+                    await self.lexical_index.update_metadata(batch)
+
+        except Exception as e:
+            logger.error(f"Error updating vector store metadata: {str(e)}")
+            raise
+
+    async def delete_chunks(self, ids: List[str]) -> None:
+        """
+        Удаляет чанки по ID
+        """
+        try:
+            for i in range(0, len(ids), self.batch_size):
+                batch = ids[i:i + self.batch_size]
+                await asyncio.to_thread(self.backend.delete, batch)
+                if self.lexical_index is not None:
+                    await self.lexical_index.delete(batch)
+                self._notify(batch)
+
+        except Exception as e:
+            logger.error(f"Error deleting from vector store: {str(e)}")
+            raise
+
+    async def rebuild_lexical_index(self) -> None:
+        """
+        Заполняет пустой BM25-индекс чанками, уже лежащими в коллекции
+        """
+        if self.lexical_index is None or len(self.lexical_index):
+            return
+        try:
+            total = await asyncio.to_thread(self.backend.count)
+            for offset in range(0, total, self.batch_size):
+                ids, documents, metadatas = await asyncio.to_thread(
+                    self.backend.scan, self.batch_size, offset
+                )
+                await self.lexical_index.add([
+                    {"id": chunk_id, "content": doc, "metadata": metadata}
+                    for chunk_id, doc, metadata in zip(ids, documents, metadatas)
+                ])
+            if total:
+                logger.info(f"Rebuilt lexical index from {total} stored chunks")
+
+        except Exception as e:
+            logger.error(f"Error rebuilding lexical index: {str(e)}")
+            raise
+
+    async def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Векторы чанков по ID (отсутствующие чанки пропускаются)
+        """
+        if not ids:
+            return {}
+        try:
+            return await asyncio.to_thread(self.backend.get_embeddings, ids)
+
+        except Exception as e:
+            logger.error(f"Error reading embeddings from vector store: {str(e)}")
+            raise
+
+    @timed("vector_search")
     async def search(self, query_embedding: np.ndarray, top_k: int = 10) -> List[Dict]:
         """
-        Поиск похожих документов
+        Поиск похожих документов.
+        Векторы чанков возвращаются вместе с результатами для переранжирования
         """
         try:
-            results = self.collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=top_k
+            return await asyncio.to_thread(
+                self.backend.query,
+                np.asarray(query_embedding, dtype=np.float32),
+                top_k
             )
             
-            return [
-                {
-                    "content": doc,
-                    "metadata": metadata,
-                    "distance": distance
-                }
-                for doc, metadata, distance in zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )
-            ]
-            
         except Exception as e:
             logger.error(f"Error searching vector store: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def close(self) -> None:
+        self.backend.close()
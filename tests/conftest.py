@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# Modules are imported from the repository root, as when running main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,42 @@
+# tests/test_answer_cache.py
+
+import numpy as np
+
+from qa.answer_cache import AnswerCache, history_key
+from qa.gemini_handler import ChatMessage
+
+CONTEXT = [{"id": "c1", "content": "x"}, {"id": "c2", "content": "y"}]
+
+
+def test_similar_query_with_same_context_hits():
+    cache = AnswerCache(threshold=0.95, maxsize=10)
+    cache.store(np.array([1.0, 0.0]), CONTEXT, "answer")
+
+    assert cache.lookup(np.array([0.99, 0.05]), list(reversed(CONTEXT))) == "answer"
+    assert cache.lookup(np.array([0.0, 1.0]), CONTEXT) is None
+    assert cache.lookup(np.array([1.0, 0.0]), CONTEXT[:1]) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_history_is_part_of_the_key():
+    cache = AnswerCache(threshold=0.95, maxsize=10)
+    history = history_key([ChatMessage("user", "about Alice"), ChatMessage("assistant", "Alice is ...")])
+    cache.store(np.array([1.0, 0.0]), CONTEXT, "follow-up about Alice", history=history)
+
+    assert cache.lookup(np.array([1.0, 0.0]), CONTEXT) is None
+    other = history_key([ChatMessage("user", "about Bob")])
+    assert cache.lookup(np.array([1.0, 0.0]), CONTEXT, history=other) is None
+    assert cache.lookup(np.array([1.0, 0.0]), CONTEXT, history=history) == "follow-up about Alice"
+    assert history_key([]) == ""
+
+
+def test_changed_chunk_invalidates_and_size_is_bounded():
+    cache = AnswerCache(threshold=0.95, maxsize=2)
+    cache.store(np.array([1.0, 0.0]), CONTEXT, "a")
+    cache.invalidate(["c2"])
+    assert cache.lookup(np.array([1.0, 0.0]), CONTEXT) is None
+
+    for i in range(3):
+        cache.store(np.array([1.0, float(i)]), [{"id": f"k{i}"}], str(i))
+    assert cache.stats()["size"] == 2
+    assert cache._by_chunk.keys() == {"k1", "k2"}
@@ -0,0 +1,76 @@
+# tests/test_app.py
+
+import asyncio
+import re
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("unstructured.partition.auto")
+httpx = pytest.importorskip("httpx")
+
+import main
+from benchmarks.fakes import FakeGenAI, InMemoryGraphStore
+from storage.mmap_vector_index import MmapVectorIndex
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    # Relative config paths (caches, indexes, sessions) resolve under tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main.config, "NER_ENABLED", False)
+    fake = FakeGenAI(dim=32).install()
+    main.components.update(await main.init_components(
+        graph_store=InMemoryGraphStore(),
+        vector_backend=MmapVectorIndex(str(tmp_path / "vector_index"))
+    ))
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+    finally:
+        await main.shutdown_event()
+        main.components.clear()
+        fake.uninstall()
+
+
+def stage_count(metrics_text, stage):
+    match = re.search(rf'^rag_stage_duration_seconds_count\{{stage="{stage}"\}} (\d+)$', metrics_text, re.M)
+    return int(match.group(1)) if match else 0
+
+
+async def upload(client, path):
+    response = await client.post("/upload", json={"file_path": str(path)})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/upload/{job_id}")).json()
+        if job["status"] not in ("pending", "running"):
+            return job
+        await asyncio.sleep(0.05)
+
+
+INGEST_STAGES = ["partition", "chunk", "embed_texts", "embedding_cache_get", "store", "vector_add_chunks"]
+
+
+@pytest.mark.asyncio
+async def test_upload_and_chat_record_stage_histograms(client, tmp_path):
+    before = (await client.get("/metrics")).text
+    document = tmp_path / "doc.txt"
+    document.write_text(
+        "\n\n".join(f"Paragraph {i} explains how ERR-{i} is handled by the cache." for i in range(20)),
+        encoding="utf-8"
+    )
+
+    job = await upload(client, document)
+    assert job["status"] == "completed", job
+    assert job["stored"] > 0
+    response = await client.post("/chat", json={"session_id": "s1", "query": "How is ERR-3 handled?"})
+    assert response.status_code == 200
+
+    after = (await client.get("/metrics")).text
+    for stage in INGEST_STAGES + ["retrieve", "vector_search", "generate_response"]:
+        assert stage_count(after, stage) > stage_count(before, stage), stage
+    # Superseded entry points are no longer instrumented
+    for stage in ["process_document", "create_embeddings", "vector_add_documents"]:
+        assert f'stage="{stage}"' not in after
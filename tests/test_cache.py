@@ -0,0 +1,99 @@
+# tests/test_cache.py
+
+from utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" becomes least recently used
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.cache.time.monotonic", clock)
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_touch_on_get_extends_idle_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.cache.time.monotonic", clock)
+    cache = TTLCache(maxsize=10, ttl=60, touch_on_get=True)
+    cache.set("a", 1)
+
+    for _ in range(3):
+        clock.now += 50
+        assert cache.get("a") == 1
+    clock.now += 61
+    assert cache.get("a") is None
+
+
+def test_weight_bound_and_evict_callback():
+    evicted = []
+    cache = TTLCache(
+        maxsize=100,
+        max_weight=10,
+        weigher=len,
+        on_evict=lambda key, value: evicted.append(key)
+    )
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+
+    assert evicted == ["a"]
+    assert cache.weight == 8
+    # Replacing a value re-weighs it
+    cache.set("b", "x")
+    assert cache.weight == 5
+
+
+def test_single_oversized_entry_is_kept():
+    cache = TTLCache(maxsize=10, max_weight=3, weigher=len)
+    cache.set("a", "xxxxxx")
+    assert cache.get("a") == "xxxxxx"
+
+
+def test_stats_count_hits_and_misses():
+    cache = TTLCache(maxsize=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_peek_does_not_count_or_reorder():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    assert cache.peek("missing", "default") == "default"
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+    # "a" stays least recently used
+    cache.set("c", 3)
+    assert "a" not in cache
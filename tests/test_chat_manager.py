@@ -0,0 +1,134 @@
+# tests/test_chat_manager.py
+
+import asyncio
+from typing import List
+
+import pytest
+
+from qa.chat_manager import INVALID_RESPONSE, ChatManager
+from qa.gemini_handler import GeminiHandler
+from qa.session_store import SessionStore
+
+
+class FakeRetriever:
+    async def retrieve(self, query, entities):
+        return [{"content": "ctx", "metadata": {"chunk_id": "c1"}, "score": 0.9}]
+
+    def cached_query_embedding(self, query):
+        return None
+
+
+class FakeGeminiHandler:
+    """Streams the given parts; validation is the real one"""
+
+    history_window = staticmethod(GeminiHandler.history_window)
+    validate_response = GeminiHandler.validate_response
+
+    def __init__(self, parts: List[str]):
+        self.parts = parts
+
+    async def generate_response(self, query, context, chat_history):
+        return "".join(self.parts)
+
+    async def generate_response_stream(self, query, context, chat_history):
+        for part in self.parts:
+            yield part
+
+
+def manager(tmp_path, parts):
+    return ChatManager(FakeRetriever(), FakeGeminiHandler(parts), session_dir=str(tmp_path))
+
+
+async def stream(chat, query):
+    return [part async for part in chat.process_message_stream("s1", query)]
+
+
+@pytest.mark.asyncio
+async def test_streamed_answer_is_saved_when_valid(tmp_path):
+    chat = manager(tmp_path, ["Ответ на ", "вопрос по документации"])
+    assert await stream(chat, "q") == ["Ответ на ", "вопрос по документации"]
+
+    session = await SessionStore(str(tmp_path)).load("s1")
+    assert [(m.role, m.content) for m in session.messages] == [
+        ("user", "q"), ("assistant", "Ответ на вопрос по документации")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_invalid_streamed_answer_is_saved_as_fallback(tmp_path):
+    chat = manager(tmp_path, ["Извините, ", "произошла ошибка генерации"])
+    await stream(chat, "q")
+
+    session = await SessionStore(str(tmp_path)).load("s1")
+    assert session.messages[-1].content == INVALID_RESPONSE
+    # Same as the non-streaming path
+    chat = manager(tmp_path, ["Извините, ", "произошла ошибка генерации"])
+    assert await chat.process_message("s2", "q") == INVALID_RESPONSE
+
+
+@pytest.mark.asyncio
+async def test_empty_stream_yields_fallback(tmp_path):
+    chat = manager(tmp_path, [])
+    assert await stream(chat, "q") == [INVALID_RESPONSE]
+    assert chat.active_sessions.get("s1").messages[-1].content == INVALID_RESPONSE
+
+
+def count_loads(chat):
+    """Counts journal reads, yielding first so concurrent callers interleave"""
+    loads = []
+    original = chat.session_store.load
+
+    async def load(session_id):
+        loads.append(session_id)
+        await asyncio.sleep(0.01)
+        return await original(session_id)
+
+    chat.session_store.load = load
+    return loads
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_session_reload(tmp_path):
+    chat = manager(tmp_path, ["Ответ на вопрос по документации"])
+    await chat.process_message("s1", "q")
+    chat.active_sessions.pop("s1")
+    loads = count_loads(chat)
+
+    sessions = await asyncio.gather(*[chat.get_session("s1") for _ in range(5)])
+
+    assert loads == ["s1"]
+    assert all(session is sessions[0] for session in sessions)
+    assert len(sessions[0].messages) == 2
+    assert chat.session_reloads == 1
+    assert chat._loading == {}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_create_one_new_session(tmp_path):
+    chat = manager(tmp_path, [])
+    loads = count_loads(chat)
+
+    sessions = await asyncio.gather(*[chat.get_session("new") for _ in range(3)])
+
+    assert loads == ["new"]
+    assert all(session is sessions[0] for session in sessions)
+    assert chat.session_reloads == 0
+    lines = (tmp_path / "new.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_does_not_cancel_the_shared_load(tmp_path):
+    chat = manager(tmp_path, ["Ответ на вопрос по документации"])
+    await chat.process_message("s1", "q")
+    chat.active_sessions.pop("s1")
+    count_loads(chat)
+
+    first = asyncio.ensure_future(chat.get_session("s1"))
+    second = asyncio.ensure_future(chat.get_session("s1"))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    session = await second
+    assert len(session.messages) == 2
+    assert chat.active_sessions.get("s1") is session
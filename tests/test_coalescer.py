@@ -0,0 +1,110 @@
+# tests/test_coalescer.py
+
+import asyncio
+
+import pytest
+
+from utils.coalescer import BatchCoalescer
+
+
+class Recorder:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    async def __call__(self, items):
+        self.calls.append(list(items))
+        await asyncio.sleep(self.delay)
+        return [item * 10 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    batch_fn = Recorder()
+    coalescer = BatchCoalescer(batch_fn, window=0.01, max_batch=100)
+
+    results = await asyncio.gather(*[coalescer.submit(i, i) for i in range(5)])
+
+    assert results == [0, 10, 20, 30, 40]
+    assert batch_fn.calls == [[0, 1, 2, 3, 4]]
+    assert coalescer.stats()["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_duplicate_keys_share_a_result():
+    batch_fn = Recorder()
+    coalescer = BatchCoalescer(batch_fn, window=0.01, max_batch=100)
+
+    results = await asyncio.gather(*[coalescer.submit("k", 3) for _ in range(4)])
+
+    assert results == [30] * 4
+    assert batch_fn.calls == [[3]]
+    assert coalescer.stats()["shared"] == 3
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_flushed_without_waiting():
+    batch_fn = Recorder()
+    coalescer = BatchCoalescer(batch_fn, window=60, max_batch=2)
+    results = await asyncio.wait_for(asyncio.gather(coalescer.submit(1, 1), coalescer.submit(2, 2)), 1)
+    assert results == [10, 20]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_release_keys():
+    async def failing(items):
+        raise RuntimeError("api down")
+
+    coalescer = BatchCoalescer(failing, window=0.001, max_batch=10)
+    results = await asyncio.gather(coalescer.submit(1, 1), coalescer.submit(2, 2), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert coalescer._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_short_result_fails_the_batch_instead_of_hanging():
+    async def short(items):
+        return items[:-1]
+
+    coalescer = BatchCoalescer(short, window=0.001, max_batch=10)
+    results = await asyncio.wait_for(
+        asyncio.gather(coalescer.submit(1, 1), coalescer.submit(2, 2), return_exceptions=True),
+        1
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert coalescer._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_batch_does_not_poison_the_key():
+    started = asyncio.Event()
+    calls = []
+
+    async def slow_then_fast(items):
+        calls.append(items)
+        if len(calls) == 1:
+            started.set()
+            await asyncio.sleep(60)
+        return items
+
+    coalescer = BatchCoalescer(slow_then_fast, window=0.001, max_batch=10)
+    waiter = asyncio.ensure_future(coalescer.submit("k", 1))
+    await started.wait()
+    for task in list(coalescer._tasks):
+        task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert await asyncio.wait_for(coalescer.submit("k", 2), 1) == 2
+    assert coalescer._tasks == set()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_result():
+    batch_fn = Recorder(delay=0.05)
+    coalescer = BatchCoalescer(batch_fn, window=0.001, max_batch=10)
+    first = asyncio.ensure_future(coalescer.submit("k", 1))
+    second = asyncio.ensure_future(coalescer.submit("k", 1))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == 10
@@ -0,0 +1,65 @@
+# tests/test_context_packer.py
+
+from qa.context_packer import ContextPacker, _ITEM_OVERHEAD_TOKENS
+from utils.text import count_tokens
+
+
+def item(chunk_id, content, score, source="doc.txt", position=0, chunk_index=0):
+    return {
+        "id": chunk_id,
+        "content": content,
+        "score": score,
+        "metadata": {"source_file": source, "position": position, "chunk_index": chunk_index}
+    }
+
+
+def packer(budget=10_000, threshold=0.8):
+    return ContextPacker(token_budget=budget, dedup_threshold=threshold)
+
+
+def test_exact_duplicates_keep_best_score():
+    packed = packer().pack([
+        item("a", "alpha beta gamma delta", 0.5, source="x.txt"),
+        item("a", "alpha beta gamma delta", 0.9, source="x.txt"),
+    ])
+    assert len(packed) == 1
+    assert packed[0]["score"] == 0.9
+
+
+def test_near_duplicates_from_other_sources_are_dropped():
+    text = "the quick brown fox jumps over the lazy dog near the river bank"
+    packed = packer().pack([
+        item("a", text, 0.9, source="a.txt"),
+        item("b", text + " today", 0.8, source="b.txt"),
+        item("c", "completely different content about vector search", 0.7, source="c.txt"),
+    ])
+    assert [p["id"] for p in packed] == ["a", "c"]
+
+
+def test_overlapping_chunks_of_one_source_are_merged():
+    first = "One two three four five six seven eight nine ten eleven twelve."
+    second = "nine ten eleven twelve. Thirteen fourteen fifteen."
+    packed = packer().pack([
+        item("b", second, 0.6, position=0, chunk_index=1),
+        item("a", first, 0.8, position=0, chunk_index=0),
+    ])
+    assert len(packed) == 1
+    assert packed[0]["content"] == first + " Thirteen fourteen fifteen."
+    assert packed[0]["score"] == 0.8
+
+
+def test_token_budget_prefers_higher_scores():
+    texts = [f"topic{i} " + " ".join(f"w{i}x{j}" for j in range(20)) for i in range(3)]
+    per_item = count_tokens(texts[0]) + _ITEM_OVERHEAD_TOKENS
+    packed = packer(budget=2 * per_item).pack([
+        item("low", texts[0], 0.1, source="a.txt"),
+        item("high", texts[1], 0.9, source="b.txt"),
+        item("mid", texts[2], 0.5, source="c.txt"),
+    ])
+    assert [p["id"] for p in packed] == ["high", "mid"]
+
+
+def test_items_without_source_pass_through():
+    graph_hit = {"content": "['Alice', 'Bob']", "score": 0.5, "metadata": {"relations": ["RELATES"]}}
+    packed = packer().pack([graph_hit])
+    assert packed == [graph_hit]
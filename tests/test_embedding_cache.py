@@ -0,0 +1,64 @@
+# tests/test_embedding_cache.py
+
+import numpy as np
+
+from storage.embedding_cache import EmbeddingCache
+
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_roundtrip_and_persistence(tmp_path):
+    data = vectors(3)
+    keys = [EmbeddingCache.make_key("model", "retrieval_document", f"text {i}") for i in range(3)]
+
+    cache = EmbeddingCache(str(tmp_path), max_entries=10)
+    cache.put_many(dict(zip(keys, data)))
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path), max_entries=10)
+    found = reopened.get_many(keys + ["missing"])
+    assert set(found) == set(keys)
+    for key, vector in zip(keys, data):
+        np.testing.assert_array_equal(found[key], vector)
+    assert reopened.stats()["hits"] == 3
+    assert reopened.stats()["misses"] == 1
+    reopened.close()
+
+
+def test_key_depends_on_model_task_and_text():
+    base = EmbeddingCache.make_key("m", "task", "text")
+    assert base == EmbeddingCache.make_key("m", "task", "text")
+    assert base != EmbeddingCache.make_key("m2", "task", "text")
+    assert base != EmbeddingCache.make_key("m", "task2", "text")
+    assert base != EmbeddingCache.make_key("m", "task", "text2")
+
+
+def test_evicts_least_recently_used_and_reuses_slots(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("storage.embedding_cache.time.time", lambda: now[0])
+    data = vectors(4)
+    cache = EmbeddingCache(str(tmp_path), max_entries=3)
+
+    cache.put_many({"a": data[0], "b": data[1], "c": data[2]})
+    now[0] += 1
+    cache.get_many(["a"])  # "b" is now the least recently used
+    now[0] += 1
+    cache.put_many({"d": data[3]})
+
+    found = cache.get_many(["a", "b", "c", "d"])
+    assert set(found) == {"a", "c", "d"}
+    np.testing.assert_array_equal(found["d"], data[3])
+    assert cache.stats()["entries"] == 3
+    # The evicted slot is reused instead of growing the matrix
+    assert cache._next_slot == 3
+    cache.close()
+
+
+def test_skips_vectors_of_other_dimension(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=10)
+    cache.put_many({"a": np.ones(4, dtype=np.float32)})
+    cache.put_many({"b": np.ones(5, dtype=np.float32)})
+    assert set(cache.get_many(["a", "b"])) == {"a"}
+    cache.close()
@@ -0,0 +1,95 @@
+# tests/test_embedding_processor.py
+
+import pytest
+
+from processors.embedding_processor import EmbeddingProcessor
+from storage.embedding_cache import EmbeddingCache
+from utils.text import count_tokens
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setattr("processors.embedding_processor.config.EMBEDDING_CACHE_ENABLED", False)
+    processor = EmbeddingProcessor()
+    # Each test sentence is 8 tokens: three fit in a chunk, one overlaps
+    processor.max_chunk_tokens = 24
+    processor.chunk_overlap = 8
+    return processor
+
+
+def sentences(n):
+    return [f"Sentence number {i} talks about topic {i}." for i in range(n)]
+
+
+def test_short_text_is_one_chunk(processor):
+    assert processor.chunk_text("Just one sentence.") == ["Just one sentence."]
+    assert processor.chunk_text("   ") == []
+
+
+def test_chunks_are_whole_sentences_with_overlap(processor):
+    parts = sentences(7)
+    chunks = processor.chunk_text(" ".join(parts))
+
+    assert chunks == [
+        " ".join(parts[0:3]),
+        " ".join(parts[2:5]),
+        " ".join(parts[4:7])
+    ]
+    assert all(count_tokens(chunk) <= processor.max_chunk_tokens for chunk in chunks)
+
+
+def test_no_overlap_when_budget_is_smaller_than_a_sentence(processor):
+    processor.chunk_overlap = 4
+    parts = sentences(6)
+    chunks = processor.chunk_text(" ".join(parts))
+    assert chunks == [" ".join(parts[0:3]), " ".join(parts[3:6])]
+
+
+def test_long_sentence_is_split_by_tokens(processor):
+    text = " ".join(f"word{i}" for i in range(50))
+    chunks = processor.chunk_text(text)
+    assert len(chunks) >= 3
+    assert all(count_tokens(chunk) <= processor.max_chunk_tokens for chunk in chunks)
+    assert chunks[0].startswith("word0") and chunks[-1].endswith("word49")
+
+
+class RecordingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, model, content, task_type=None):
+        self.calls.append((task_type, list(content)))
+        return {"embedding": [[float(len(text)), 1.0] for text in content]}
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    embedder = RecordingEmbedder()
+    monkeypatch.setattr("processors.embedding_processor.genai.embed_content", embedder)
+    return embedder
+
+
+@pytest.mark.asyncio
+async def test_cached_query_embedding_is_not_a_cache_lookup(processor, embedder):
+    queries = [f"question {i}" for i in range(5)]
+    for query in queries:
+        await processor.embed_query(query)
+        assert processor.cached_query_embedding(query) is not None
+
+    stats = processor.query_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 5)
+    assert processor.cached_query_embedding("never asked") is None
+
+
+@pytest.mark.asyncio
+async def test_queries_bypass_the_persistent_cache(processor, embedder, tmp_path):
+    processor.cache = EmbeddingCache(str(tmp_path), max_entries=100)
+
+    await processor.embed_texts(["a document"])
+    await processor.embed_query("a question")
+    await processor.embed_query("A  question")  # same normalized query
+    await processor.embed_texts(["a document"])
+
+    assert embedder.calls == [("retrieval_document", ["a document"]), ("retrieval_query", ["a question"])]
+    assert processor.cache.stats()["entries"] == 1
+    processor.cache.close()
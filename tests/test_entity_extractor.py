@@ -0,0 +1,111 @@
+# tests/test_entity_extractor.py
+
+import sys
+import threading
+import types
+
+import pytest
+
+from processors.entity_extractor import CO_OCCURS, EntityExtractor, _spans_from_tags, entity_id
+from utils.config import config
+
+
+class FakeModel:
+    """Tags capitalized words as ORG and records each batch"""
+
+    def __init__(self):
+        self.batches = []
+        self.threads = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.threads.append(threading.current_thread().name)
+        tokens = [text.replace(".", "").split() for text in texts]
+        tags = [["B-ORG" if token[0].isupper() else "O" for token in sentence] for sentence in tokens]
+        return tokens, tags
+
+
+@pytest.fixture
+def extractor():
+    extractor = EntityExtractor()
+    extractor._model = FakeModel()
+    yield extractor
+    extractor.close()
+
+
+def test_spans_from_tags_collapses_bio_runs():
+    tokens = ["New", "York", "Times", "and", "Bob", "Smith", "Acme"]
+    tags = ["B-ORG", "I-ORG", "I-ORG", "O", "B-PER", "I-PER", "I-ORG"]
+    assert _spans_from_tags(tokens, tags) == [("New York Times", "ORG"), ("Bob Smith", "PER"), ("Acme", "ORG")]
+
+
+@pytest.mark.asyncio
+async def test_pieces_of_all_texts_are_tagged_in_shared_batches(extractor):
+    extractor.batch_size = 2
+    texts = ["Acme hired Bob. Then Acme grew.", "Carol left.", "no entities here"]
+
+    results = await extractor.extract(texts)
+
+    # Four sentence pieces from three texts, tagged two at a time
+    assert [len(batch) for batch in extractor._model.batches] == [2, 2]
+    assert all(name.startswith("ner") and "query" not in name for name in extractor._model.threads)
+    # Entities per text in order of first mention, without repeats
+    assert results == [[("Acme", "ORG"), ("Bob", "ORG"), ("Then", "ORG")], [("Carol", "ORG")], []]
+
+
+@pytest.mark.asyncio
+async def test_entities_per_text_are_capped(extractor):
+    extractor.max_entities = 2
+    results = await extractor.extract(["Alpha Beta Gamma Delta"])
+    assert [value for value, _ in results[0]] == ["Alpha", "Beta"]
+
+
+@pytest.mark.asyncio
+async def test_query_entities_are_cached_by_normalized_text(extractor):
+    assert await extractor.extract_query("where is  Acme") == ["Acme"]
+    assert await extractor.extract_query("where is Acme ") == ["Acme"]
+
+    assert len(extractor._model.batches) == 1
+    assert extractor._model.threads == ["ner-query_0"]
+    assert extractor.query_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unavailable_model_degrades_to_no_entities(monkeypatch):
+    calls = []
+
+    def build_model(model_config, download):
+        calls.append(download)
+        raise OSError("model host unreachable")
+
+    monkeypatch.setitem(sys.modules, "deeppavlov", types.SimpleNamespace(build_model=build_model))
+    monkeypatch.setattr(config, "NER_DOWNLOAD", True)
+    extractor = EntityExtractor()
+    try:
+        await extractor.preload()
+        assert calls == [False, True]
+        assert not extractor.available
+
+        assert await extractor.extract(["Acme hired Bob."]) == [[]]
+        assert await extractor.extract_query("Acme") == []
+        # The failure is remembered: the model is not rebuilt per request
+        assert calls == [False, True]
+    finally:
+        extractor.close()
+
+
+def test_build_graph_merges_mentions_in_any_case():
+    chunks = [
+        {"id": "c1", "metadata": {"source_file": "a.md", "position": 0}},
+        {"id": "c2", "metadata": {"source_file": "b.md", "position": 3}},
+    ]
+    spans = [[("Acme", "ORG"), ("Bob", "PER")], [("ACME", "ORG"), ("Bob", "PER"), ("Carol", "PER")]]
+
+    entities, relations = EntityExtractor.build_graph(chunks, spans)
+
+    assert [(e["value"], e["source"]) for e in entities] == [("Acme", "a.md"), ("Bob", "a.md"), ("Carol", "b.md")]
+    assert entities[0]["id"] == entity_id("ORG", "ACME")
+    pairs = {(r["source_id"], r["target_id"]): r["context"] for r in relations}
+    assert len(pairs) == 3
+    assert pairs[tuple(sorted([entity_id("ORG", "Acme"), entity_id("PER", "Bob")]))] == "c1"
+    assert all(r["relation_type"] == CO_OCCURS for r in relations)
@@ -0,0 +1,179 @@
+# tests/test_gemini_handler.py
+
+import asyncio
+import threading
+
+import pytest
+
+import qa.gemini_handler as gh
+from qa.gemini_handler import ChatMessage, GeminiHandler
+from utils.config import config
+
+CONTEXT = [{"content": "Кэш хранит ответы", "metadata": {"source_file": "cache.md"}, "score": 0.9}]
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class RecordingModel:
+    """generate_content only: the handler must not keep a chat object"""
+
+    def __init__(self, model_name=None, generation_config=None):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.latency = 0.0
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, stream=False):
+        self.calls.append(contents)
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            threading.Event().wait(self.latency)
+            return FakeChunk(f"answer {len(self.calls)}")
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setattr(gh.genai, "configure", lambda **kwargs: None)
+    monkeypatch.setattr(gh.genai, "GenerativeModel", RecordingModel)
+    return GeminiHandler()
+
+
+def turns(count):
+    return [
+        ChatMessage(role="user" if i % 2 == 0 else "assistant", content=f"m{i}")
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_each_request_sends_its_own_history_window(handler):
+    first = await handler.generate_response("q1", CONTEXT, turns(2))
+    second = await handler.generate_response("q2", CONTEXT, [])
+
+    assert (first, second) == ("answer 1", "answer 2")
+    history, final = handler.model.calls[0][:-1], handler.model.calls[0][-1]
+    assert history == [
+        {"role": "user", "parts": ["m0"]},
+        {"role": "model", "parts": ["m1"]}
+    ]
+    assert final["role"] == "user"
+    assert "Question: q1" in final["parts"][0]
+    assert "Source: cache.md" in final["parts"][0]
+    # Nothing from the first request leaks into the second
+    assert len(handler.model.calls[1]) == 1
+    assert "Question: q2" in handler.model.calls[1][0]["parts"][0]
+
+
+@pytest.mark.asyncio
+async def test_history_is_limited_and_starts_with_a_user_turn(handler, monkeypatch):
+    monkeypatch.setattr(config, "CHAT_HISTORY_MESSAGES", 3)
+    await handler.generate_response("q", CONTEXT, turns(6))
+    # The window m3..m5 starts with an assistant reply, which is dropped
+    assert [turn["parts"] for turn in handler.model.calls[0][:-1]] == [["m4"], ["m5"]]
+
+    monkeypatch.setattr(config, "CHAT_HISTORY_MESSAGES", 0)
+    await handler.generate_response("q", CONTEXT, turns(6))
+    assert len(handler.model.calls[1]) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_limited_by_the_semaphore(handler):
+    handler._semaphore = asyncio.Semaphore(2)
+    handler.model.latency = 0.02
+
+    answers = await asyncio.gather(*[handler.generate_response(f"q{i}", CONTEXT, []) for i in range(6)])
+
+    assert len(answers) == 6
+    assert handler.model.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_api_error_returns_apology(handler, monkeypatch):
+    def fail(contents, stream=False):
+        raise RuntimeError("quota")
+
+    monkeypatch.setattr(handler.model, "generate_content", fail)
+    answer = await handler.generate_response("q", CONTEXT, [])
+    assert not handler.validate_response(answer)
+
+
+class FakeStream:
+    """Blocking chunk iterator that records how far it was read"""
+
+    def __init__(self, count, error_at=None):
+        self.count = count
+        self.error_at = error_at
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.produced == self.error_at:
+            raise RuntimeError("stream broken")
+        if self.produced >= self.count:
+            raise StopIteration
+        self.produced += 1
+        return FakeChunk(f"p{self.produced} ")
+
+    def close(self):
+        self.closed.set()
+
+
+def streaming(handler, monkeypatch, fake):
+    monkeypatch.setattr(handler.model, "generate_content", lambda contents, stream=False: fake)
+    return fake
+
+
+async def slot_released(handler):
+    # The slot is freed by a callback once the producer thread returns
+    for _ in range(100):
+        if handler._semaphore._value == config.GEMINI_MAX_CONCURRENCY:
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_all_parts_and_releases_the_slot(handler, monkeypatch):
+    stream = streaming(handler, monkeypatch, FakeStream(3))
+    parts = [part async for part in handler.generate_response_stream("q", CONTEXT, [])]
+
+    assert parts == ["p1 ", "p2 ", "p3 "]
+    assert await asyncio.to_thread(stream.closed.wait, 1)
+    assert await slot_released(handler)
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_stops_the_producer(handler, monkeypatch):
+    stream = streaming(handler, monkeypatch, FakeStream(10_000))
+    parts = handler.generate_response_stream("q", CONTEXT, [])
+    assert [await parts.__anext__(), await parts.__anext__()] == ["p1 ", "p2 "]
+    await parts.aclose()
+
+    # The producer stops after the bounded queue instead of reading the
+    # whole answer, closes the Gemini stream and frees the slot
+    assert await asyncio.to_thread(stream.closed.wait, 1)
+    assert stream.produced <= gh._STREAM_QUEUE_SIZE + 3
+    assert await slot_released(handler)
+
+
+@pytest.mark.asyncio
+async def test_stream_error_is_raised_to_the_consumer(handler, monkeypatch):
+    stream = streaming(handler, monkeypatch, FakeStream(5, error_at=2))
+    parts = []
+    with pytest.raises(RuntimeError, match="stream broken"):
+        async for part in handler.generate_response_stream("q", CONTEXT, []):
+            parts.append(part)
+    assert parts == ["p1 ", "p2 "]
+    assert await asyncio.to_thread(stream.closed.wait, 1)
@@ -0,0 +1,79 @@
+# tests/test_graph_cache.py
+
+from processors.entity_extractor import entity_id
+from storage.graph_cache import NeighborhoodCache
+
+
+def build(rebuild_ratio=0.1):
+    cache = NeighborhoodCache(rebuild_ratio=rebuild_ratio)
+    cache.add_entities([
+        {"id": "a", "value": "Alice"},
+        {"id": "b", "value": "Bob"},
+        {"id": "c", "value": "Carol"},
+        {"id": "d", "value": "Dave"},
+    ])
+    cache.add_relations([
+        {"source_id": "a", "target_id": "b", "relation_type": "knows"},
+        {"source_id": "b", "target_id": "c", "relation_type": "knows"},
+    ])
+    return cache
+
+
+def test_search_expands_in_both_directions_shortest_first():
+    cache = build()
+    paths = cache.search(["Bob"], max_depth=1, limit=10)
+    assert sorted(p["entities"][1] for p in paths) == ["Alice", "Carol"]
+    assert all(p["relations"] == ["RELATES"] for p in paths)
+
+    paths = cache.search(["Alice"], max_depth=2, limit=10)
+    assert [p["entities"] for p in paths] == [["Alice", "Bob"], ["Alice", "Bob", "Carol"]]
+    assert paths[1]["relations"] == ["RELATES", "RELATES"]
+
+
+def test_search_respects_limit_and_does_not_reuse_edges():
+    cache = build()
+    assert len(cache.search(["Bob"], max_depth=2, limit=1)) == 1
+    # Alice-Bob-Alice would reuse the only edge
+    paths = cache.search(["Alice"], max_depth=3, limit=10)
+    assert ["Alice", "Bob", "Alice"] not in [p["entities"] for p in paths]
+    assert cache.search(["Nobody"], max_depth=2, limit=10) == []
+
+
+def test_relations_with_unknown_endpoints_and_duplicates_are_skipped():
+    cache = build()
+    cache.add_relations([
+        {"source_id": "a", "target_id": "zzz", "relation_type": "knows"},
+        {"source_id": "a", "target_id": "b", "relation_type": "knows"},
+    ])
+    assert cache.stats()["edges"] == 2
+
+
+def test_delta_edges_are_searchable_before_and_after_rebuild():
+    cache = build(rebuild_ratio=10.0)
+    cache.rebuild()
+    cache.add_relations([{"source_id": "c", "target_id": "d", "relation_type": "knows"}])
+    assert cache.stats()["delta_edges"] == 1
+    before = cache.search(["Dave"], max_depth=1, limit=10)
+
+    cache.rebuild()
+    assert cache.stats()["delta_edges"] == 0
+    assert cache.search(["Dave"], max_depth=1, limit=10) == before == [
+        {"entities": ["Dave", "Carol"], "relations": ["RELATES"]}
+    ]
+
+
+def test_value_updates_move_the_entity_between_lookups():
+    cache = build()
+    cache.add_entities([{"id": "a", "value": "Alicia"}])
+    assert cache.search(["Alice"], max_depth=1, limit=10) == []
+    assert cache.search(["Alicia"], max_depth=1, limit=10)[0]["entities"] == ["Alicia", "Bob"]
+
+
+def test_search_ignores_letter_case_like_entity_ids():
+    cache = build()
+    assert entity_id("ORG", "Acme") == entity_id("ORG", "ACME")
+    paths = cache.search(["ALICE", "alice"], max_depth=1, limit=10)
+    assert paths == [{"entities": ["Alice", "Bob"], "relations": ["RELATES"]}]
+
+    cache.add_entities([{"id": "a", "value": "Alicia"}])
+    assert cache.search(["alice"], max_depth=1, limit=10) == []
@@ -0,0 +1,256 @@
+# tests/test_graph_store.py
+
+import asyncio
+
+import pytest
+
+from storage import graph_store as gs
+from storage.graph_store import GraphStore
+
+
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = [FakeRecord(r) for r in records]
+
+    async def consume(self):
+        return None
+
+    async def single(self):
+        return self._records[0] if self._records else None
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for record in self._records:
+            yield record
+
+
+class FakeGraph:
+    """Applies the write queries of GraphStore to dicts and answers its reads"""
+
+    def __init__(self):
+        self.entities = {}
+        self.relations = {}
+        self.queries = []
+
+    def run(self, query, params):
+        self.queries.append((query, params))
+        if query == gs.MERGE_ENTITIES:
+            for row in params["rows"]:
+                self.entities[row["id"]] = dict(row)
+            return FakeResult([])
+        if query == gs.MERGE_RELATIONS:
+            for row in params["rows"]:
+                if row["source_id"] in self.entities and row["target_id"] in self.entities:
+                    key = (row["source_id"], row["target_id"], row["relation_type"])
+                    self.relations[key] = dict(row)
+            return FakeResult([])
+        if query == gs.COUNT_ENTITIES:
+            return FakeResult([{"count": len(self.entities)}])
+        if query == gs.COUNT_RELATIONS:
+            return FakeResult([{"count": len(self.relations)}])
+        if query == gs.LOAD_ENTITIES:
+            return FakeResult([{"id": e["id"], "value": e["value"]} for e in self.entities.values()])
+        if query == gs.LOAD_RELATIONS:
+            return FakeResult([
+                {"source_id": s, "target_id": t, "label": "RELATES", "relation_type": r}
+                for s, t, r in self.relations
+            ])
+        return FakeResult([])
+
+    def writes(self, query):
+        return [params["rows"] for q, params in self.queries if q == query]
+
+
+class FakeTransaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def run(self, query, **params):
+        return self.graph.run(query, params)
+
+
+class FakeSession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        return self.graph.run(query, params)
+
+    async def execute_write(self, work, *args):
+        return await work(FakeTransaction(self.graph), *args)
+
+
+class FakeDriver:
+    def __init__(self, graph):
+        self.graph = graph
+        self.closed = False
+
+    def session(self):
+        return FakeSession(self.graph)
+
+    async def close(self):
+        self.closed = True
+
+
+ENTITIES = [
+    {"id": "e1", "type": "PER", "value": "Alice", "source": "a.txt", "position": 0, "extra": "dropped"},
+    {"id": "e2", "type": "PER", "value": "Bob", "source": "a.txt", "position": 1},
+    {"id": "e3", "type": "ORG", "value": "Acme", "source": "a.txt", "position": 2},
+]
+RELATIONS = [
+    {"source_id": "e1", "target_id": "e2", "relation_type": "knows", "confidence": 0.9, "context": "x"},
+    {"source_id": "e2", "target_id": "e3", "relation_type": "works_at", "confidence": 0.8, "context": "y"},
+]
+
+
+def make_store(graph, batch_size=2):
+    store = GraphStore(driver=FakeDriver(graph))
+    store.batch_size = batch_size
+    return store
+
+
+@pytest.mark.asyncio
+async def test_create_knowledge_graph_writes_schema_then_batched_entities_then_relations():
+    graph = FakeGraph()
+    store = make_store(graph)
+
+    await store.create_knowledge_graph(ENTITIES, RELATIONS)
+
+    queries = [q for q, _ in graph.queries]
+    assert queries == gs.SCHEMA_STATEMENTS + [
+        gs.BACKFILL_ENTITY_KEYS, gs.MERGE_ENTITIES, gs.MERGE_ENTITIES, gs.MERGE_RELATIONS
+    ]
+    assert [len(rows) for rows in graph.writes(gs.MERGE_ENTITIES)] == [2, 1]
+    assert graph.writes(gs.MERGE_ENTITIES)[0][0] == {
+        "id": "e1", "type": "PER", "value": "Alice", "source": "a.txt", "position": 0, "key": "alice"
+    }
+    assert graph.writes(gs.MERGE_RELATIONS)[0][1] == {
+        "source_id": "e2", "target_id": "e3", "relation_type": "works_at", "confidence": 0.8, "context": "y"
+    }
+    assert store.schema_ready
+
+    # The schema is created once
+    await store.create_knowledge_graph(ENTITIES[:1], [])
+    assert [q for q, _ in graph.queries].count(gs.SCHEMA_STATEMENTS[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_empty_write_sends_no_batches():
+    graph = FakeGraph()
+    store = make_store(graph)
+    store.schema_ready = True
+    await store.create_knowledge_graph([], [])
+    assert graph.queries == []
+
+
+@pytest.mark.asyncio
+async def test_writes_update_the_loaded_cache_and_search_skips_neo4j():
+    graph = FakeGraph()
+    store = make_store(graph)
+    await store.load_neighborhood_cache()
+
+    await store.create_knowledge_graph(ENTITIES, RELATIONS)
+    sent = len(graph.queries)
+
+    paths = await store.search_graph(["Alice"], max_depth=2, limit=10)
+    assert [p["entities"] for p in paths] == [["Alice", "Bob"], ["Alice", "Bob", "Acme"]]
+    assert len(graph.queries) == sent
+
+
+@pytest.mark.asyncio
+async def test_cache_reloads_after_writes_from_another_process():
+    graph = FakeGraph()
+    store = make_store(graph)
+    await store.create_knowledge_graph(ENTITIES, RELATIONS)
+    await store.load_neighborhood_cache()
+    assert store.cache_reloads == 1
+
+    # Same counts as the cache: the check does not reload
+    store.cache_check_interval = 0
+    await store.search_graph(["Alice"])
+    await store._refresh_task
+    assert store.cache_reloads == 1
+
+    # Another writer adds Dave directly to Neo4j
+    other = make_store(graph)
+    other.schema_ready = True
+    await other.create_knowledge_graph(
+        [{"id": "e4", "value": "Dave"}],
+        [{"source_id": "e3", "target_id": "e4", "relation_type": "owns"}]
+    )
+    await store.search_graph(["Alice"])
+    await store._refresh_task
+    assert store.cache_reloads == 2
+    paths = await store.search_graph(["Dave"], max_depth=1)
+    assert paths == [{"entities": ["Dave", "Acme"], "relations": ["RELATES"]}]
+
+
+@pytest.mark.asyncio
+async def test_write_during_cache_load_is_not_lost():
+    graph = FakeGraph()
+    store = make_store(graph)
+    await store.create_knowledge_graph(ENTITIES[:2], RELATIONS[:1])
+
+    entered = asyncio.Event()
+    release = asyncio.Event()
+    original = graph.run
+
+    def run(query, params):
+        result = original(query, params)
+        if query == gs.LOAD_RELATIONS and not entered.is_set():
+            entered.set()
+            # Snapshot taken before the concurrent write below
+            return BlockingResult(result, release)
+        return result
+
+    graph.run = run
+    load = asyncio.ensure_future(store.load_neighborhood_cache())
+    await entered.wait()
+    await store.create_knowledge_graph(ENTITIES[2:], RELATIONS[1:])
+    release.set()
+    await load
+
+    paths = await store.search_graph(["Acme"], max_depth=1)
+    assert paths == [{"entities": ["Acme", "Bob"], "relations": ["RELATES"]}]
+
+
+class BlockingResult(FakeResult):
+    def __init__(self, result, release):
+        self._records = result._records
+        self._release = release
+
+    async def _iter(self):
+        await self._release.wait()
+        for record in self._records:
+            yield record
+
+
+@pytest.mark.asyncio
+async def test_search_falls_back_to_cypher_without_cache():
+    graph = FakeGraph()
+    store = GraphStore(driver=FakeDriver(graph), neighborhood_cache=None)
+    store.neighborhood_cache = None
+    await store.search_graph(["Alice", "ALICE", "Bob"], max_depth=2, limit=5)
+
+    query, params = graph.queries[-1]
+    assert "[*1..2]" in query.text
+    assert "start.key IN $query_entities" in query.text
+    assert params == {"query_entities": ["alice", "bob"], "limit": 5}
+
+    with pytest.raises(ValueError):
+        await store.search_graph(["Alice"], max_depth=0)
+    await store.close()
+    assert store.driver.closed
@@ -0,0 +1,191 @@
+# tests/test_hybrid_retriever.py
+
+import numpy as np
+import pytest
+
+from retrieval.hybrid_retriever import HybridRetriever
+from utils.config import config
+
+
+def unit(*components):
+    vector = np.zeros(4, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector / np.linalg.norm(vector)
+
+
+QUERY_VECTOR = unit(1)
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    async def embed_query(self, query):
+        self.queries.append(query)
+        return QUERY_VECTOR
+
+    def cached_query_embedding(self, query):
+        return QUERY_VECTOR if query in self.queries else None
+
+
+class FakeVectorStore:
+    def __init__(self, hits=(), stored=None):
+        self.hits = list(hits)
+        self.stored = stored or {}
+        self.searches = 0
+
+    async def search(self, query_embedding, top_k=10):
+        self.searches += 1
+        return [dict(hit) for hit in self.hits]
+
+    async def get_embeddings(self, ids):
+        return {chunk_id: self.stored[chunk_id] for chunk_id in ids if chunk_id in self.stored}
+
+
+class FakeLexicalIndex:
+    def __init__(self, hits=()):
+        self.hits = list(hits)
+
+    def search(self, query, top_k):
+        return [dict(hit) for hit in self.hits]
+
+
+class FakeGraphStore:
+    def __init__(self, paths=(), error=None):
+        self.paths = list(paths)
+        self.error = error
+
+    async def search_graph(self, entities):
+        if self.error:
+            raise self.error
+        return self.paths if entities else []
+
+
+def vector_hit(chunk_id, vector, content="text"):
+    vector = np.asarray(vector, dtype=np.float32)
+    return {
+        "id": chunk_id,
+        "content": content,
+        "metadata": {},
+        "distance": float(1 - vector @ QUERY_VECTOR),
+        "embedding": vector
+    }
+
+
+def lexical_hit(chunk_id, bm25, content="text"):
+    return {"id": chunk_id, "content": content, "metadata": {}, "bm25": bm25}
+
+
+def retriever(vector_store=None, lexical_index=None, graph_store=None, embeddings=None):
+    return HybridRetriever(
+        vector_store=vector_store or FakeVectorStore(),
+        graph_store=graph_store or FakeGraphStore(),
+        embedding_processor=embeddings or FakeEmbeddings(),
+        lexical_index=lexical_index
+    )
+
+
+@pytest.mark.asyncio
+async def test_threshold_applies_to_cosine_and_order_blends_lexical_overlap():
+    store = FakeVectorStore(hits=[
+        vector_hit("close", unit(1, 0.1), content="unrelated words"),
+        vector_hit("closer_words", unit(1, 0.2), content="how does caching work"),
+        vector_hit("far", unit(0.5, 1), content="how does caching work"),
+    ])
+    results = await retriever(vector_store=store).retrieve("how does caching work", [])
+
+    # "far" has the query words but a cosine below the threshold
+    assert [r["id"] for r in results] == ["closer_words", "close"]
+    assert all("embedding" not in r for r in results)
+    assert results[0]["score"] == pytest.approx(
+        config.RERANK_SEMANTIC_WEIGHT * float(unit(1, 0.2) @ QUERY_VECTOR) + config.RERANK_LEXICAL_WEIGHT
+    )
+
+
+@pytest.mark.asyncio
+async def test_lexical_candidates_are_scored_by_their_stored_vectors():
+    store = FakeVectorStore(
+        hits=[vector_hit("semantic", unit(1, 0.3))],
+        stored={"bm25_far": unit(0, 1), "bm25_close": unit(1, 0.05)}
+    )
+    lexical = FakeLexicalIndex(hits=[lexical_hit("bm25_far", 9.0), lexical_hit("bm25_close", 1.0)])
+    results = await retriever(vector_store=store, lexical_index=lexical).retrieve("caching", [])
+
+    # The top BM25 hit (normalized score 1.0) is dropped on its cosine, and
+    # the weak BM25 hit ranks by its cosine above the vector hit
+    assert [r["id"] for r in results] == ["bm25_close", "semantic"]
+
+
+@pytest.mark.asyncio
+async def test_graph_hits_are_exempt_and_results_are_capped(monkeypatch):
+    monkeypatch.setattr(config, "RERANK_TOP_N", 3)
+    store = FakeVectorStore(hits=[vector_hit(f"c{i}", unit(1, i / 10)) for i in range(5)])
+    graph = FakeGraphStore(paths=[{"entities": ["Alice", "Bob"], "relations": ["RELATES"]}])
+    results = await retriever(vector_store=store, graph_store=graph).retrieve("Alice", ["Alice"])
+
+    assert [r["id"] for r in results] == ["c0", "c1", "c2"]
+
+    monkeypatch.setattr(config, "RERANK_TOP_N", 10)
+    results = await retriever(vector_store=store, graph_store=graph).retrieve("Alice", ["Alice"])
+    assert [r["source"] for r in results].count("graph") == 1
+
+
+@pytest.mark.asyncio
+async def test_graph_failure_does_not_fail_retrieval():
+    store = FakeVectorStore(hits=[vector_hit("c0", unit(1))])
+    graph = FakeGraphStore(error=ConnectionError("neo4j down"))
+    results = await retriever(vector_store=store, graph_store=graph).retrieve("question", ["Alice"])
+    assert [r["id"] for r in results] == ["c0"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("ERR-404", True),
+    ("что значит MAX_CHUNK_TOKENS", True),
+    ("HybridRetriever timeout", True),
+    ("v1.2 release", True),
+    ("как настроить кэш", False),
+    ("2024 год", False),
+    ("что-то пошло не так", False),
+    ("почему ERR-404 возникает при загрузке больших файлов", False),
+])
+def test_is_keyword_query(query, expected):
+    assert HybridRetriever._is_keyword_query(query) is expected
+
+
+@pytest.mark.asyncio
+async def test_identifier_query_with_bm25_hits_skips_embedding_and_vector_search():
+    embeddings = FakeEmbeddings()
+    store = FakeVectorStore(hits=[vector_hit("semantic", unit(1))])
+    lexical = FakeLexicalIndex(hits=[lexical_hit("exact", 4.0, "ERR-404 means not found"), lexical_hit("weak", 1.0)])
+    results = await retriever(vector_store=store, lexical_index=lexical, embeddings=embeddings).retrieve("ERR-404", [])
+
+    assert embeddings.queries == []
+    assert store.searches == 0
+    # Without a query embedding BM25 hits are not held to the cosine threshold
+    assert [r["id"] for r in results] == ["exact", "weak"]
+    assert all(r["source"] == "lexical" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_identifier_query_without_bm25_hits_falls_back_to_vector_search():
+    embeddings = FakeEmbeddings()
+    store = FakeVectorStore(hits=[vector_hit("semantic", unit(1))])
+    results = await retriever(
+        vector_store=store, lexical_index=FakeLexicalIndex(), embeddings=embeddings
+    ).retrieve("ERR-404", [])
+
+    assert embeddings.queries == ["ERR-404"]
+    assert store.searches == 1
+    assert [r["id"] for r in results] == ["semantic"]
+
+
+@pytest.mark.asyncio
+async def test_prose_query_runs_both_searches():
+    embeddings = FakeEmbeddings()
+    store = FakeVectorStore(hits=[vector_hit("semantic", unit(1))])
+    lexical = FakeLexicalIndex(hits=[lexical_hit("exact", 4.0)])
+    await retriever(vector_store=store, lexical_index=lexical, embeddings=embeddings).retrieve(
+        "как настроить кэш ответов", []
+    )
+    assert embeddings.queries == ["как настроить кэш ответов"]
+    assert store.searches == 1
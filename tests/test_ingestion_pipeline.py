@@ -0,0 +1,185 @@
+# tests/test_ingestion_pipeline.py
+
+import hashlib
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("unstructured.partition.auto")
+
+from benchmarks.fakes import FakeGenAI
+from processors.embedding_processor import EmbeddingProcessor
+from processors.entity_extractor import EntityExtractor
+from processors.ingestion_pipeline import IngestionJob, IngestionPipeline
+from storage import graph_store as gs
+from storage.graph_store import GraphStore
+from storage.mmap_vector_index import MmapVectorIndex
+from storage.vector_store import VectorStore
+from tests.test_graph_store import FakeDriver, FakeGraph
+from utils.config import config
+
+SOURCE = "docs/guide.md"
+
+
+def paragraph(i):
+    return f"Paragraph {i} explains how the cache handles ERR-{i}."
+
+
+class FakeDocProcessor:
+    """One element per paragraph of in-memory file contents"""
+
+    def __init__(self):
+        self.files = {}
+
+    async def fingerprint(self, file_path):
+        return hashlib.sha256("\n\n".join(self.files[file_path]).encode("utf-8")).hexdigest()
+
+    async def iter_elements(self, file_path):
+        for position, content in enumerate(self.files[file_path]):
+            yield {
+                "content": content,
+                "position": position,
+                "metadata": {"source_file": file_path, "element_type": "Text"}
+            }
+
+
+@pytest_asyncio.fixture
+async def env(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_ENABLED", False)
+    fake = FakeGenAI(dim=16).install()
+    embeddings = EmbeddingProcessor()
+    # Every paragraph becomes its own chunk
+    embeddings.max_chunk_tokens = 14
+    backend = MmapVectorIndex(str(tmp_path / "index"))
+    docs = FakeDocProcessor()
+    pipeline = IngestionPipeline(docs, embeddings, VectorStore(backend=backend))
+    try:
+        yield pipeline, docs, backend, fake
+    finally:
+        backend.close()
+        fake.uninstall()
+
+
+async def ingest(pipeline):
+    job = await pipeline.run(IngestionJob(job_id="j", file_path=SOURCE))
+    assert job.status == "completed", job.error
+    return job
+
+
+@pytest.mark.asyncio
+async def test_unchanged_file_is_skipped(env):
+    pipeline, docs, backend, fake = env
+    docs.files[SOURCE] = [paragraph(i) for i in range(5)]
+
+    first = await ingest(pipeline)
+    assert (first.chunks, first.embedded, first.stored) == (5, 5, 5)
+    calls = fake.embed_calls
+
+    second = await ingest(pipeline)
+    assert second.up_to_date
+    assert second.unchanged == 5
+    assert (second.chunks, second.embedded, second.stored) == (0, 0, 0)
+    assert fake.embed_calls == calls
+
+
+@pytest.mark.asyncio
+async def test_edit_embeds_only_new_chunks_and_deletes_stale_ones(env):
+    pipeline, docs, backend, fake = env
+    docs.files[SOURCE] = [paragraph(i) for i in range(5)]
+    await ingest(pipeline)
+    old_ids, _ = backend.get_by_source(SOURCE)
+    embedded = fake.embedded_texts
+
+    # Paragraph 1 rewritten, paragraph 3 removed, paragraph 5 appended
+    docs.files[SOURCE] = [paragraph(0), paragraph(1) + " Updated.", paragraph(2), paragraph(4), paragraph(5)]
+    job = await ingest(pipeline)
+
+    assert (job.chunks, job.unchanged, job.embedded, job.stored, job.deleted) == (5, 3, 2, 2, 2)
+    assert fake.embedded_texts - embedded == 2
+
+    ids, metadatas = backend.get_by_source(SOURCE)
+    assert len(ids) == backend.count() == 5
+    assert len(set(ids) & set(old_ids)) == 3
+    # Kept chunks are stamped with the new file version
+    assert {metadata["file_hash"] for metadata in metadatas} == {job.file_hash}
+    documents = {doc for _, doc, _ in zip(*backend.scan(10, 0))}
+    assert paragraph(3) not in documents
+    assert paragraph(1) + " Updated." in documents
+
+
+@pytest.mark.asyncio
+async def test_repeated_paragraphs_keep_distinct_chunks(env):
+    pipeline, docs, backend, _ = env
+    docs.files[SOURCE] = [paragraph(0), paragraph(1), paragraph(0)]
+    await ingest(pipeline)
+    assert backend.count() == 3
+
+    # Dropping one copy deletes exactly one chunk
+    docs.files[SOURCE] = [paragraph(0), paragraph(1)]
+    job = await ingest(pipeline)
+    assert (job.unchanged, job.deleted) == (2, 1)
+    assert backend.count() == 2
+
+
+class FakeExtractor:
+    """Tags the ERR code of each paragraph and a shared "cache" entity"""
+
+    build_graph = staticmethod(EntityExtractor.build_graph)
+
+    async def extract(self, texts):
+        return [[("cache", "PRODUCT"), (text.split()[-1].rstrip("."), "CODE")] for text in texts]
+
+
+def record_upserts(backend):
+    sizes = []
+    original = backend.upsert
+
+    def upsert(ids, embeddings, documents, metadatas):
+        sizes.append(len(ids))
+        return original(ids, embeddings, documents, metadatas)
+
+    backend.upsert = upsert
+    return sizes
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_upserted_in_batches_with_stable_ids(env):
+    pipeline, docs, backend, fake = env
+    pipeline.batch_size = 3
+    pipeline.vector_store.batch_size = 2
+    sizes = record_upserts(backend)
+    docs.files[SOURCE] = [paragraph(i) for i in range(7)]
+
+    await ingest(pipeline)
+
+    # Pipeline batches of 3, 3 and 1 chunks, each written in upserts of at most 2
+    assert sizes == [2, 1, 2, 1, 1]
+    assert fake.embed_calls == 3
+    ids, _ = backend.get_by_source(SOURCE)
+
+    # Re-ingesting changed content reuses the IDs of unchanged chunks
+    docs.files[SOURCE] = [paragraph(i) for i in range(7)] + [paragraph(7)]
+    job = await ingest(pipeline)
+    assert (job.stored, job.unchanged) == (1, 7)
+    assert set(ids) < set(backend.get_by_source(SOURCE)[0])
+    assert backend.count() == 8
+
+
+@pytest.mark.asyncio
+async def test_graph_rows_are_written_in_unwind_batches(env):
+    pipeline, docs, backend, _ = env
+    graph = FakeGraph()
+    store = GraphStore(driver=FakeDriver(graph), neighborhood_cache=None)
+    store.batch_size = 2
+    pipeline.entity_extractor = FakeExtractor()
+    pipeline.graph_store = store
+    pipeline.batch_size = 3
+    docs.files[SOURCE] = [paragraph(i) for i in range(4)]
+
+    job = await ingest(pipeline)
+
+    # Two pipeline batches: 4 and 2 entities, 3 and 1 co-occurrences
+    assert [len(rows) for rows in graph.writes(gs.MERGE_ENTITIES)] == [2, 2, 2]
+    assert [len(rows) for rows in graph.writes(gs.MERGE_RELATIONS)] == [2, 1, 1]
+    assert len(graph.entities) == 5
+    assert len(graph.relations) == job.relations == 4
@@ -0,0 +1,136 @@
+# tests/test_lexical_index.py
+
+import json
+
+import pytest
+
+from storage.lexical_index import LexicalIndex
+
+
+def chunk(chunk_id, content, **metadata):
+    return {"id": chunk_id, "content": content, "metadata": metadata}
+
+
+CHUNKS = [
+    chunk("a", "Error ERR-404 means the page was not found", source_file="errors.txt"),
+    chunk("b", "Timeouts are configured with REQUEST_TIMEOUT", source_file="config.txt"),
+    chunk("c", "The page cache keeps rendered pages in memory", source_file="cache.txt"),
+]
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_by_bm25(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.jsonl"))
+    await index.add(CHUNKS)
+
+    results = index.search("ERR-404")
+    assert [r["id"] for r in results] == ["a"]
+    assert results[0]["metadata"] == {"source_file": "errors.txt"}
+    assert results[0]["bm25"] > 0
+
+    # "page" is in two chunks; "found" only in one, which ranks first
+    assert [r["id"] for r in index.search("page found")] == ["a", "c"]
+    assert index.search("unknown words") == []
+
+
+@pytest.mark.asyncio
+async def test_replace_delete_and_metadata(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.jsonl"))
+    await index.add(CHUNKS)
+
+    await index.add([chunk("a", "Completely new text about queues")])
+    assert index.search("ERR-404") == []
+    assert [r["id"] for r in index.search("queues")] == ["a"]
+
+    await index.update_metadata([{"id": "b", "metadata": {"source_file": "moved.txt"}}])
+    assert index.search("timeouts")[0]["metadata"] == {"source_file": "moved.txt"}
+
+    await index.delete(["c", "missing"])
+    assert len(index) == 2
+    assert index.search("cache") == []
+
+
+@pytest.mark.asyncio
+async def test_log_replay_restores_index(tmp_path):
+    path = tmp_path / "lexical.jsonl"
+    index = LexicalIndex(str(path))
+    await index.add(CHUNKS)
+    await index.delete(["b"])
+    await index.update_metadata([{"id": "a", "metadata": {"source_file": "new.txt"}}])
+    expected = index.search("page")
+
+    # A record truncated by a crash is skipped
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "id": "trunc')
+
+    reopened = LexicalIndex(str(path))
+    assert len(reopened) == 2
+    assert reopened.search("page") == expected
+    assert reopened.stats()["log_records"] == 5
+
+
+@pytest.mark.asyncio
+async def test_log_is_folded_into_a_snapshot(tmp_path):
+    path = tmp_path / "lexical.jsonl"
+    index = LexicalIndex(str(path), snapshot_min_records=4)
+    await index.add(CHUNKS)
+    await index.delete(["c"])
+    # Four log records against an empty snapshot: the log is folded
+    assert index.stats()["log_records"] == 0
+    assert index.stats()["snapshot_chunks"] == 2
+    assert path.read_text(encoding="utf-8") == ""
+
+    snapshot = [json.loads(line) for line in index.snapshot_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["id"] for record in snapshot] == ["a", "b"]
+    assert snapshot[0]["terms"]["page"] == 1
+
+    await index.add([chunk("a", "version 1 of chunk a")])
+    expected = index.search("version")
+
+    reopened = LexicalIndex(str(path), snapshot_min_records=4)
+    assert reopened.search("version") == expected
+    assert reopened.stats()["log_records"] == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_load_does_not_tokenize(tmp_path, monkeypatch):
+    path = tmp_path / "lexical.jsonl"
+    index = LexicalIndex(str(path), snapshot_min_records=1)
+    await index.add(CHUNKS)
+    assert path.read_text(encoding="utf-8") == ""
+
+    with monkeypatch.context() as m:
+        m.setattr("storage.lexical_index.terms", lambda text: pytest.fail("re-tokenized on load"))
+        reopened = LexicalIndex(str(path), snapshot_min_records=1)
+    assert [r["id"] for r in reopened.search("page found")] == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_log_left_behind_by_a_crash_is_replayed_idempotently(tmp_path):
+    path = tmp_path / "lexical.jsonl"
+    index = LexicalIndex(str(path))
+    await index.add(CHUNKS)
+    await index.delete(["b"])
+    log = path.read_text(encoding="utf-8")
+    expected = index.search("page timeouts")
+
+    # Crash after the snapshot was written but before the log was emptied
+    await index.compact()
+    path.write_text(log, encoding="utf-8")
+
+    reopened = LexicalIndex(str(path))
+    assert len(reopened) == 2
+    assert reopened.search("page timeouts") == expected
+
+
+@pytest.mark.asyncio
+async def test_existing_log_is_folded_on_load(tmp_path):
+    path = tmp_path / "lexical.jsonl"
+    index = LexicalIndex(str(path))
+    await index.add(CHUNKS)
+    assert not index.snapshot_path.exists()
+
+    reopened = LexicalIndex(str(path), snapshot_min_records=3)
+    assert reopened.stats()["snapshot_chunks"] == 3
+    assert path.read_text(encoding="utf-8") == ""
+    assert [r["id"] for r in LexicalIndex(str(path)).search("ERR-404")] == ["a"]
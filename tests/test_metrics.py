@@ -0,0 +1,96 @@
+# tests/test_metrics.py
+
+import logging
+
+import pytest
+
+from utils import metrics
+from utils.metrics import Registry, TraceIdFilter, trace_id_from, trace_id_var
+
+
+def test_counter_renders_help_type_and_escaped_labels():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors")
+    errors.inc(stage="embed")
+    errors.inc(2, stage="embed")
+    errors.inc(0.5, stage='say "hi"\\\n')
+
+    assert registry.render().splitlines() == [
+        "# HELP errors_total Errors",
+        "# TYPE errors_total counter",
+        'errors_total{stage="embed"} 3',
+        'errors_total{stage="say \\"hi\\"\\\\\\n"} 0.5',
+    ]
+    assert errors.value(stage="embed") == 3
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = Registry()
+    duration = registry.histogram("duration_seconds", "Durations", buckets=(0.5, 0.1))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        duration.observe(value, stage="chunk")
+
+    assert registry.render().splitlines()[2:] == [
+        'duration_seconds_bucket{stage="chunk",le="0.1"} 2',
+        'duration_seconds_bucket{stage="chunk",le="0.5"} 3',
+        'duration_seconds_bucket{stage="chunk",le="+Inf"} 4',
+        'duration_seconds_sum{stage="chunk"} 2.45',
+        'duration_seconds_count{stage="chunk"} 4',
+    ]
+
+
+def test_metrics_are_shared_by_name_and_collectors_render_at_scrape_time():
+    registry = Registry()
+    assert registry.counter("hits_total", "Hits") is registry.counter("hits_total", "Hits")
+
+    sizes = {"resident": 1}
+    registry.register_collector(lambda: [("cache_entries", "gauge", "Entries", [({"cache": "answers"}, sizes["resident"])])])
+    sizes["resident"] = 7
+
+    assert registry.render().splitlines()[-3:] == [
+        "# HELP cache_entries Entries",
+        "# TYPE cache_entries gauge",
+        'cache_entries{cache="answers"} 7',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_span_and_timed_record_duration_and_errors():
+    @metrics.timed("test_async_stage")
+    async def work(fail):
+        if fail:
+            raise ValueError("boom")
+        return "ok"
+
+    count = metrics.STAGE_DURATION._values.get((("stage", "test_async_stage"),), [None, 0, 0])[2]
+    assert await work(False) == "ok"
+    with pytest.raises(ValueError):
+        await work(True)
+
+    assert metrics.STAGE_DURATION._values[(("stage", "test_async_stage"),)][2] == count + 2
+    assert metrics.STAGE_ERRORS.value(stage="test_async_stage") == 1
+    assert 'rag_stage_errors_total{stage="test_async_stage"} 1' in metrics.registry.render()
+
+
+@pytest.mark.parametrize("header, kept", [
+    ("abc-123", True),
+    ("a" * 64, True),
+    ("a" * 65, False),
+    ("id\nforged log line", False),
+    ("", False),
+    (None, False),
+])
+def test_trace_id_from_accepts_only_plain_tokens(header, kept):
+    trace_id = trace_id_from(header)
+    assert (trace_id == header) is kept
+    assert metrics._TRACE_ID_RE.fullmatch(trace_id)
+
+
+def test_trace_id_filter_tags_log_records():
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+    token = trace_id_var.set("req-1")
+    try:
+        TraceIdFilter().filter(record)
+    finally:
+        trace_id_var.reset(token)
+    assert record.trace_id == "req-1"
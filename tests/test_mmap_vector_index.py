@@ -0,0 +1,167 @@
+# tests/test_mmap_vector_index.py
+
+import numpy as np
+import pytest
+
+from storage.mmap_vector_index import MmapVectorIndex, QuantizedMmapVectorIndex
+
+INDEXES = [MmapVectorIndex, QuantizedMmapVectorIndex]
+
+
+def random_vectors(n, dim=32, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def upsert(index, ids, vectors, source="doc.txt"):
+    index.upsert(
+        ids,
+        vectors,
+        [f"content of {chunk_id}" for chunk_id in ids],
+        [{"source_file": source, "chunk": chunk_id} for chunk_id in ids]
+    )
+
+
+def top1_recall(index, ids, vectors):
+    return np.mean([index.query(vector, 1)[0]["id"] == chunk_id for chunk_id, vector in zip(ids, vectors)])
+
+
+@pytest.mark.parametrize("index_cls", INDEXES)
+def test_query_returns_nearest_with_documents(tmp_path, index_cls):
+    vectors = random_vectors(100)
+    ids = [f"c{i}" for i in range(100)]
+    index = index_cls(str(tmp_path))
+    upsert(index, ids, vectors)
+
+    results = index.query(vectors[7], 3)
+    assert results[0]["id"] == "c7"
+    assert results[0]["content"] == "content of c7"
+    assert results[0]["metadata"] == {"source_file": "doc.txt", "chunk": "c7"}
+    assert results[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+    assert [r["distance"] for r in results] == sorted(r["distance"] for r in results)
+    assert top1_recall(index, ids, vectors) == 1.0
+    index.close()
+
+
+@pytest.mark.parametrize("index_cls", INDEXES)
+def test_upsert_replaces_and_delete_frees_slots(tmp_path, index_cls):
+    vectors = random_vectors(10)
+    ids = [f"c{i}" for i in range(10)]
+    index = index_cls(str(tmp_path))
+    upsert(index, ids, vectors)
+
+    upsert(index, ["c0"], vectors[5:6])
+    assert index.count() == 10
+    assert {r["id"] for r in index.query(vectors[5], 2)} == {"c0", "c5"}
+
+    index.delete(["c1", "c2", "missing"])
+    assert index.count() == 8
+    assert "c1" not in {r["id"] for r in index.query(vectors[1], 8)}
+
+    # Freed slots are reused before the matrix grows
+    upsert(index, ["n1", "n2"], random_vectors(2, seed=1))
+    assert index._rows == 10
+    index.close()
+
+
+@pytest.mark.parametrize("index_cls", INDEXES)
+def test_reopen_and_metadata(tmp_path, index_cls):
+    vectors = random_vectors(20)
+    ids = [f"c{i}" for i in range(20)]
+    index = index_cls(str(tmp_path))
+    upsert(index, ids[:10], vectors[:10], source="a.txt")
+    upsert(index, ids[10:], vectors[10:], source="b.txt")
+    index.update_metadata(["c0"], [{"source_file": "b.txt", "moved": True}])
+    index.close()
+
+    index = index_cls(str(tmp_path))
+    assert index.count() == 20
+    found_ids, metadatas = index.get_by_source("b.txt")
+    assert set(found_ids) == {"c0"} | set(ids[10:])
+    assert {"source_file": "b.txt", "moved": True} in metadatas
+    assert top1_recall(index, ids, vectors) == 1.0
+    index.close()
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    index = MmapVectorIndex(str(tmp_path))
+    upsert(index, ["a"], random_vectors(1, dim=8))
+    with pytest.raises(ValueError):
+        upsert(index, ["b"], random_vectors(1, dim=4))
+    with pytest.raises(ValueError):
+        index.query(np.ones(4), 1)
+    index.close()
+
+
+def test_quantized_index_built_from_existing_float_index(tmp_path):
+    vectors = random_vectors(200)
+    ids = [f"c{i}" for i in range(200)]
+    index = MmapVectorIndex(str(tmp_path))
+    upsert(index, ids, vectors)
+    index.close()
+
+    quantized = QuantizedMmapVectorIndex(str(tmp_path))
+    assert top1_recall(quantized, ids, vectors) == 1.0
+    quantized.close()
+
+
+def test_quantized_codes_rebuilt_after_float_writes(tmp_path):
+    """Switching VECTOR_QUANTIZATION off and back on must not leave stale codes"""
+    ids = [f"c{i}" for i in range(200)]
+    quantized = QuantizedMmapVectorIndex(str(tmp_path))
+    upsert(quantized, ids, random_vectors(200, seed=1))
+    quantized.close()
+
+    rewritten = random_vectors(200, seed=2)
+    index = MmapVectorIndex(str(tmp_path))
+    upsert(index, ids, rewritten)
+    index.close()
+
+    quantized = QuantizedMmapVectorIndex(str(tmp_path))
+    assert top1_recall(quantized, ids, rewritten) == 1.0
+    quantized.close()
+
+
+def test_quantize_roundtrip_error_is_small():
+    vectors = MmapVectorIndex._normalize(random_vectors(50))
+    codes, scales = QuantizedMmapVectorIndex.quantize(vectors)
+    assert codes.dtype == np.int8
+    np.testing.assert_allclose(codes * scales, vectors, atol=np.abs(vectors).max() / 127)
+
+
+@pytest.mark.parametrize("index_cls", INDEXES)
+def test_scan_runs_without_the_lock(tmp_path, index_cls, monkeypatch):
+    vectors = random_vectors(50)
+    ids = [f"c{i}" for i in range(50)]
+    index = index_cls(str(tmp_path))
+    upsert(index, ids, vectors)
+
+    scan = index._candidate_slots
+    locked_during_scan = []
+
+    def candidate_slots(*args):
+        locked_during_scan.append(index._lock.locked())
+        slots = scan(*args)
+        # A write that lands between the scan and reading the rows
+        index.delete(["c7"])
+        return slots
+
+    monkeypatch.setattr(index, "_candidate_slots", candidate_slots)
+    results = index.query(vectors[7], 3)
+
+    assert locked_during_scan == [False]
+    assert "c7" not in {r["id"] for r in results}
+    assert len(results) == 2
+    index.close()
+
+
+@pytest.mark.parametrize("index_cls", INDEXES)
+def test_get_embeddings(tmp_path, index_cls):
+    vectors = random_vectors(5)
+    index = index_cls(str(tmp_path))
+    assert index.get_embeddings(["c0"]) == {}
+    upsert(index, [f"c{i}" for i in range(5)], vectors)
+
+    found = index.get_embeddings(["c3", "missing", "c1"])
+    assert set(found) == {"c1", "c3"}
+    np.testing.assert_allclose(found["c3"], MmapVectorIndex._normalize(vectors[3]), atol=1e-6)
+    index.close()
@@ -0,0 +1,99 @@
+# tests/test_session_store.py
+
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from qa.gemini_handler import ChatMessage
+from qa.session_store import ChatSession, SessionStore, context_refs
+
+
+def new_session(session_id="s1"):
+    return ChatSession(
+        session_id=session_id,
+        start_time=datetime(2024, 1, 1, 12, 0),
+        messages=[],
+        metadata={"user": "u1"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_turns_are_appended_and_reloaded(tmp_path):
+    store = SessionStore(str(tmp_path))
+    await store.create(new_session())
+    await store.append_messages("s1", [ChatMessage("user", "hi"), ChatMessage("assistant", "hello")])
+    await store.append_messages("s1", [ChatMessage("user", "again")])
+
+    lines = (tmp_path / "s1.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["type"] for line in lines] == ["session", "message", "message", "message"]
+
+    session = await SessionStore(str(tmp_path)).load("s1")
+    assert session.start_time == datetime(2024, 1, 1, 12, 0)
+    assert session.metadata == {"user": "u1"}
+    assert [(m.role, m.content) for m in session.messages] == [
+        ("user", "hi"), ("assistant", "hello"), ("user", "again")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_missing_session_and_truncated_record(tmp_path):
+    store = SessionStore(str(tmp_path))
+    assert await store.load("nope") is None
+
+    await store.create(new_session())
+    await store.append_messages("s1", [ChatMessage("user", "hi")])
+    with open(tmp_path / "s1.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"type": "message", "role": "assis')
+
+    session = await store.load("s1")
+    assert [m.content for m in session.messages] == ["hi"]
+
+
+@pytest.mark.asyncio
+async def test_retrieved_context_is_stored_as_references(tmp_path):
+    store = SessionStore(str(tmp_path))
+    await store.create(new_session())
+    retrieved = [
+        {"id": "chunk-1", "content": "long chunk text " * 50, "score": 0.9, "metadata": {}},
+        {"content": "['Alice', 'Bob']", "score": 0.5, "source": "graph"}
+    ]
+    await store.append_messages("s1", [ChatMessage("assistant", "answer", context={"retrieved": retrieved})])
+
+    session = await store.load("s1")
+    assert session.messages[0].context == context_refs({"retrieved": retrieved})
+    assert session.messages[0].context["retrieved"][0] == {"id": "chunk-1", "score": 0.9}
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_session_is_migrated(tmp_path):
+    legacy = {
+        "session_id": "old",
+        "start_time": "2023-05-01T10:00:00",
+        "metadata": {},
+        "messages": [{"role": "user", "content": "legacy question"}]
+    }
+    (tmp_path / "old.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    session = await SessionStore(str(tmp_path)).load("old")
+    assert [m.content for m in session.messages] == ["legacy question"]
+    assert not (tmp_path / "old.json").exists()
+    assert (tmp_path / "old.jsonl").exists()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_keep_whole_records_and_release_locks(tmp_path):
+    store = SessionStore(str(tmp_path))
+    await store.create(new_session())
+    await asyncio.gather(*[
+        store.append_messages("s1", [ChatMessage("user", f"message {i}")])
+        for i in range(50)
+    ])
+    for i in range(20):
+        await store.create(new_session(f"other{i}"))
+
+    session = await store.load("s1")
+    assert sorted(m.content for m in session.messages) == sorted(f"message {i}" for i in range(50))
+    # Per-session locks do not outlive their users
+    assert store._locks == {}
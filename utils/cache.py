@@ -0,0 +1,129 @@
+# utils/cache.py
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+import time
+
+
+class TTLCache:
+    """
+    In-memory LRU cache whose entries also expire after ``ttl`` seconds.
+
+    With ``touch_on_get`` the TTL counts from the last access (idle timeout)
+    rather than from insertion. An optional ``weigher`` bounds the total
+    weight (e.g. bytes) of resident entries by ``max_weight``.
+
+    Not thread-safe: intended to be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        max_weight: Optional[int] = None,
+        weigher: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+        touch_on_get: bool = False
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.on_evict = on_evict
+        self.touch_on_get = touch_on_get
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.weight = 0
+        # key -> (value, timestamp, weight)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[tuple]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if self.ttl is not None and time.monotonic() - item[1] > self.ttl:
+            self._remove(key, evicted=True)
+            return None
+        return item
+
+    def _remove(self, key: Hashable, evicted: bool = False) -> Any:
+        value, _, weight = self._data.pop(key)
+        self.weight -= weight
+        if evicted:
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._lookup(key)
+        if item is None:
+            self.misses += 1
+            return default
+        if self.touch_on_get:
+            self._data[key] = (item[0], time.monotonic(), item[2])
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Value of a live entry without counting a hit or miss and without
+        refreshing its LRU position
+        """
+        item = self._lookup(key)
+        return default if item is None else item[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if key in self._data:
+            self._remove(key)
+        weight = self.weigher(value) if self.weigher is not None else 0
+        self._data[key] = (value, time.monotonic(), weight)
+        self.weight += weight
+        self.expire()
+        while len(self._data) > 1 and (
+            len(self._data) > self.maxsize
+            or (self.max_weight is not None and self.weight > self.max_weight)
+        ):
+            self._remove(next(iter(self._data)), evicted=True)
+
+    def expire(self) -> None:
+        """
+        Drop expired entries from the least recently used end
+        """
+        if self.ttl is None:
+            return
+        deadline = time.monotonic() - self.ttl
+        while self._data:
+            key, item = next(iter(self._data.items()))
+            if item[1] > deadline:
+                break
+            self._remove(key, evicted=True)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.weight = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "weight": self.weight
+        }
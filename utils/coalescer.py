@@ -0,0 +1,104 @@
+# utils/coalescer.py
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+import asyncio
+
+
+class BatchCoalescer:
+    """
+    Coalesces concurrent single-item requests into batched calls.
+
+    Requests arriving within ``window`` seconds of the first pending one are
+    passed to ``batch_fn`` together (at most ``max_batch`` per call).
+    Requests for a key that is already pending or in flight share its
+    future instead of being computed again.
+
+    Not thread-safe: intended to be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        window: float,
+        max_batch: int
+    ):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = 0
+        self.shared = 0
+        self.batches = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # key -> item for requests waiting for the next flush
+        self._pending: Dict[Hashable, Any] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop keeps only weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """
+        Returns the result of ``batch_fn`` for ``item``; ``key`` identifies
+        duplicate requests
+        """
+        self.requests += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight[key] = future
+            self._pending[key] = item
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+
+        # A cancelled waiter must not cancel the result shared with others
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self.batches += 1
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, Any]) -> None:
+        keys = list(batch)
+        futures = [self._inflight[key] for key in keys]
+        try:
+            results = await self.batch_fn([batch[key] for key in keys])
+            if len(results) != len(keys):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(keys)} items")
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        except BaseException:
+            # Cancellation (e.g. at shutdown) cancels the waiters too
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            # Every key of the batch is released, whatever happened, so later
+            # requests start a new computation instead of awaiting a dead future
+            for key, future in zip(keys, futures):
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "shared": self.shared,
+            "batches": self.batches,
+            "avg_batch": (self.requests - self.shared) / self.batches if self.batches else 0.0
+        }
@@ -1,6 +1,7 @@
 # utils/config.py
 
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from typing import Dict, Any
 
 @dataclass
@@ -8,31 +9,98 @@ class Config:
     # Document Processing
     SUPPORTED_FORMATS = ['.pdf', '.txt']
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    PARTITION_WORKERS = os.cpu_count() or 1  # processes used for partitioning
     
     # Embeddings
     EMBEDDING_MODEL = "text-multilingual-embedding-002"
-    MAX_CHUNK_SIZE = 2048
-    CHUNK_OVERLAP = 200
+    MAX_CHUNK_TOKENS = 512  # adjacent small elements are packed up to this size
+    CHUNK_OVERLAP_TOKENS = 50
+    EMBEDDING_BATCH_SIZE = 100  # texts per embed_content call (API max is 100)
+    EMBEDDING_CONCURRENCY = 4  # embedding batches in flight at once
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_DIR = "./data/embedding_cache"
+    EMBEDDING_CACHE_MAX_ENTRIES = 500_000
+    QUERY_CACHE_SIZE = 10_000
+    QUERY_CACHE_TTL = 3600  # seconds
+    QUERY_COALESCE_WINDOW_MS = 5  # wait for concurrent queries to batch
+    
+    # Ingestion
+    INGEST_BATCH_SIZE = 500  # chunks embedded and stored together
+    INGEST_QUEUE_SIZE = 4  # batches buffered between pipeline stages
+    INGEST_JOB_HISTORY = 1000  # finished jobs kept for status queries
+    INGEST_MAX_CONCURRENT_FILES = os.cpu_count() or 1
     
     # Vector Store
+    VECTOR_BACKEND = "chroma"  # "chroma" or "mmap"
     CHROMA_PERSIST_DIR = "./data/chroma"
+    VECTOR_INDEX_DIR = "./data/vector_index"  # used by the "mmap" backend
+    VECTOR_QUANTIZATION = None  # None or "int8" (mmap backend)
+    VECTOR_RESCORE_FACTOR = 4  # int8 candidates per result re-scored exactly
     COLLECTION_NAME = "documents"
+    VECTOR_UPSERT_BATCH_SIZE = 5000  # chunks per upsert call
     
     # Neo4j
     NEO4J_URI = "bolt://localhost:7687"
     NEO4J_USER = "neo4j"
     NEO4J_PASSWORD = "password"
+    GRAPH_BATCH_SIZE = 10_000  # rows per UNWIND transaction
+    NEO4J_POOL_SIZE = 50
+    NEO4J_ACQUISITION_TIMEOUT = 5.0  # seconds to wait for a pooled connection
+    GRAPH_QUERY_TIMEOUT = 2.0  # seconds per graph search transaction
+    GRAPH_MAX_DEPTH = 2
+    GRAPH_SEARCH_LIMIT = 10
+    GRAPH_CACHE_ENABLED = True  # serve search_graph from an in-memory copy
+    GRAPH_CACHE_REBUILD_RATIO = 0.1  # new edges, relative to cached ones, before CSR rebuild
+    GRAPH_CACHE_CHECK_INTERVAL = 30.0  # seconds between checks for graph writes from other processes
     
     # Gemini
-    GEMINI_CONFIG: Dict[str, Any] = {
+    GEMINI_CONFIG: Dict[str, Any] = field(default_factory=lambda: {
         "temperature": 1,
         "top_p": 0.95,
         "top_k": 40,
         "max_output_tokens": 8192
-    }
+    })
+    GEMINI_MAX_CONCURRENCY = 8  # generation requests in flight at once
+    CONTEXT_TOKEN_BUDGET = 3000  # tokens of retrieved context per prompt
+    CONTEXT_DEDUP_THRESHOLD = 0.8  # shingle Jaccard above which chunks are near-duplicates
+    CHAT_HISTORY_MESSAGES = 6  # previous session messages sent with each request
+    
+    # Entity extraction (deeppavlov NER)
+    NER_ENABLED = True
+    NER_MODEL_CONFIG = "ner_ontonotes_bert"
+    NER_DOWNLOAD = True  # fetch model files that are not available locally
+    NER_BATCH_SIZE = 64  # text pieces per model call
+    NER_WORKERS = 1  # threads sharing the loaded model
+    NER_MAX_TOKENS = 256  # longer texts are tagged in sentence pieces
+    NER_MAX_ENTITIES_PER_CHUNK = 20  # bounds co-occurrence pairs per chunk
+    NER_QUERY_CACHE_SIZE = 10_000
+    
+    # Answer cache
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_THRESHOLD = 0.95  # min cosine similarity between questions
+    ANSWER_CACHE_SIZE = 5000
+    ANSWER_CACHE_TTL = 24 * 3600  # seconds
+    
+    # Chat sessions
+    SESSION_CACHE_MAX_SESSIONS = 10_000  # sessions kept in memory
+    SESSION_CACHE_MAX_BYTES = 256 * 1024 * 1024  # approximate memory for resident sessions
+    SESSION_IDLE_TTL = 1800  # seconds before an idle session is unloaded
     
     # Retrieval
     TOP_K_VECTORS = 10
-    RERANKING_THRESHOLD = 0.7
+    RERANKING_THRESHOLD = 0.7  # minimum cosine with the query; weights below only order results
+    RERANK_TOP_N = 8
+    RERANK_SEMANTIC_WEIGHT = 0.8
+    RERANK_LEXICAL_WEIGHT = 0.2
+    GRAPH_PRIOR_SCORE = 0.5
+
+    # Lexical index (BM25)
+    LEXICAL_INDEX_ENABLED = True
+    LEXICAL_INDEX_PATH = "./data/lexical_index.jsonl"
+    LEXICAL_TOP_K = 10
+    LEXICAL_SNAPSHOT_MIN_RECORDS = 1000  # log records before they are folded into the snapshot
+    LEXICAL_ONLY_MAX_TERMS = 4
+    BM25_K1 = 1.5
+    BM25_B = 0.75
 
 config = Config()
\ No newline at end of file
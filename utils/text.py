@@ -0,0 +1,56 @@
+# utils/text.py
+
+import re
+from typing import List, Tuple
+
+# Word pieces and standalone punctuation. Approximates the model's subword
+# tokenizer closely enough for sizing chunks and prompts.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_TERM_RE = re.compile(r"\w+")
+
+
+def count_tokens(text: str) -> int:
+    return sum(1 for _ in _TOKEN_RE.finditer(text))
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+def terms(text: str) -> List[str]:
+    """
+    Lowercased word tokens without punctuation, for lexical matching.
+    """
+    return [term.lower() for term in _TERM_RE.findall(text)]
+
+
+def entity_key(value: str) -> str:
+    """
+    Case-insensitive lookup key of an entity value. Entity IDs hash it, so
+    every lookup by value must go through it too.
+    """
+    return value.lower()
+
+
+def sentence_spans(text: str, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """
+    Split text into (start, end, token_count) spans in a single pass.
+
+    Spans end at sentence boundaries; a sentence longer than ``max_tokens``
+    is cut into token-bounded pieces.
+    """
+    spans = []
+    start = 0
+    boundaries = [m.start() for m in _SENTENCE_END_RE.finditer(text)] + [len(text)]
+
+    for end in boundaries:
+        tokens = [m.span() for m in _TOKEN_RE.finditer(text, start, end)]
+        for i in range(0, len(tokens), max_tokens):
+            piece = tokens[i:i + max_tokens]
+            piece_start = start if i == 0 else piece[0][0]
+            piece_end = end if i + max_tokens >= len(tokens) else piece[-1][1]
+            spans.append((piece_start, piece_end, len(piece)))
+        start = end
+
+    return spans